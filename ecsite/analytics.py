@@ -0,0 +1,232 @@
+"""
+Daily sales rollups computed from the purchase ledger with NumPy.
+
+Only purchase records above the stored high-water mark are looked at to find
+the days that changed. Those days are then re-aggregated from the ledger (in
+bounded chunks, walking each run of consecutive changed days by primary key
+from its first record) so distinct buyer counts stay exact, while days that did
+not receive new purchases are never read again, even when they fall between
+changed days. Days with archived records are no longer in
+the ledger, so their rollups are kept as they are, even by a rebuild.
+
+With user shards, every shard has its own high-water mark, and changed days
+are re-aggregated from the records of all shards. Users are split between
+shards, so distinct buyers still add up.
+"""
+
+import datetime
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from . import archive, sharding
+from .models import Item, RollupWatermark, SalesRollup, UserPurchaseRecord
+
+SALES_WATERMARK = "sales_rollups"
+ANONYMOUS_USER = -1
+
+
+def iter_record_chunks(records, chunk_size: int, after_id: int = 0):
+    """
+    Yields ``(item_ids, user_ids, quantities, days)`` arrays of at most
+    ``chunk_size`` purchase records with an id above ``after_id``. Days are
+    proleptic Gregorian ordinals in the current time zone.
+    """
+    last_id = after_id
+    while True:
+        rows = list(
+            records.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "item_id", "user_id", "quantity", "timestamp")[
+                :chunk_size
+            ]
+        )
+        if not rows:
+            return
+
+        last_id = rows[-1][0]
+        _, item_ids, user_ids, quantities, timestamps = zip(*rows)
+        yield (
+            np.array(item_ids, dtype=np.int64),
+            np.array(
+                [
+                    ANONYMOUS_USER if user_id is None else user_id
+                    for user_id in user_ids
+                ],
+                dtype=np.int64,
+            ),
+            np.array(quantities, dtype=np.int64),
+            np.fromiter(
+                (timezone.localtime(ts).toordinal() for ts in timestamps),
+                dtype=np.int64,
+                count=len(timestamps),
+            ),
+        )
+
+
+def _sum_by_group(keys, values):
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    totals = np.bincount(inverse.reshape(-1), weights=values, minlength=len(groups))
+    return groups, totals.astype(np.int64)
+
+
+def aggregate_sales(chunks, days=None):
+    """
+    Reduces record chunks to per ``(item_id, day)`` units and distinct buyers.
+    Returns ``(groups, units, buyers)`` where ``groups`` is an ``(n, 2)`` array.
+    Records outside of ``days`` (a list of ordinals) are skipped when given.
+    """
+    group_parts, unit_parts, buyer_parts = [], [], []
+    for item_ids, user_ids, quantities, record_days in chunks:
+        if days is not None:
+            mask = np.isin(record_days, days)
+            item_ids, user_ids = item_ids[mask], user_ids[mask]
+            quantities, record_days = quantities[mask], record_days[mask]
+        if not len(item_ids):
+            continue
+
+        # Reducing every chunk keeps memory bound by the number of groups
+        groups, units = _sum_by_group(
+            np.stack([item_ids, record_days], axis=1), quantities
+        )
+        group_parts.append(groups)
+        unit_parts.append(units)
+
+        buyers = np.stack([item_ids, record_days, user_ids], axis=1)
+        buyer_parts.append(np.unique(buyers[user_ids != ANONYMOUS_USER], axis=0))
+
+    if not group_parts:
+        empty = np.empty((0, 2), dtype=np.int64)
+        return empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    groups, units = _sum_by_group(
+        np.concatenate(group_parts), np.concatenate(unit_parts)
+    )
+
+    buyer_triples = np.unique(np.concatenate(buyer_parts), axis=0)
+    buyer_groups, buyer_counts = np.unique(
+        buyer_triples[:, :2], axis=0, return_counts=True
+    )
+    # Both group arrays are sorted the same way, so buyers can be matched up
+    buyers = np.zeros(len(groups), dtype=np.int64)
+    if len(buyer_groups):
+        positions = np.searchsorted(_group_keys(groups), _group_keys(buyer_groups))
+        buyers[positions] = buyer_counts
+    return groups, units, buyers
+
+
+def _group_keys(groups):
+    # Packs (item_id, day) pairs into one sortable integer
+    return groups[:, 0] * 10_000_000 + groups[:, 1]
+
+
+def item_revenue(item_ids, units):
+    """Revenue of ``units`` sold per item, using the current ``Item.price``."""
+    unique_ids = np.unique(item_ids)
+    prices = dict(
+        Item.objects.filter(id__in=unique_ids.tolist()).values_list("id", "price")
+    )
+    price_array = np.array([prices.get(item_id, 0) for item_id in unique_ids.tolist()])
+    return units * price_array[np.searchsorted(unique_ids, item_ids)]
+
+
+def _watermark_name(db: str) -> str:
+    # Record ids are per database
+    return SALES_WATERMARK if db == DEFAULT_DB_ALIAS else f"{SALES_WATERMARK}:{db}"
+
+
+def _last_archived_day():
+    archived = archive.archived_until("purchase_records")
+    return None if archived is None else timezone.localtime(archived).date()
+
+
+def _day_runs(days: list):
+    """Split sorted ``days`` into ``(first, last)`` runs of consecutive days."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][1] == datetime.timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def _window_chunks(max_ids: dict, days: list, chunk_size: int):
+    tz = timezone.get_current_timezone()
+    for first, last in _day_runs(days):
+        start = datetime.datetime.combine(first, datetime.time.min, tzinfo=tz)
+        end = datetime.datetime.combine(
+            last + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz
+        )
+        for db, max_id in max_ids.items():
+            records = UserPurchaseRecord.objects.using(db).filter(
+                id__lte=max_id, timestamp__gte=start, timestamp__lt=end
+            )
+            # Found through the timestamp index, so the walk skips older records
+            first_id = records.aggregate(first_id=Min("id"))["first_id"]
+            if first_id is not None:
+                yield from iter_record_chunks(
+                    records, chunk_size, after_id=first_id - 1
+                )
+
+
+def build_sales_rollups(chunk_size: int, rebuild: bool = False) -> dict:
+    stats = {"records": 0, "days": 0, "rollups": 0}
+    watermarks, max_ids, days = {}, {}, set()
+    for db in sharding.user_databases():
+        watermark, _ = RollupWatermark.objects.get_or_create(name=_watermark_name(db))
+        last_id = 0 if rebuild else watermark.last_id
+        records = UserPurchaseRecord.objects.using(db)
+        max_id = records.aggregate(max_id=Max("id"))["max_id"] or 0
+        # Days changed in one shard are re-aggregated from every shard
+        max_ids[db] = max_id
+        if max_id <= last_id:
+            continue
+
+        watermarks[db] = watermark
+        new_records = records.filter(id__gt=last_id, id__lte=max_id)
+        stats["records"] += new_records.count()
+        days.update(new_records.dates("timestamp", "day"))
+    if not watermarks:
+        return stats
+
+    last_archived_day = _last_archived_day()
+    if last_archived_day is not None:
+        days = {day for day in days if day > last_archived_day}
+    days = sorted(days)
+    stats["days"] = len(days)
+
+    groups = np.empty((0, 2), dtype=np.int64)
+    units = revenue = buyers = np.empty(0, dtype=np.int64)
+    if days:
+        groups, units, buyers = aggregate_sales(
+            _window_chunks(max_ids, days, chunk_size),
+            days=np.array([day.toordinal() for day in days], dtype=np.int64),
+        )
+        revenue = item_revenue(groups[:, 0], units) if len(groups) else units
+
+    with transaction.atomic():
+        stale = SalesRollup.objects.all()
+        if not rebuild:
+            stale = stale.filter(day__in=days)
+        elif last_archived_day is not None:
+            stale = stale.filter(day__gt=last_archived_day)
+        stale.delete()
+        SalesRollup.objects.bulk_create(
+            SalesRollup(
+                item_id=item_id,
+                day=datetime.date.fromordinal(day),
+                units=unit_count,
+                revenue=revenue_total,
+                buyers=buyer_count,
+            )
+            for (item_id, day), unit_count, revenue_total, buyer_count in zip(
+                groups.tolist(), units.tolist(), revenue.tolist(), buyers.tolist()
+            )
+        )
+        for db, watermark in watermarks.items():
+            watermark.last_id = max_ids[db]
+            watermark.save(update_fields=["last_id"])
+
+    stats["rollups"] = len(groups)
+    return stats
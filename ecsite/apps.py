@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class EcsiteConfig(AppConfig):
+    name = "ecsite"
+
+    def ready(self):
+        # Connecting the cache invalidation, snapshot and item version
+        # receivers. These modules are imported by every process, keep their
+        # imports light.
+        from . import carts, catalog, signals, versions  # noqa: F401
@@ -0,0 +1,247 @@
+"""
+Time-based archival of the append-only history tables.
+
+Rows older than a cutoff are moved out of the database in bounded batches into
+gzip'd NDJSON segment files under ``settings.ARCHIVE_DIR``. Segments are never
+modified once written and are listed in ``manifest.json`` together with their
+id and time ranges, so audits can scan them with ``iter_archive()`` without
+restoring anything into the database. With user shards, every shard is archived
+into its own segments, named after the shard.
+
+Archived idempotency keys leave their key in ``ArchivedIdempotencyKey``, so
+purchases replaying them are rejected instead of being accepted as new orders.
+Runs hold a lock on the archive directory, so concurrent runs never lose each
+other's manifest entries.
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import sharding
+from .constants import STATUS_PENDING
+from .models import ArchivedIdempotencyKey, IdempotencyKey, UserPurchaseRecord
+
+MANIFEST = "manifest.json"
+LOCK = ".lock"
+
+# Archived table name: (model, time field, archived fields)
+TABLES = {
+    "purchase_records": (
+        UserPurchaseRecord,
+        "timestamp",
+        ["id", "user_id", "item_id", "quantity", "timestamp"],
+    ),
+    "idempotency_keys": (
+        IdempotencyKey,
+        "created_at",
+        ["id", "key", "user_id", "created_at", "status", "response_data"],
+    ),
+}
+
+
+def _directory(directory=None) -> Path:
+    return Path(directory or settings.ARCHIVE_DIR)
+
+
+def read_manifest(directory=None) -> dict:
+    path = _directory(directory) / MANIFEST
+    if not path.exists():
+        return {"segments": []}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def archived_until(table: str, directory=None):
+    """Time of the newest archived row of ``table``, None if nothing is archived."""
+    times = [
+        parse_datetime(segment["max_time"])
+        for segment in read_manifest(directory)["segments"]
+        if segment["table"] == table
+    ]
+    return max(times, default=None)
+
+
+def _write_atomically(path: Path, data: bytes):
+    # Written next to the target and renamed, so readers never see partial files
+    temp_path = path.with_name(f".{path.name}.tmp")
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+
+
+def _write_manifest(directory: Path, manifest: dict):
+    _write_atomically(directory / MANIFEST, json.dumps(manifest, indent=2).encode())
+
+
+def _queryset(table: str, db: str):
+    model, time_field, _ = TABLES[table]
+    queryset = model.objects.using(db)
+    if model is IdempotencyKey:
+        # Pending keys may still be waiting on a queued checkout
+        queryset = queryset.exclude(status=STATUS_PENDING)
+    return queryset, time_field
+
+
+def _delete_segment_rows(table: str, ids, db: str):
+    model = TABLES[table][0]
+    with transaction.atomic(using=db):
+        rows = model.objects.using(db).filter(id__in=ids)
+        if model is IdempotencyKey:
+            # Recovered segments may have recorded their keys already
+            ArchivedIdempotencyKey.objects.using(db).bulk_create(
+                [
+                    ArchivedIdempotencyKey(key=key, user_id=user_id)
+                    for key, user_id in rows.values_list("key", "user_id")
+                ],
+                ignore_conflicts=True,
+            )
+        rows.delete()
+
+
+@contextmanager
+def _locked(directory: Path):
+    """Holds the archive directory for one run, other runs wait for it."""
+    with open(directory / LOCK, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _recover(directory: Path, manifest: dict):
+    """
+    Finishes segments whose rows were written out but not deleted yet, e.g.
+    because a previous run was interrupted.
+    """
+    for segment in manifest["segments"]:
+        if segment["committed"]:
+            continue
+        ids = [row["id"] for row in _read_segment(directory, segment)]
+        db = segment.get("database", DEFAULT_DB_ALIAS)
+        _delete_segment_rows(segment["table"], ids, db)
+        segment["committed"] = True
+        _write_manifest(directory, manifest)
+
+
+def archive_table(table: str, cutoff, batch_size: int, directory=None):
+    """
+    Moves the rows of ``table`` older than ``cutoff`` into archive segments of at
+    most ``batch_size`` rows each. Yields the number of rows of every batch.
+    """
+    directory = _directory(directory)
+    (directory / table).mkdir(parents=True, exist_ok=True)
+    with _locked(directory):
+        # Read under the lock, so it has the segments of every earlier run
+        manifest = read_manifest(directory)
+        _recover(directory, manifest)
+
+        for db in sharding.user_databases():
+            yield from _archive_database(
+                table, db, cutoff, batch_size, directory, manifest
+            )
+
+
+def _archive_database(
+    table: str, db: str, cutoff, batch_size: int, directory: Path, manifest: dict
+):
+    queryset, time_field = _queryset(table, db)
+    fields = TABLES[table][2]
+    # Ids are per database, so segments of shards are named after the shard
+    name = table if db == DEFAULT_DB_ALIAS else f"{table}-{db}"
+    while True:
+        rows = list(
+            queryset.filter(**{f"{time_field}__lt": cutoff})
+            .order_by("id")
+            .values(*fields)[:batch_size]
+        )
+        if not rows:
+            return
+
+        times = [row[time_field] for row in rows]
+        data = gzip.compress(
+            b"".join(
+                json.dumps(row, default=_json_default).encode() + b"\n" for row in rows
+            )
+        )
+        file_name = (
+            f"{table}/{name}-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.ndjson.gz"
+        )
+        _write_atomically(directory / file_name, data)
+
+        segment = {
+            "table": table,
+            "database": db,
+            "file": file_name,
+            "rows": len(rows),
+            "min_id": rows[0]["id"],
+            "max_id": rows[-1]["id"],
+            "min_time": min(times).isoformat(),
+            "max_time": max(times).isoformat(),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "created_at": timezone.now().isoformat(),
+            "committed": False,
+        }
+        manifest["segments"].append(segment)
+        _write_manifest(directory, manifest)
+
+        # Rows are only deleted once their segment is durably listed
+        _delete_segment_rows(table, [row["id"] for row in rows], db)
+        segment["committed"] = True
+        _write_manifest(directory, manifest)
+        yield len(rows)
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+
+def _read_segment(directory: Path, segment: dict):
+    with gzip.open(directory / segment["file"], "rt") as segment_file:
+        for line in segment_file:
+            yield json.loads(line)
+
+
+def iter_archive(table: str, since=None, until=None, directory=None, **filters):
+    """
+    Yields archived rows of ``table`` as dicts in id order, optionally limited to
+    the ``[since, until)`` time range and to rows matching every field in
+    ``filters`` (e.g. ``user_id=1``). Segments outside of the time range are
+    skipped using the manifest alone.
+    """
+    directory = _directory(directory)
+    time_field = TABLES[table][1]
+    segments = sorted(
+        (
+            segment
+            for segment in read_manifest(directory)["segments"]
+            if segment["table"] == table
+        ),
+        key=lambda segment: segment["min_id"],
+    )
+    for segment in segments:
+        if since and parse_datetime(segment["max_time"]) < since:
+            continue
+        if until and parse_datetime(segment["min_time"]) >= until:
+            continue
+
+        for row in _read_segment(directory, segment):
+            row[time_field] = parse_datetime(row[time_field])
+            if since and row[time_field] < since:
+                continue
+            if until and row[time_field] >= until:
+                continue
+            if all(row.get(field) == value for field, value in filters.items()):
+                yield row
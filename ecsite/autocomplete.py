@@ -0,0 +1,233 @@
+"""
+Item name autocompletion.
+
+Every process keeps a radix trie of the item names, keyed by the whole name
+and by every word in it, so "app" finds both "Apple" and "Green apple". Each
+node caches the best ranked items below it (in stock first, then by units sold
+in the last ``settings.AUTOCOMPLETE_SALES_DAYS`` days, then by stock), so a
+lookup only walks down the prefix.
+
+Before every lookup the trie catches up with the catalog version, re-reading
+only the items listed in the catalog change log. It is rebuilt from scratch
+when the log does not cover the gap, and every
+``settings.AUTOCOMPLETE_REBUILD_SECONDS`` so that old sales age out.
+"""
+
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from . import catalog, inventory, sharding
+from .models import Item, UserPurchaseRecord
+
+_WORD = re.compile(r"\w+")
+
+
+class _Node:
+    __slots__ = ("label", "children", "item_ids", "top")
+
+    def __init__(self, label: str):
+        self.label = label
+        # First character of the child's label: child
+        self.children = {}
+        # Items with a key ending at this node
+        self.item_ids = set()
+        # Best ranked item ids of the subtree, None once outdated
+        self.top = None
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    length = min(len(a), len(b))
+    for index in range(length):
+        if a[index] != b[index]:
+            return index
+    return length
+
+
+def name_keys(name: str) -> set:
+    """Keys an item is found by: its name and every suffix starting a word."""
+    name = name.casefold()
+    return {name} | {name[match.start() :] for match in _WORD.finditer(name)}
+
+
+class AutocompleteIndex:
+    def __init__(self, size: int):
+        # Number of items ranked per node, the largest lookup limit
+        self.size = size
+        self._root = _Node("")
+        self._names = {}
+        self._ranks = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def _insert(self, key: str, item_id: int):
+        node = self._root
+        node.top = None
+        rest = key
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = node.children[rest[0]] = _Node(rest)
+                common = len(rest)
+            else:
+                common = _common_prefix_length(child.label, rest)
+                if common < len(child.label):
+                    # Splitting the edge where the key branches off
+                    middle = _Node(child.label[:common])
+                    child.label = child.label[common:]
+                    middle.children[child.label[0]] = child
+                    child = node.children[rest[0]] = middle
+            rest = rest[common:]
+            node = child
+            node.top = None
+        node.item_ids.add(item_id)
+
+    def _remove(self, key: str, item_id: int):
+        path = [self._root]
+        rest = key
+        while rest:
+            child = path[-1].children.get(rest[0])
+            if child is None or not rest.startswith(child.label):
+                return
+            rest = rest[len(child.label) :]
+            path.append(child)
+
+        path[-1].item_ids.discard(item_id)
+        for node in path:
+            node.top = None
+        # Dropping nodes left empty and merging nodes left with a single child
+        for parent, node in zip(reversed(path[:-1]), reversed(path[1:])):
+            if node.item_ids:
+                break
+            if not node.children:
+                del parent.children[node.label[0]]
+                continue
+            if len(node.children) == 1:
+                (child,) = node.children.values()
+                child.label = node.label + child.label
+                parent.children[child.label[0]] = child
+            break
+
+    def update(self, item_id: int, name: str, stock: int, sales: int):
+        """Adds an item or replaces its name and ranking."""
+        self.remove(item_id)
+        self._names[item_id] = name
+        self._ranks[item_id] = (stock <= 0, -sales, -stock, name.casefold(), item_id)
+        for key in name_keys(name):
+            self._insert(key, item_id)
+
+    def remove(self, item_id: int):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for key in name_keys(name):
+            self._remove(key, item_id)
+        del self._ranks[item_id]
+
+    def _top(self, node: _Node) -> list:
+        if node.top is None:
+            # An item found by several keys of the subtree is counted once
+            candidates = set(node.item_ids)
+            for child in node.children.values():
+                candidates.update(self._top(child))
+            node.top = heapq.nsmallest(self.size, candidates, key=self._ranks.get)
+        return node.top
+
+    def lookup(self, prefix: str, limit: int) -> list:
+        """The ``limit`` best ranked ``(id, name)`` pairs of items matching ``prefix``."""
+        node = self._root
+        rest = prefix.casefold()
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return []
+            common = _common_prefix_length(child.label, rest)
+            if common < min(len(child.label), len(rest)):
+                return []
+            rest = rest[common:]
+            node = child
+        return [(item_id, self._names[item_id]) for item_id in self._top(node)[:limit]]
+
+
+def load_items(item_ids=None) -> list:
+    """``(id, name, stock, recent sales)`` of the given items, or of all items."""
+    items = Item.objects.all()
+    records = UserPurchaseRecord.objects.filter(
+        timestamp__gte=timezone.now() - timedelta(days=settings.AUTOCOMPLETE_SALES_DAYS)
+    )
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+        records = records.filter(item_id__in=item_ids)
+
+    sales = defaultdict(int)
+    for db in sharding.user_databases():
+        for item_id, units in (
+            records.using(db)
+            .values("item_id")
+            .annotate(units=Sum("quantity"))
+            .values_list("item_id", "units")
+        ):
+            sales[item_id] += units
+    return [
+        (item_id, name, stock, sales.get(item_id, 0))
+        for item_id, name, stock in items.annotate(
+            stock=inventory.stock_expression()
+        ).values_list("id", "name", "stock")
+    ]
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.version = None
+        self.built_at = 0.0
+
+
+_state = _State()
+
+
+def _sync():
+    # Read first, so changes racing with the load are applied next time
+    version = catalog.get_catalog_version()
+    fresh = _state.index is not None and (
+        time.monotonic() - _state.built_at < settings.AUTOCOMPLETE_REBUILD_SECONDS
+    )
+    if fresh and _state.version == version:
+        return
+
+    changed = catalog.get_changes(_state.version, version) if fresh else None
+    if changed is None:
+        index = AutocompleteIndex(settings.AUTOCOMPLETE_MAX_LIMIT)
+        for row in load_items():
+            index.update(*row)
+        _state.index = index
+        _state.built_at = time.monotonic()
+    elif changed:
+        rows = load_items(changed)
+        # Items missing from the rows were deleted
+        for item_id in changed - {row[0] for row in rows}:
+            _state.index.remove(item_id)
+        for row in rows:
+            _state.index.update(*row)
+    _state.version = version
+
+
+def refresh():
+    """Brings the index up to date, e.g. before forking workers that share it."""
+    with _state.lock:
+        _sync()
+
+
+def complete(prefix: str, limit: int) -> list:
+    """Returns ``{"id", "name"}`` rows of the best ranked items matching ``prefix``."""
+    with _state.lock:
+        _sync()
+        matches = _state.index.lookup(prefix, limit)
+    return [{"id": item_id, "name": name} for item_id, name in matches]
@@ -0,0 +1,169 @@
+"""
+Cached read model of carts.
+
+Every cart is kept in the default cache as its lines together with the name,
+price and stock of their items, so viewing a cart costs no query. The cart
+views write their changes through to the cached model, carts that are deleted
+(purchased) are dropped, and item data is refreshed from the catalog cache the
+next time a cart is read after the catalog version changed.
+
+Concurrent writes to the same cart may race when updating the model; entries
+expire after ``settings.CART_CACHE_TIMEOUT`` to bound the damage.
+
+Carts are read from the database of their shard, see sharding.py.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import catalog, inventory, sharding
+from .models import Cart, CartItem
+
+
+def create(user) -> Cart:
+    """Creates the cart of a user, in the database of the user's shard."""
+    return Cart.objects.using(sharding.db_for_user(user.id)).create(
+        id=sharding.cart_id_for_user(user.id), user=user
+    )
+
+
+def touch(cart: Cart):
+    """
+    Records activity on a cart for the abandoned cart sweeper. Skipped while
+    the last recorded activity is recent, so busy carts are not written to on
+    every request.
+    """
+    now = timezone.now()
+    resolution = timedelta(seconds=settings.CART_ACTIVITY_RESOLUTION_SECONDS)
+    if now - cart.last_activity >= resolution:
+        Cart.objects.using(cart._state.db).filter(id=cart.id).update(last_activity=now)
+        cart.last_activity = now
+
+
+def _key(cart_id: int) -> str:
+    return f"cart:{cart_id}"
+
+
+def _line(cart_item: CartItem, item, stock: int) -> dict:
+    return {
+        "cart_item_id": cart_item.id,
+        "item_id": item.id,
+        "name": item.name,
+        "price": item.price,
+        "quantity": stock,
+        "requested_quantity": cart_item.quantity,
+    }
+
+
+def build(cart_id: int):
+    """Reads the model of a cart from the database, None if it does not exist."""
+    # Read first, so item changes racing with the build trigger a refresh
+    version = catalog.get_catalog_version()
+    db = sharding.db_for_cart(cart_id)
+    if not Cart.objects.using(db).filter(id=cart_id).exists():
+        return None
+
+    cart_items = list(
+        sharding.select_items(
+            CartItem.objects.using(db).filter(cart_id=cart_id).order_by("id")
+        )
+    )
+    inventory.attach_stock(cart_item.item for cart_item in cart_items)
+    return {
+        "catalog_version": version,
+        "lines": [
+            _line(cart_item, cart_item.item, cart_item.item.quantity)
+            for cart_item in cart_items
+        ],
+    }
+
+
+def _refresh(model: dict):
+    model["catalog_version"] = catalog.get_catalog_version()
+    rows = {
+        row["id"]: row
+        for row in catalog.get_items([line["item_id"] for line in model["lines"]])
+    }
+    # Lines of deleted items were deleted along with them
+    model["lines"] = [line for line in model["lines"] if line["item_id"] in rows]
+    for line in model["lines"]:
+        row = rows[line["item_id"]]
+        line["name"] = row["name"]
+        line["price"] = row["price"]
+        line["quantity"] = row["quantity"]
+
+
+def get_cart(cart_id: int):
+    """Returns the cached model of a cart, None if the cart does not exist."""
+    model = cache.get(_key(cart_id))
+    if model is None:
+        model = build(cart_id)
+        if model is None:
+            return None
+    elif model["catalog_version"] == catalog.get_catalog_version():
+        return model
+    else:
+        _refresh(model)
+
+    cache.set(_key(cart_id), model, timeout=settings.CART_CACHE_TIMEOUT)
+    return model
+
+
+def save_line(cart_id: int, cart_item: CartItem, stock: int):
+    """Writes an added or updated cart item through to the cached model."""
+    model = cache.get(_key(cart_id))
+    if model is None:
+        # Built on the next read
+        return
+
+    line = _line(cart_item, cart_item.item, stock)
+    for index, existing in enumerate(model["lines"]):
+        if existing["cart_item_id"] == cart_item.id:
+            model["lines"][index] = line
+            break
+    else:
+        model["lines"].append(line)
+    cache.set(_key(cart_id), model, timeout=settings.CART_CACHE_TIMEOUT)
+
+
+def delete_line(cart_id: int, cart_item_id: int):
+    model = cache.get(_key(cart_id))
+    if model is None:
+        return
+
+    model["lines"] = [
+        line for line in model["lines"] if line["cart_item_id"] != cart_item_id
+    ]
+    cache.set(_key(cart_id), model, timeout=settings.CART_CACHE_TIMEOUT)
+
+
+def cart_data(model: dict) -> dict:
+    """Same data as ``CartSerializer`` for the cart of ``model``."""
+    return {"items": sorted(line["item_id"] for line in model["lines"])}
+
+
+def cart_item_rows(model: dict) -> list:
+    return [
+        {
+            "cart_item_id": line["cart_item_id"],
+            "name": line["name"],
+            "quantity": line["quantity"],
+            "requested_quantity": line["requested_quantity"],
+            "price": line["price"],
+            # is_out_of_stock is defined by whether or not the requested quantity is available
+            "is_out_of_stock": line["quantity"] < line["requested_quantity"],
+        }
+        for line in model["lines"]
+    ]
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_written(sender, instance, using, **kwargs):
+    # Purchased carts are deleted, which drops their model once committed
+    cart_id = instance.id
+    transaction.on_commit(lambda: cache.delete(_key(cart_id)), using=using)
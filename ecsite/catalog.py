@@ -0,0 +1,256 @@
+"""
+Cached reads of the item catalog.
+
+Every committed item write bumps the catalog version, which callers can use to
+key derived data (facets, rendered listings ...), logs the ids of the changed
+items under the new version and drops their cached rows. Writes that bypass
+model signals, such as queryset updates and bulk creates, have to call
+``notify_items_changed()`` themselves.
+"""
+
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import inventory, metrics
+from .constants import FACET_MODE_QUANTILE
+from .models import Item
+from .signals import items_changed
+
+CATALOG_VERSION_KEY = "catalog:version"
+# Bumped when every item may have changed, retiring all per item entries at once
+CATALOG_GENERATION_KEY = "catalog:generation"
+
+
+def _get_counter(key: str) -> int:
+    value = cache.get(key)
+    if value is None:
+        # Seeding with the clock so a lost counter never repeats an older value
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _bump_counter(key: str):
+    """Returns the new value, None if the counter was lost and seeded again."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return None
+
+
+def get_catalog_version() -> int:
+    return _get_counter(CATALOG_VERSION_KEY)
+
+
+def _item_key(generation: int, item_id: int) -> str:
+    return f"catalog:item:{generation}:{item_id}"
+
+
+def _changes_key(version: int) -> str:
+    return f"catalog:changes:{version}"
+
+
+def _invalidate(item_ids):
+    version = _bump_counter(CATALOG_VERSION_KEY)
+    if version is not None:
+        cache.set(
+            _changes_key(version),
+            {"item_ids": item_ids},
+            timeout=settings.CATALOG_CHANGES_TIMEOUT,
+        )
+    if item_ids is None:
+        _bump_counter(CATALOG_GENERATION_KEY)
+    else:
+        generation = _get_counter(CATALOG_GENERATION_KEY)
+        cache.delete_many([_item_key(generation, item_id) for item_id in item_ids])
+    items_changed.send(sender=Item, item_ids=item_ids)
+
+
+def get_changes(since: int, version: int):
+    """
+    Ids of the items changed after catalog version ``since`` up to ``version``
+    from the change log in the cache. None when any item may have changed or
+    the log no longer covers all versions in between.
+    """
+    if not since <= version <= since + settings.CATALOG_CHANGES_MAX:
+        return None
+    keys = [_changes_key(number) for number in range(since + 1, version + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        return None
+
+    item_ids = set()
+    for entry in entries.values():
+        if entry["item_ids"] is None:
+            return None
+        item_ids.update(entry["item_ids"])
+    return item_ids
+
+
+def notify_items_changed(item_ids=None):
+    """
+    Invalidates cached catalog data once the current transaction commits.
+    ``item_ids=None`` invalidates every item.
+    """
+    item_ids = None if item_ids is None else list(item_ids)
+    transaction.on_commit(lambda: _invalidate(item_ids))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_written(sender, instance, **kwargs):
+    notify_items_changed([instance.id])
+
+
+def filter_items(name=None, min_price=None, max_price=None):
+    """Item queryset of the item listing filters, falsy filters are ignored."""
+    items = Item.objects.all()
+
+    if name:
+        items = items.filter(name__icontains=name)
+
+    if min_price:
+        items = items.filter(price__gte=min_price)
+
+    if max_price:
+        items = items.filter(price__lte=max_price)
+
+    return items
+
+
+def order_items(items, ordering: str, after=None):
+    """
+    Orders an item queryset by ``ordering`` (a field, "-" prefixed for
+    descending order) and then by id in the same direction, so every ordering
+    is an index scan and rows with equal values keep a stable order. Quantity
+    is ordered by the stock of the items, including sharded ones, which needs
+    a sort. ``after`` is the ``(value, id)`` of the last row of the previous
+    page.
+    """
+    field = ordering.lstrip("-")
+    descending = ordering.startswith("-")
+    if field == "quantity":
+        # Sharded items keep 0 in the column and are rendered with their stock
+        items = items.annotate(stock=inventory.stock_expression())
+        field = "stock"
+    items = items.order_by(
+        f"-{field}" if descending else field, "-id" if descending else "id"
+    )
+    if after is not None:
+        value, item_id = after
+        lookup = "lt" if descending else "gt"
+        items = items.filter(
+            Q(**{f"{field}__{lookup}": value})
+            | Q(**{field: value, f"id__{lookup}": item_id})
+        )
+    return items
+
+
+def get_items(item_ids) -> list:
+    """
+    Returns item rows (as rendered by ``ItemSerializer``) in the order of
+    ``item_ids``, skipping unknown ids. Cached rows are served first and all
+    misses are fetched with a single query.
+    """
+    generation = _get_counter(CATALOG_GENERATION_KEY)
+    keys = {item_id: _item_key(generation, item_id) for item_id in item_ids}
+    cached = cache.get_many(keys.values())
+    rows = {item_id: cached[key] for item_id, key in keys.items() if key in cached}
+
+    misses = [item_id for item_id in item_ids if item_id not in rows]
+    if misses:
+        # Imported on demand to keep DRF out of the app registry setup
+        from .serializers import item_rows
+
+        fetched = {
+            row["id"]: row for row in item_rows(Item.objects.filter(id__in=misses))
+        }
+        cache.set_many(
+            {keys[item_id]: row for item_id, row in fetched.items()},
+            timeout=settings.ITEM_CACHE_TIMEOUT,
+        )
+        rows.update(fetched)
+
+    metrics.ITEM_CACHE_REQUESTS.inc(len(item_ids) - len(misses), result="hit")
+    metrics.ITEM_CACHE_REQUESTS.inc(len(misses), result="miss")
+    return [rows[item_id] for item_id in item_ids if item_id in rows]
+
+
+def _fixed_buckets(prices, bucket_count: int) -> list:
+    low, high = prices[0][0], prices[-1][0]
+    # Ceiling division, prices are whole Yen so buckets are inclusive ranges
+    width = -(-(high - low + 1) // bucket_count)
+    buckets = []
+    for start in range(low, high + 1, width):
+        buckets.append({"min": start, "max": min(start + width - 1, high), "count": 0})
+    for price, count in prices:
+        buckets[(price - low) // width]["count"] += count
+    return buckets
+
+
+def _quantile_buckets(prices, bucket_count: int) -> list:
+    # Items of one price always share a bucket, so buckets are only roughly even
+    total = sum(count for _, count in prices)
+    buckets = []
+    seen = 0
+    for price, count in prices:
+        if not buckets or seen >= total * len(buckets) / bucket_count:
+            buckets.append({"min": price, "max": price, "count": 0})
+        buckets[-1]["max"] = price
+        buckets[-1]["count"] += count
+        seen += count
+    return buckets
+
+
+def price_facets(items, bucket_count: int, mode: str) -> dict:
+    """
+    Price facets of the ``items`` queryset: item count, in stock count, price
+    range and ``bucket_count`` price buckets, either of fixed width or holding
+    roughly the same number of items each. Runs one query grouping by price.
+    """
+    rows = list(
+        items.annotate(stock=inventory.stock_expression())
+        .order_by("price")
+        .values("price")
+        .annotate(count=Count("id"), in_stock=Count("id", filter=Q(stock__gt=0)))
+        .values_list("price", "count", "in_stock")
+    )
+    facets = {
+        "count": sum(row[1] for row in rows),
+        "in_stock": sum(row[2] for row in rows),
+        "min_price": rows[0][0] if rows else None,
+        "max_price": rows[-1][0] if rows else None,
+        "buckets": [],
+    }
+    if rows:
+        prices = [(price, count) for price, count, _ in rows]
+        if mode == FACET_MODE_QUANTILE:
+            facets["buckets"] = _quantile_buckets(prices, bucket_count)
+        else:
+            facets["buckets"] = _fixed_buckets(prices, bucket_count)
+    return facets
+
+
+def query_key(items) -> str:
+    """
+    Cache key of an item queryset for the current catalog version. Querysets
+    built from the same filters compile to the same SQL and share the key.
+    """
+    digest = hashlib.sha256(str(items.query).encode()).hexdigest()
+    return f"{get_catalog_version()}:{digest}"
+
+
+def get_price_facets(items, bucket_count: int, mode: str) -> dict:
+    """``price_facets()`` cached until the catalog changes."""
+    key = f"catalog:facets:{mode}:{bucket_count}:{query_key(items)}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = price_facets(items, bucket_count, mode)
+        cache.set(key, facets, timeout=settings.ITEM_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,340 @@
+"""
+Cart checkout, shared by the ``purchase`` action, the in-process group
+committer and the queued checkout worker.
+
+Carts are purchased in batches: stock is validated cart by cart in memory and
+then decremented once per item, so a batch takes each item's lock a single
+time. A cart that would oversell is rejected on its own without aborting the
+rest of the batch, and every cart gets its own outcome on its idempotency key.
+With user shards, the carts of each shard are purchased in their own
+transaction, see sharding.py.
+"""
+
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from . import catalog, inventory, metrics, sharding, stock_events, versions
+from .constants import ERROR_MESSAGES, STATUS_FAILED, STATUS_SUCCESS
+from .models import (
+    Cart,
+    CartItem,
+    CheckoutJob,
+    IdempotencyKey,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
+from .serializers import CartItemSerializer
+
+
+class StaleStockError(Exception):
+    """Stock changed between validating a batch and decrementing it."""
+
+
+def _fail(idempotency_val: IdempotencyKey, message: str):
+    idempotency_val.status = STATUS_FAILED
+    idempotency_val.response_data = {"error": message}
+
+
+def _record_purchases(db: str, purchases):
+    """
+    Appends ``(user_id, item_id, quantity)`` purchases to the ledger and adds
+    them to the per user and item summaries in the database ``db``.
+    """
+    UserPurchaseRecord.objects.using(db).bulk_create(
+        UserPurchaseRecord(user_id=user_id, item_id=item_id, quantity=quantity)
+        for user_id, item_id, quantity in purchases
+    )
+
+    totals = defaultdict(lambda: [0, 0])
+    for user_id, item_id, quantity in purchases:
+        totals[(user_id, item_id)][0] += quantity
+        totals[(user_id, item_id)][1] += 1
+
+    now = timezone.now()
+    summaries = UserItemPurchaseSummary.objects.using(db)
+    existing = summaries.select_for_update().filter(
+        user_id__in={user_id for user_id, _ in totals},
+        item_id__in={item_id for _, item_id in totals},
+    )
+    updated = []
+    for summary in existing:
+        if (summary.user_id, summary.item_id) not in totals:
+            continue
+        quantity, count = totals.pop((summary.user_id, summary.item_id))
+        # Incrementing in SQL so concurrent batches cannot lose updates
+        summary.total_quantity = F("total_quantity") + quantity
+        summary.purchase_count = F("purchase_count") + count
+        summary.last_purchased_at = now
+        updated.append(summary)
+
+    summaries.bulk_update(
+        updated, ["total_quantity", "purchase_count", "last_purchased_at"]
+    )
+    summaries.bulk_create(
+        UserItemPurchaseSummary(
+            user_id=user_id,
+            item_id=item_id,
+            total_quantity=quantity,
+            purchase_count=count,
+            last_purchased_at=now,
+        )
+        for (user_id, item_id), (quantity, count) in totals.items()
+    )
+
+
+def _checkout_batch(db: str, checkouts):
+    cart_ids = [cart_id for _, cart_id in checkouts]
+    carts = Cart.objects.using(db).in_bulk(cart_ids)
+
+    # Using select_for_update to lock rows until transaction is completed
+    cart_items = defaultdict(list)
+    for cart_item in sharding.select_items(
+        CartItem.objects.using(db)
+        .filter(cart_id__in=cart_ids)
+        .select_for_update()
+        .order_by("id")
+    ):
+        cart_items[cart_item.cart_id].append(cart_item)
+
+    items = {
+        cart_item.item_id: cart_item.item
+        for lines in cart_items.values()
+        for cart_item in lines
+    }
+    available = {
+        item.id: item.quantity for item in inventory.attach_stock(items.values())
+    }
+
+    demand = defaultdict(int)
+    purchased = {}
+    for idempotency_val, cart_id in checkouts:
+        cart = carts.get(cart_id)
+        if (
+            cart is None
+            or cart.user_id != idempotency_val.user_id
+            or cart_id in purchased
+        ):
+            _fail(idempotency_val, ERROR_MESSAGES["cart_does_not_exist"])
+            continue
+
+        lines = cart_items.get(cart_id)
+        if not lines:
+            _fail(idempotency_val, ERROR_MESSAGES["no_cart_items"])
+            continue
+
+        if any(line.quantity > available[line.item_id] for line in lines):
+            metrics.OUT_OF_STOCK.inc(action="purchase")
+            _fail(idempotency_val, ERROR_MESSAGES["not_enough_stock"])
+            continue
+
+        for line in lines:
+            available[line.item_id] -= line.quantity
+            demand[line.item_id] += line.quantity
+
+        idempotency_val.status = STATUS_SUCCESS
+        idempotency_val.response_data = CartItemSerializer(lines, many=True).data
+        purchased[cart_id] = idempotency_val
+
+    # Decrementing each item once, in id order to avoid lock order inversions
+    for item_id in sorted(demand):
+        if not inventory.decrement_stock(items[item_id], demand[item_id]):
+            raise StaleStockError()
+    versions.touch(demand)
+    stock_events.record(demand)
+    catalog.notify_items_changed(demand)
+
+    _record_purchases(
+        db,
+        [
+            (idempotency_val.user_id, line.item_id, line.quantity)
+            for cart_id, idempotency_val in purchased.items()
+            for line in cart_items[cart_id]
+        ],
+    )
+    Cart.objects.using(db).filter(id__in=purchased).delete()
+    IdempotencyKey.objects.using(db).bulk_update(
+        [idempotency_val for idempotency_val, _ in checkouts],
+        ["status", "response_data"],
+    )
+
+
+def checkout_batch(checkouts):
+    """
+    Purchases a batch of carts in one transaction per shard. ``checkouts`` is a
+    list of ``(idempotency_key, cart_id)`` pairs and each key is updated in
+    place with the outcome of its cart.
+    """
+    # Keys are stored in the shard of their user, together with the cart
+    shards = defaultdict(list)
+    for checkout in checkouts:
+        shards[checkout[0]._state.db].append(checkout)
+    for db, shard_checkouts in shards.items():
+        _checkout_shard(db, shard_checkouts)
+
+    for idempotency_val, _ in checkouts:
+        metrics.PURCHASES.inc(
+            result="success" if idempotency_val.status == STATUS_SUCCESS else "failure"
+        )
+
+
+def _checkout_shard(db: str, checkouts):
+    try:
+        _checkout_transaction(db, checkouts)
+    except StaleStockError:
+        # Another writer changed the stock, retry one cart at a time
+        for checkout in checkouts:
+            try:
+                _checkout_transaction(db, [checkout])
+            except StaleStockError:
+                metrics.OUT_OF_STOCK.inc(action="purchase")
+                _fail(checkout[0], ERROR_MESSAGES["not_enough_stock"])
+                checkout[0].save()
+
+
+def _checkout_transaction(db: str, checkouts):
+    """
+    Purchases ``checkouts`` in one transaction. On errors other than
+    ``StaleStockError`` only the keys of this rolled back transaction are
+    failed, carts purchased by earlier transactions keep their outcome.
+    """
+    try:
+        with sharding.atomic(db):
+            _checkout_batch(db, checkouts)
+    except StaleStockError:
+        raise
+    except Exception as e:
+        for idempotency_val, _ in checkouts:
+            _fail(idempotency_val, str(e))
+            idempotency_val.save()
+
+
+class _Waiter:
+    __slots__ = ("checkout", "wake", "lead", "finished", "error")
+
+    def __init__(self, checkout):
+        self.checkout = checkout
+        self.wake = threading.Event()
+        self.lead = False
+        self.finished = False
+        self.error = None
+
+
+class GroupCommitter:
+    """
+    Combines concurrent checkouts of one process into shared transactions.
+
+    The first caller to arrive becomes the leader: it waits up to ``window``
+    seconds (or until ``max_batch_size`` callers have joined) and then
+    purchases the whole group with ``apply``. Everyone else sleeps until their
+    checkout is done. Leadership moves to the oldest waiting caller as soon as
+    a group has been taken, so the next group fills up while one commits.
+    """
+
+    def __init__(self, window: float, max_batch_size: int, apply=None):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.apply = apply or checkout_batch
+        self._lock = threading.Lock()
+        self._batch_full = threading.Event()
+        self._queue = []
+        self._leader = None
+
+    def submit(self, idempotency_val: IdempotencyKey, cart_id: int):
+        waiter = _Waiter((idempotency_val, cart_id))
+        with self._lock:
+            self._queue.append(waiter)
+            if self._leader is None:
+                self._leader = waiter
+                waiter.lead = True
+            elif len(self._queue) >= self.max_batch_size:
+                self._batch_full.set()
+
+        while not waiter.finished:
+            if waiter.lead:
+                waiter.lead = False
+                self._lead()
+            else:
+                waiter.wake.wait()
+                waiter.wake.clear()
+
+        if waiter.error is not None:
+            raise waiter.error
+
+    def _lead(self):
+        if self.window > 0:
+            self._batch_full.wait(self.window)
+
+        with self._lock:
+            batch = self._queue[: self.max_batch_size]
+            del self._queue[: self.max_batch_size]
+            if len(self._queue) < self.max_batch_size:
+                self._batch_full.clear()
+
+            # The leader is always at the front, so it is part of its own batch
+            self._leader = self._queue[0] if self._queue else None
+            if self._leader is not None:
+                self._leader.lead = True
+                self._leader.wake.set()
+
+        try:
+            self.apply([waiter.checkout for waiter in batch])
+        except Exception as e:
+            for waiter in batch:
+                waiter.error = e
+        finally:
+            for waiter in batch:
+                waiter.finished = True
+                waiter.wake.set()
+
+
+_group_committer = None
+_group_committer_lock = threading.Lock()
+
+
+def group_commit(idempotency_val: IdempotencyKey, cart_id: int):
+    """Purchases the cart together with concurrent checkouts of this process."""
+    global _group_committer
+    if _group_committer is None:
+        with _group_committer_lock:
+            if _group_committer is None:
+                _group_committer = GroupCommitter(
+                    settings.GROUP_COMMIT_WINDOW_MS / 1000,
+                    settings.GROUP_COMMIT_MAX_BATCH_SIZE,
+                )
+    _group_committer.submit(idempotency_val, cart_id)
+
+
+def enqueue(idempotency_val: IdempotencyKey, cart_id: int) -> CheckoutJob:
+    # Queued next to the key, in the shard of its user
+    return CheckoutJob.objects.using(idempotency_val._state.db).create(
+        idempotency_key=idempotency_val, cart_id=cart_id
+    )
+
+
+def process_queue(batch_size: int) -> int:
+    """
+    Purchases up to ``batch_size`` queued carts of every shard, a batch per
+    shard. Returns the number of checkouts processed, 0 once the queue is
+    drained.
+    """
+    processed = 0
+    for db in sharding.user_databases():
+        with transaction.atomic(using=db):
+            jobs = list(
+                CheckoutJob.objects.using(db)
+                .select_for_update(skip_locked=True)
+                .select_related("idempotency_key")
+                .order_by("id")[:batch_size]
+            )
+            if not jobs:
+                continue
+
+            CheckoutJob.objects.using(db).filter(
+                id__in=[job.id for job in jobs]
+            ).delete()
+            checkout_batch([(job.idempotency_key, job.cart_id) for job in jobs])
+        processed += len(jobs)
+    return processed
@@ -6,11 +6,36 @@ QUANTITY = "quantity"
 NAME = "name"
 MIN_PRICE = "min_price"
 MAX_PRICE = "max_price"
+CURSOR = "cursor"
+LIMIT = "limit"
+IDS = "ids"
+BUCKETS = "buckets"
+MODE = "mode"
+PREFIX = "prefix"
+ORDERING = "ordering"
+SINCE = "since"
+LAST_EVENT_ID = "last_event_id"
+LAST_EVENT_ID_HEADER = "Last-Event-ID"
+
+# Orderings of the item listing, "-" for descending order
+ITEM_ORDERINGS = ("price", "-price", "name", "-name", "quantity", "-quantity")
 
 # Idempotency Related Constants
 IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
 IDEMPOTENCY_KEY = "idempotency_key"
 
+# Checkout Related Constants
+CHECKOUT_MODE_SYNC = "sync"
+CHECKOUT_MODE_ASYNC = "async"
+CHECKOUT_MODE_GROUP = "group"
+
+# Price facet bucketing modes
+FACET_MODE_FIXED = "fixed"
+FACET_MODE_QUANTILE = "quantile"
+
+# Profiling Related Constants
+PROFILE_HEADER = "X-Profile"
+
 STATUS_SUCCESS = "success"
 STATUS_PENDING = "pending"
 STATUS_FAILED = "failed"
@@ -34,4 +59,19 @@ ERROR_MESSAGES = {
     "invalid_min_price": "Min price must be a valid integer",
     "invalid_max_price": "Max price must be a valid integer",
     "no_cart_items": "Cart does not have any items",
+    "not_enough_stock": "Item does not have enough stock",
+    "invalid_cursor": "Cursor must be a value returned as next_cursor",
+    "invalid_limit": "Limit must be a positive integer",
+    "invalid_ids": "Ids must be a comma separated list of integers",
+    "too_many_ids": "Too many ids requested",
+    "invalid_buckets": "Buckets must be a positive integer within the allowed maximum",
+    "invalid_ordering": "Ordering must be one of price, name or quantity, optionally prefixed with -",
+    "invalid_since": "Since must be a version returned by a previous sync",
+    "invalid_last_event_id": "Last event id must be a non-negative integer",
+    "invalid_facet_mode": "Mode must be either fixed or quantile",
+    "invalid_prefix": "Prefix must be a non-empty string of at most 100 characters",
+    "invalid_autocomplete_limit": "Limit must be a positive integer within the allowed maximum",
+    "checkout_does_not_exist": "No checkout associated with provided idempotency key",
+    "idempotency_key_archived": "Idempotency key belongs to an archived purchase",
+    "staff_only": "Only staff users can access this endpoint",
 }
@@ -0,0 +1,135 @@
+"""
+Stock bookkeeping for items, including the optional sharded mode.
+
+A hot item's stock can be split across ``ItemStockShard`` counter rows so that
+concurrent purchases of the same item update different rows. For sharded items
+``Item.quantity`` stays at 0 and the available stock is the sum of its shards.
+"""
+
+import random
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from .models import Item, ItemStockShard
+
+
+def stock_expression():
+    """ORM expression of an item's available stock, usable in annotate()."""
+    shard_total = (
+        ItemStockShard.objects.filter(item=OuterRef("pk"))
+        .values("item")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return Case(
+        When(is_sharded=True, then=Coalesce(Subquery(shard_total), 0)),
+        default=F("quantity"),
+    )
+
+
+def get_sharded_stock(item_ids) -> dict:
+    rows = (
+        ItemStockShard.objects.filter(item_id__in=item_ids)
+        .values("item_id")
+        .annotate(total=Sum("quantity"))
+    )
+    totals = {item_id: 0 for item_id in item_ids}
+    totals.update({row["item_id"]: row["total"] for row in rows})
+    return totals
+
+
+def attach_stock(items) -> list:
+    """
+    Replaces ``quantity`` of sharded items with the sum of their shards, so the
+    items can be serialized as usual. Costs one query if any item is sharded.
+    """
+    items = list(items)
+    sharded_ids = [item.id for item in items if item.is_sharded]
+    if sharded_ids:
+        totals = get_sharded_stock(sharded_ids)
+        for item in items:
+            if item.is_sharded:
+                item.quantity = totals[item.id]
+    return items
+
+
+def get_stock(item: Item) -> int:
+    if not item.is_sharded:
+        return item.quantity
+    return get_sharded_stock([item.id])[item.id]
+
+
+def decrement_stock(item: Item, quantity: int) -> bool:
+    """
+    Takes ``quantity`` out of the item's stock. Has to run inside a transaction,
+    as a sharded decrement that runs out of stock half way is only undone by
+    rolling it back. Returns False if there is not enough stock.
+    """
+    if not item.is_sharded:
+        updated = Item.objects.filter(id=item.id, quantity__gte=quantity).update(
+            quantity=F("quantity") - quantity
+        )
+        return updated == 1
+
+    # Start at a random shard with stock and fall back to the others
+    shards = list(
+        ItemStockShard.objects.filter(item_id=item.id, quantity__gt=0).values_list(
+            "id", "quantity"
+        )
+    )
+    random.shuffle(shards)
+    remaining = quantity
+    for shard_id, shard_quantity in shards:
+        while shard_quantity > 0:
+            taken = min(remaining, shard_quantity)
+            updated = ItemStockShard.objects.filter(
+                id=shard_id, quantity__gte=taken
+            ).update(quantity=F("quantity") - taken)
+            if updated:
+                remaining -= taken
+                break
+            # A concurrent purchase took from the shard since it was read,
+            # taking what it still holds instead
+            shard_quantity = (
+                ItemStockShard.objects.filter(id=shard_id)
+                .values_list("quantity", flat=True)
+                .first()
+                or 0
+            )
+        if remaining == 0:
+            return True
+    return False
+
+
+@transaction.atomic
+def rebalance(item_id: int, shards: int) -> Item:
+    """
+    Spreads the item's stock evenly across ``shards`` counter rows. A shard
+    count of 0 moves the stock back into ``Item.quantity``.
+    """
+    item = Item.objects.select_for_update().get(id=item_id)
+    # Locking the shards keeps concurrent purchases from decrementing them
+    locked = list(ItemStockShard.objects.select_for_update().filter(item_id=item.id))
+    total = (
+        sum(shard.quantity for shard in locked) if item.is_sharded else item.quantity
+    )
+    ItemStockShard.objects.filter(item_id=item.id).delete()
+
+    if shards > 0:
+        per_shard, extra = divmod(total, shards)
+        ItemStockShard.objects.bulk_create(
+            ItemStockShard(
+                item_id=item.id,
+                shard=shard,
+                quantity=per_shard + (1 if shard < extra else 0),
+            )
+            for shard in range(shards)
+        )
+        item.quantity = 0
+        item.is_sharded = True
+    else:
+        item.quantity = total
+        item.is_sharded = False
+
+    item.save(update_fields=["quantity", "is_sharded"])
+    return item
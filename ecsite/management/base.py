@@ -0,0 +1,16 @@
+from django.core.checks import Tags
+from django.core.checks.registry import registry
+from django.core.management.base import BaseCommand
+
+# Checks importing the URLconf, the admin modules or the template tag libraries,
+# and with them the views and DRF
+REQUEST_CHECKS = {Tags.admin, Tags.templates, Tags.urls}
+
+
+class BackgroundCommand(BaseCommand):
+    """
+    Command of cron jobs and workers, which never serve requests. Runs every
+    system check except those of the request handling code.
+    """
+
+    requires_system_checks = sorted(set(registry.tags_available()) - REQUEST_CHECKS)
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from ecsite.management.base import BackgroundCommand
+from ecsite.archive import TABLES, archive_table
+
+
+class Command(BackgroundCommand):
+    help = "Moves old purchase records and idempotency keys into archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ARCHIVE_AFTER_DAYS,
+            help="Archive rows older than this many days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows moved per archive segment and transaction",
+        )
+        parser.add_argument(
+            "--table",
+            choices=sorted(TABLES),
+            action="append",
+            dest="tables",
+            help="Table to archive, defaults to all of them",
+        )
+        parser.add_argument(
+            "--dir",
+            default=None,
+            help="Archive directory, defaults to settings.ARCHIVE_DIR",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        for table in options["tables"] or sorted(TABLES):
+            start = time.perf_counter()
+            total = 0
+            for rows in archive_table(
+                table, cutoff, options["batch_size"], directory=options["dir"]
+            ):
+                total += rows
+                self.stdout.write(f"{table}: archived {rows} rows")
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{table}: archived {total} rows older than {cutoff:%Y-%m-%d} "
+                    f"in {elapsed:.2f}s"
+                )
+            )
@@ -0,0 +1,76 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from ecsite.models import Item
+from ecsite.serializers import ItemSerializer, item_rows
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compares rows per second of ItemSerializer against the fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 10000, 100000],
+            help="Numbers of items to serialize",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Runs per size, the fastest one is reported",
+        )
+
+    def measure(self, serialize, repeat):
+        best, body = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = JSONRenderer().render({"items": serialize()})
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            # Benchmark items are created in a transaction that is rolled back
+            with transaction.atomic():
+                created = 0
+                for size in sorted(options["sizes"]):
+                    Item.objects.bulk_create(
+                        Item(
+                            name=f"Benchmark item {i}", price=i % 10000, quantity=i % 50
+                        )
+                        for i in range(created, size)
+                    )
+                    created = max(created, size)
+                    items = Item.objects.order_by("id")[:size]
+
+                    drf_time, drf_body = self.measure(
+                        lambda: ItemSerializer(items, many=True).data, options["repeat"]
+                    )
+                    fast_time, fast_body = self.measure(
+                        lambda: item_rows(items), options["repeat"]
+                    )
+                    if drf_body != fast_body:
+                        raise CommandError(f"Rendered JSON differs at {size} rows")
+                    results.append((size, size / drf_time, size / fast_time))
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.stdout.write(
+            f"{'rows':>8} {'drf rows/s':>14} {'fast rows/s':>14} {'speedup':>8}"
+        )
+        for size, drf_rate, fast_rate in results:
+            self.stdout.write(
+                f"{size:>8} {drf_rate:>14,.0f} {fast_rate:>14,.0f} "
+                f"{fast_rate / drf_rate:>7.1f}x"
+            )
@@ -0,0 +1,120 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import CommandError
+from ecsite.management.base import BackgroundCommand
+
+# Runs in a fresh interpreter, so nothing is imported or cached yet
+PROBE = """
+import io, json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+wsgi = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+environ = {
+    "REQUEST_METHOD": "GET",
+    "PATH_INFO": sys.argv[1],
+    "QUERY_STRING": "",
+    "SERVER_NAME": "localhost",
+    "SERVER_PORT": "80",
+    "HTTP_HOST": "localhost",
+    "SERVER_PROTOCOL": "HTTP/1.1",
+    "wsgi.input": io.BytesIO(),
+    "wsgi.errors": sys.stderr,
+    "wsgi.url_scheme": "http",
+}
+statuses = []
+body = application(environ, lambda status, headers: statuses.append(status))
+b"".join(body)
+request = time.perf_counter()
+print(json.dumps({
+    "setup": setup - start,
+    "wsgi": wsgi - setup,
+    "urls": urls - wsgi,
+    "first_request": request - urls,
+    "status": statuses[0],
+    "modules": len(sys.modules),
+}))
+"""
+
+PHASES = ("setup", "wsgi", "urls", "first_request", "total")
+
+
+class Command(BackgroundCommand):
+    help = "Measures import time and time to first request of fresh worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            nargs="+",
+            default=["ecsite.settings", "ecsite.settings_api"],
+            help="Settings modules to compare",
+        )
+        parser.add_argument(
+            "--path",
+            default="/api/v1/items/",
+            help="Path of the first request",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Processes started per settings module, the median is reported",
+        )
+
+    def probe(self, profile: str, path: str) -> dict:
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, path],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        total = time.perf_counter() - start
+        if result.returncode != 0:
+            raise CommandError(f"{profile} failed to start:\n{result.stderr}")
+        # The last line, in case the first request logged anything
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        # A failing first request would otherwise be reported as a timing
+        if not timings["status"].startswith("2"):
+            raise CommandError(f"{profile} answered {path} with {timings['status']}")
+        timings["total"] = total
+        return timings
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':<24}"
+            + "".join(f"{phase + ' ms':>18}" for phase in PHASES)
+            + f"{'modules':>10}  status"
+        )
+        for profile in options["profiles"]:
+            runs = [
+                self.probe(profile, options["path"]) for _ in range(options["runs"])
+            ]
+            medians = {
+                phase: statistics.median(run[phase] for run in runs) * 1000
+                for phase in PHASES
+            }
+            self.stdout.write(
+                f"{profile:<24}"
+                + "".join(f"{medians[phase]:>18.1f}" for phase in PHASES)
+                + f"{runs[-1]['modules']:>10}  {runs[-1]['status']}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "total includes interpreter start up, the other phases add up to "
+                "the time until the first response"
+            )
+        )
@@ -0,0 +1,27 @@
+import time
+from django.conf import settings
+from ecsite.management.base import BackgroundCommand
+from ecsite.snapshots import build_snapshots
+
+
+class Command(BackgroundCommand):
+    help = "Pre-renders the item listing snapshots of the current catalog version"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default=None,
+            help="Directory to write the snapshots to (defaults to SNAPSHOT_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = build_snapshots(options["directory"])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {count} snapshots into "
+                f"{options['directory'] or settings.SNAPSHOT_DIR} in {elapsed:.2f}s"
+            )
+        )
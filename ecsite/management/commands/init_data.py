@@ -1,17 +1,22 @@
 import json
 import os
-from django.core.management.base import BaseCommand
+from django.db import transaction
+from ecsite.management.base import BackgroundCommand
+from ecsite import stock_events, versions
+from ecsite.catalog import notify_items_changed
 from ecsite.models import Item, User
 
 
-class Command(BaseCommand):
+class Command(BackgroundCommand):
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--file", default="MOCK_DATA.json", help="JSON file name to load data from"
         )
 
     def handle(self, *args, **options):
-        Item.objects.all().delete()
+        with versions.resetting():
+            Item.objects.all().delete()
         User.objects.all().delete()
 
         self.stdout.write(self.style.SUCCESS("All existing item data has been deleted"))
@@ -22,15 +27,20 @@ class Command(BaseCommand):
 
             with open(json_file_path) as json_file:
                 data = json.load(json_file)
-                items = [
-                    Item(
-                        name=item["name"],
-                        price=item["price"],
-                        quantity=item["quantity"],
-                    )
-                    for item in data
-                ]
-                Item.objects.bulk_create(items)
+                with transaction.atomic():
+                    version = versions.next_version()
+                    items = [
+                        Item(
+                            name=item["name"],
+                            price=item["price"],
+                            quantity=item["quantity"],
+                            version=version,
+                        )
+                        for item in data
+                    ]
+                    Item.objects.bulk_create(items)
+                    stock_events.record()
+                notify_items_changed()
 
             User.objects.create_superuser(
                 "testuser", email="testuser@example.com", password="testpassword"
@@ -0,0 +1,42 @@
+import time
+from django.conf import settings
+from ecsite.management.base import BackgroundCommand
+from ecsite import checkout
+
+
+class Command(BackgroundCommand):
+    help = "Purchases queued checkouts in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.CHECKOUT_BATCH_SIZE,
+            help="Maximum number of checkouts purchased per transaction",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new checkouts instead of exiting once drained",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.5,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = checkout.process_queue(options["batch_size"])
+            total += processed
+            if processed:
+                self.stdout.write(f"Processed {processed} checkouts")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} checkouts in total"))
@@ -0,0 +1,26 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from ecsite.management.base import BackgroundCommand
+from ecsite import stock_events
+
+
+class Command(BackgroundCommand):
+    help = "Deletes stock feed events older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=settings.STOCK_EVENTS_RETENTION_HOURS,
+            help="Delete events older than this many hours",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        deleted = stock_events.prune(timedelta(hours=options["hours"]))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} stock events in {time.perf_counter() - start:.2f}s"
+            )
+        )
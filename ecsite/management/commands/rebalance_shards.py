@@ -0,0 +1,54 @@
+import time
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+from ecsite.management.base import BackgroundCommand
+from ecsite import resharding
+
+
+class Command(BackgroundCommand):
+    help = "Migrates the user shards and moves users stored outside of their shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of users moved per transaction",
+        )
+        parser.add_argument(
+            "--no-migrate",
+            action="store_true",
+            help="Skip migrating the default database and the shards",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SHARDS:
+            raise CommandError("No user shards configured, set ECSITE_SHARDS")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be 1 or greater")
+
+        if not options["no_migrate"]:
+            for db in [DEFAULT_DB_ALIAS, *settings.SHARDS]:
+                self.stdout.write(f"Migrating {db}")
+                call_command(
+                    "migrate",
+                    database=db,
+                    interactive=False,
+                    verbosity=max(options["verbosity"] - 1, 0),
+                    stdout=self.stdout,
+                )
+
+        start = time.perf_counter()
+        total = 0
+        for source, target, users in resharding.rebalance(options["batch_size"]):
+            total += users
+            self.stdout.write(f"Moved {users} users from {source} to {target}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {total} users across {len(settings.SHARDS)} shards "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        )
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+from ecsite.management.base import BackgroundCommand
+from ecsite import inventory
+from ecsite.models import Item
+
+
+class Command(BackgroundCommand):
+    help = "Splits item stock evenly across sharded counter rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--item",
+            type=int,
+            action="append",
+            dest="items",
+            help="Item id to (re)shard, defaults to every sharded item",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=settings.INVENTORY_SHARDS,
+            help="Number of counter rows per item, 0 turns sharding off",
+        )
+
+    def handle(self, *args, **options):
+        shards = options["shards"]
+        if shards < 0:
+            raise CommandError("--shards must be 0 or greater")
+
+        item_ids = options["items"] or list(
+            Item.objects.filter(is_sharded=True).values_list("id", flat=True)
+        )
+        for item_id in item_ids:
+            try:
+                item = inventory.rebalance(item_id, shards)
+            except Item.DoesNotExist:
+                raise CommandError(f"No item associated with id {item_id}")
+
+            self.stdout.write(
+                f"Item {item.id}: {inventory.get_stock(item)} in stock across {shards} shards"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {len(item_ids)} items"))
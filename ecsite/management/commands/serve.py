@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from ecsite.server import PreforkServer, warm_up
+
+
+class Command(BaseCommand):
+    help = "Serves the API from pre-forked, pre-warmed worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+        parser.add_argument(
+            "--port", type=int, default=8000, help="Port to bind, 0 picks a free one"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes, defaults to the number of CPUs",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=1000,
+            help="Requests served by a worker before it is replaced, 0 for never",
+        )
+        parser.add_argument(
+            "--no-warmup",
+            action="store_false",
+            dest="warmup",
+            help="Skip warming the caches before forking",
+        )
+
+    def handle(self, *args, **options):
+        # Samples of previous runs would be added to the new workers' totals
+        for path in Path(settings.METRICS_DIR).glob("metrics_*.db"):
+            path.unlink(missing_ok=True)
+
+        application = get_wsgi_application()
+        if options["warmup"]:
+            stats = warm_up()
+            self.stdout.write(
+                f"Warmed up {stats['items']} items and {stats['users']} users "
+                f"in {stats['elapsed']:.2f}s"
+            )
+
+        server = PreforkServer(
+            application,
+            options["host"],
+            options["port"],
+            options["workers"],
+            options["max_requests"],
+        )
+        host, port = server.bind()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Serving on http://{host}:{port}/ with {options['workers']} workers"
+            )
+        )
+        self.stdout.flush()
+        server.serve_forever()
@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from ecsite.management.base import BackgroundCommand
+from ecsite.sweeper import sweep_carts
+
+
+class Command(BackgroundCommand):
+    help = "Deletes carts that have been idle for longer than the configured age"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=settings.CART_MAX_IDLE_DAYS,
+            help="Delete carts without activity for this many days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of cart ids looked at per transaction",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches, to leave room for live traffic",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Keep running, sweeping again every this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options)
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
+
+    def sweep(self, options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        start = time.perf_counter()
+        cart_total = item_total = 0
+        for carts, cart_items in sweep_carts(cutoff, options["batch_size"]):
+            cart_total += carts
+            item_total += cart_items
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        elapsed = time.perf_counter() - start
+        rows = cart_total + item_total
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {cart_total} carts and {item_total} cart items idle since "
+                f"{cutoff:%Y-%m-%d %H:%M} in {elapsed:.2f}s "
+                f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,291 @@
+"""
+Prometheus metrics shared between worker processes.
+
+Every process writes its samples into its own memory-mapped file inside
+``settings.METRICS_DIR``. The ``/metrics`` view merges all files found in that
+directory, so counters and histograms add up across workers without needing an
+external service. Clear the directory whenever the service is (re)deployed.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+
+_INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+class MmapedValues:
+    """
+    Append-only key/value file of float64 samples.
+
+    Layout: an 8 byte header holding the number of used bytes, followed by
+    entries of ``<key length><utf-8 key padded to 8 bytes><float64 value>``.
+    Values are updated in place, so readers in other processes always see the
+    latest totals without any locking between processes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        for key, _, position in self._iter_entries(self._map, self._used):
+            self._positions[key] = position
+
+    @staticmethod
+    def _iter_entries(data, used):
+        position = _HEADER.size
+        while position < used:
+            length = _KEY_LENGTH.unpack_from(data, position)[0]
+            key_start = position + _KEY_LENGTH.size
+            key = bytes(data[key_start : key_start + length]).decode("utf-8")
+            value_position = _padded(key_start + length)
+            yield key, _VALUE.unpack_from(data, value_position)[0], value_position
+            position = value_position + _VALUE.size
+
+    @classmethod
+    def read(cls, path: Path) -> dict:
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < _HEADER.size:
+            return {}
+        used = _HEADER.unpack_from(data, 0)[0]
+        return {key: value for key, value, _ in cls._iter_entries(data, used)}
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        value_position = _padded(self._used + _KEY_LENGTH.size + len(encoded))
+        end = value_position + _VALUE.size
+        if end > self._capacity:
+            while end > self._capacity:
+                self._capacity *= 2
+            self._map.close()
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + _KEY_LENGTH.size
+        self._map[start : start + len(encoded)] = encoded
+        _VALUE.pack_into(self._map, value_position, 0.0)
+        # Publishing the new size last keeps concurrent readers consistent
+        self._used = end
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_position
+        return value_position
+
+    def inc(self, key: str, amount: float):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = _VALUE.unpack_from(self._map, position)[0]
+            _VALUE.pack_into(self._map, position, value + amount)
+
+
+def _padded(position: int) -> int:
+    return position + (-position % 8)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> MmapedValues:
+    # A new file is opened whenever the process forks or the directory changes
+    global _store
+    directory = Path(settings.METRICS_DIR)
+    path = directory / f"metrics_{os.getpid()}.db"
+    store = _store
+    if store is None or store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                _store = MmapedValues(path)
+            store = _store
+    return store
+
+
+def _sample_key(name: str, labels: dict) -> str:
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _labels(self, labels: dict) -> dict:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return {name: str(value) for name, value in labels.items()}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        get_store().inc(_sample_key(self.name, self._labels(labels)), amount)
+
+    def samples(self, values: dict):
+        return sorted(
+            (self.name, labels, value)
+            for (name, labels), value in values.items()
+            if name == self.name
+        )
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        labels = self._labels(labels)
+        store = get_store()
+        # Only the matching bucket is stored; buckets are made cumulative on export
+        bucket = next(bound for bound in self.buckets if value <= bound)
+        store.inc(
+            _sample_key(f"{self.name}_bucket", {**labels, "le": _format(bucket)}), 1
+        )
+        store.inc(_sample_key(f"{self.name}_sum", labels), value)
+        store.inc(_sample_key(f"{self.name}_count", labels), 1)
+
+    def samples(self, values: dict):
+        result = []
+        label_sets = sorted(
+            labels for name, labels in values if name == f"{self.name}_count"
+        )
+        for labels in label_sets:
+            cumulative = 0
+            for bound in self.buckets:
+                le = (("le", _format(bound)),)
+                cumulative += values.get(
+                    (f"{self.name}_bucket", tuple(sorted(labels + le))), 0
+                )
+                result.append((f"{self.name}_bucket", labels + le, cumulative))
+            result.append(
+                (f"{self.name}_sum", labels, values[(f"{self.name}_sum", labels)])
+            )
+            result.append(
+                (f"{self.name}_count", labels, values[(f"{self.name}_count", labels)])
+            )
+        return result
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def collect() -> dict:
+    """Sums the samples written by every process into ``{(name, labels): value}``."""
+    values = {}
+    directory = Path(settings.METRICS_DIR)
+    if not directory.is_dir():
+        return values
+
+    for path in sorted(directory.glob("metrics_*.db")):
+        for key, value in MmapedValues.read(path).items():
+            name, labels = json.loads(key)
+            sample = (name, tuple(tuple(label) for label in labels))
+            values[sample] = values.get(sample, 0) + value
+    return values
+
+
+def render() -> str:
+    values = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples(values):
+            label_str = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+            if label_str:
+                name = f"{name}{{{label_str}}}"
+            lines.append(f"{name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = []
+
+REQUESTS = Counter(
+    "ecsite_requests_total",
+    "HTTP requests handled, by view action, method and status code.",
+    ["action", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "ecsite_request_duration_seconds",
+    "Time spent handling HTTP requests, by view action.",
+    ["action"],
+)
+PURCHASES = Counter(
+    "ecsite_purchases_total",
+    "Cart purchases, by result.",
+    ["result"],
+)
+IDEMPOTENCY_REPLAYS = Counter(
+    "ecsite_idempotency_replays_total",
+    "Purchases answered from a previously used idempotency key.",
+)
+OUT_OF_STOCK = Counter(
+    "ecsite_out_of_stock_total",
+    "Requests rejected because an item did not have enough stock, by action.",
+    ["action"],
+)
+ITEM_CACHE_REQUESTS = Counter(
+    "ecsite_item_cache_requests_total",
+    "Item lookups served by the per item cache, by result (hit or miss).",
+    ["result"],
+)
+SINGLEFLIGHT_SHARED = Counter(
+    "ecsite_singleflight_shared_total",
+    "Requests answered with the result of an identical request in flight, by "
+    "where it was shared (process or cache).",
+    ["scope"],
+)
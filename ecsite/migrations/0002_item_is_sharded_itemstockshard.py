@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="is_sharded",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="ItemStockShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_shards",
+                        to="ecsite.item",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("item", "shard")},
+            },
+        ),
+    ]
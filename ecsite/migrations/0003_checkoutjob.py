@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0002_item_is_sharded_itemstockshard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CheckoutJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cart_id", models.BigIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "idempotency_key",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkout_job",
+                        to="ecsite.idempotencykey",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    UserPurchaseRecord = apps.get_model("ecsite", "UserPurchaseRecord")
+    UserItemPurchaseSummary = apps.get_model("ecsite", "UserItemPurchaseSummary")
+    # The default database, or a user shard, see sharding.py
+    db = schema_editor.connection.alias
+
+    totals = (
+        UserPurchaseRecord.objects.using(db)
+        .filter(user__isnull=False)
+        .values("user_id", "item_id")
+        .annotate(
+            total_quantity=models.Sum("quantity"),
+            purchase_count=models.Count("id"),
+            last_purchased_at=models.Max("timestamp"),
+        )
+    )
+    UserItemPurchaseSummary.objects.using(db).bulk_create(
+        UserItemPurchaseSummary(**row) for row in totals.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0003_checkoutjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserItemPurchaseSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_quantity", models.PositiveIntegerField(default=0)),
+                ("purchase_count", models.PositiveIntegerField(default=0)),
+                ("last_purchased_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="userpurchaserecord",
+            index=models.Index(
+                fields=["user", "timestamp", "id"], name="purchase_user_timestamp_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="useritempurchasesummary",
+            name="item",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="ecsite.item"
+            ),
+        ),
+        migrations.AddField(
+            model_name="useritempurchasesummary",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="useritempurchasesummary",
+            unique_together={("user", "item")},
+        ),
+        migrations.RunPython(
+            backfill_summaries,
+            migrations.RunPython.noop,
+            hints={"model_name": "useritempurchasesummary"},
+        ),
+    ]
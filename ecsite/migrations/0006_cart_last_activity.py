@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0005_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="last_activity",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
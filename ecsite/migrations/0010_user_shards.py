@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:01
+
+import ecsite.sharding
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Foreign keys only lose their constraints with shards configured
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0009_item_versions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cart",
+            name="user",
+            field=models.OneToOneField(
+                **ecsite.sharding.cross_database_fk(),
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="cartitem",
+            name="item",
+            field=models.ForeignKey(
+                **ecsite.sharding.cross_database_fk(),
+                to="ecsite.item",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="idempotencykey",
+            name="user",
+            field=models.ForeignKey(
+                **ecsite.sharding.cross_database_fk(),
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="useritempurchasesummary",
+            name="item",
+            field=models.ForeignKey(
+                **ecsite.sharding.cross_database_fk(),
+                to="ecsite.item",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="useritempurchasesummary",
+            name="user",
+            field=models.ForeignKey(
+                **ecsite.sharding.cross_database_fk(),
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userpurchaserecord",
+            name="item",
+            field=models.ForeignKey(
+                **ecsite.sharding.cross_database_fk(),
+                to="ecsite.item",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userpurchaserecord",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                **ecsite.sharding.cross_database_fk(),
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
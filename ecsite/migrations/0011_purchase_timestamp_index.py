@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ecsite", "0010_user_shards"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userpurchaserecord",
+            index=models.Index(fields=["timestamp"], name="purchase_timestamp_idx"),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .constants import STATUS_CHOICES, STATUS_PENDING
+from .sharding import cross_database_fk
 
 
 class Item(models.Model):
@@ -8,16 +10,46 @@ class Item(models.Model):
     # Price is assumed to be in Yen without decimals.
     price = models.IntegerField()
     quantity = models.PositiveIntegerField(default=0)
+    # Stock of sharded items is kept in ItemStockShard rows instead of quantity
+    is_sharded = models.BooleanField(default=False)
+    # Change version of the last write to the name, price or stock, see versions.py
+    version = models.BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Ordered listings, with the id as tie-breaker of keyset pagination
+            models.Index(fields=["price", "id"], name="item_price_id_idx"),
+            models.Index(fields=["name", "id"], name="item_name_id_idx"),
+            models.Index(fields=["quantity", "id"], name="item_quantity_id_idx"),
+        ]
+
+
+class ItemStockShard(models.Model):
+    item = models.ForeignKey(
+        Item, on_delete=models.CASCADE, related_name="stock_shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("item", "shard")
+
+
+# Carts, idempotency keys, queued checkouts and purchases may be stored in the
+# shard of their user, see sharding.py. With shards, their foreign keys to items
+# and users in the default database have no database constraints.
 
 
 class Cart(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    user = models.OneToOneField(User, **cross_database_fk())
     items = models.ManyToManyField(Item, through="CartItem")
+    # Updated at most every CART_ACTIVITY_RESOLUTION_SECONDS, see carts.touch()
+    last_activity = models.DateTimeField(default=timezone.now)
 
 
 class IdempotencyKey(models.Model):
     key = models.CharField(max_length=100, null=False, unique=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=False)
+    user = models.ForeignKey(User, **cross_database_fk(), null=False)
     created_at = models.DateTimeField(auto_now_add=True)
     response_data = models.JSONField(null=True)
     status = models.CharField(
@@ -25,9 +57,24 @@ class IdempotencyKey(models.Model):
     )
 
 
+class ArchivedIdempotencyKey(models.Model):
+    # Key of an archived purchase, which can no longer be replayed
+    key = models.CharField(max_length=100, unique=True)
+    user = models.ForeignKey(User, **cross_database_fk())
+
+
+class CheckoutJob(models.Model):
+    # Queued purchase of a cart, processed by `manage.py process_checkouts`
+    idempotency_key = models.OneToOneField(
+        IdempotencyKey, on_delete=models.CASCADE, related_name="checkout_job"
+    )
+    cart_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
-    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, **cross_database_fk())
     quantity = models.PositiveIntegerField(default=0)
 
     class Meta:
@@ -35,12 +82,74 @@ class CartItem(models.Model):
 
 
 class UserPurchaseRecord(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, **cross_database_fk(), null=True, blank=True)
+    item = models.ForeignKey(Item, **cross_database_fk())
     quantity = models.PositiveIntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's order history over (timestamp, id)
+            models.Index(
+                fields=["user", "timestamp", "id"], name="purchase_user_timestamp_idx"
+            ),
+            # Finding the records of changed days for the sales rollups
+            models.Index(fields=["timestamp"], name="purchase_timestamp_idx"),
+        ]
+
     def __str__(self):
         return "{} of {} purchased on {}".format(
             self.quantity, self.item.name, self.timestamp
         )
+
+
+class UserItemPurchaseSummary(models.Model):
+    # Running totals per user and item, updated in the purchase transaction
+    user = models.ForeignKey(User, **cross_database_fk())
+    item = models.ForeignKey(Item, **cross_database_fk())
+    total_quantity = models.PositiveIntegerField(default=0)
+    purchase_count = models.PositiveIntegerField(default=0)
+    last_purchased_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "item")
+
+
+class SalesRollup(models.Model):
+    # Daily sales per item, built by `manage.py build_sales_rollups`
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    # Revenue in Yen, derived from the item price at the time of the rollup
+    revenue = models.BigIntegerField(default=0)
+    buyers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("item", "day")
+
+
+class RollupWatermark(models.Model):
+    # Highest UserPurchaseRecord id already included in a rollup
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+
+
+class StockEvent(models.Model):
+    # Stock of an item after a purchase or data load, streamed by the stock feed.
+    # Not a foreign key, events of deleted items are kept until they are pruned.
+    item_id = models.BigIntegerField()
+    quantity = models.PositiveIntegerField()
+    # Indexed for pruning old events
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class ItemTombstone(models.Model):
+    # Deleted item, reported to clients syncing changes after its version
+    item_id = models.BigIntegerField()
+    version = models.BigIntegerField(db_index=True)
+
+
+class Counter(models.Model):
+    # Named counter, incremented inside the writing transaction
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
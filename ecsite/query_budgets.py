@@ -0,0 +1,36 @@
+"""
+Query budgets of the API endpoints.
+
+``tests/test_query_budgets.py`` requests every routed action with a small and a
+large data set and fails when a request runs more queries than its budget, or
+when a list endpoint's query count grows with the data. New actions need a
+budget before that test passes. Counts include the queries of the middlewares
+(mock login and session handling, 5 per request) and savepoint statements.
+"""
+
+# (router basename, action): maximum number of queries of one request
+QUERY_BUDGETS = {
+    ("item", "list"): 7,
+    ("item", "facets"): 7,
+    ("item", "autocomplete"): 8,
+    ("cart", "list"): 8,
+    ("cart", "retrieve"): 8,
+    ("cart", "create"): 9,
+    ("cart", "add"): 14,
+    ("cart", "delete_cart_item"): 11,
+    ("cart", "purchase"): 30,
+    ("cart", "checkout_status"): 7,
+    ("order", "list"): 7,
+    ("order", "summary"): 7,
+}
+
+# Actions whose number of queries must not depend on the amount of data
+CONSTANT_QUERY_ACTIONS = {
+    ("item", "list"),
+    ("item", "facets"),
+    ("item", "autocomplete"),
+    ("cart", "list"),
+    ("cart", "retrieve"),
+    ("order", "list"),
+    ("order", "summary"),
+}
@@ -0,0 +1,243 @@
+"""
+Moving users between databases after the user shards changed.
+
+``rebalance()`` looks for users whose carts, idempotency keys, queued
+checkouts or purchases are stored outside of their shard, e.g. in the default
+database before sharding was enabled, or in an old shard after shards were
+added, and moves them in batches. Every batch is copied in a transaction on
+the target shard that commits before the rows are deleted from the source, so
+an interrupted run leaves the rows in both databases.
+
+Rows the users already have on the target, written there after the shards
+changed or left behind by an interrupted run, are kept: the moved rows are
+merged into them. Carts and cart items, idempotency keys (archived ones too)
+and purchase records already on the target win over the moved ones, and differing purchase
+summaries are added up.
+
+Moved rows get new ids, except carts, which take the id of their user. Run it
+while no requests are served.
+"""
+
+from collections import defaultdict
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from . import sharding
+from .models import (
+    ArchivedIdempotencyKey,
+    Cart,
+    CartItem,
+    CheckoutJob,
+    IdempotencyKey,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
+
+# Models with a user, whose rows are moved along with it
+USER_MODELS = [
+    Cart,
+    IdempotencyKey,
+    ArchivedIdempotencyKey,
+    UserPurchaseRecord,
+    UserItemPurchaseSummary,
+]
+
+
+def _source_databases() -> list:
+    databases = list(sharding.user_databases())
+    # Left over from before sharding was enabled
+    tables = connections[DEFAULT_DB_ALIAS].introspection.table_names()
+    if DEFAULT_DB_ALIAS not in databases and Cart._meta.db_table in tables:
+        databases.insert(0, DEFAULT_DB_ALIAS)
+    return databases
+
+
+def _user_ids(db: str) -> set:
+    user_ids = set()
+    for model in USER_MODELS:
+        user_ids.update(
+            model.objects.using(db)
+            .filter(user__isnull=False)
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+    return user_ids
+
+
+def _copy(rows: list, db: str, time_field=None, **values) -> list:
+    """
+    Inserts copies of ``rows`` into ``db`` with new ids and returns them.
+    ``values`` maps fields to functions of the original row giving their value.
+    """
+    if not rows:
+        return []
+
+    model = type(rows[0])
+    fields = [field.attname for field in model._meta.concrete_fields]
+    copies = []
+    for row in rows:
+        copy = model(
+            **{field: getattr(row, field) for field in fields if field != "id"}
+        )
+        for field, value in values.items():
+            setattr(copy, field, value(row))
+        copies.append(copy)
+    model.objects.using(db).bulk_create(copies)
+
+    if time_field is not None:
+        # bulk_create() stamps auto_now_add fields with the current time
+        for copy, row in zip(copies, rows):
+            setattr(copy, time_field, getattr(row, time_field))
+        model.objects.using(db).bulk_update(copies, [time_field])
+    return copies
+
+
+def _delete_users(db: str, user_ids: list):
+    # Cart items and queued checkouts are deleted along with carts and keys
+    for model in USER_MODELS:
+        model.objects.using(db).filter(user_id__in=user_ids).delete()
+
+
+def _move_carts(source: str, target: str, user_ids: list) -> dict:
+    """Merges the carts into the target, returns their ids on the target."""
+    target_carts = dict(
+        Cart.objects.using(target)
+        .filter(user_id__in=user_ids)
+        .values_list("user_id", "id")
+    )
+    carts = list(Cart.objects.using(source).filter(user_id__in=user_ids))
+    new_carts = [cart for cart in carts if cart.user_id not in target_carts]
+    copies = _copy(
+        new_carts, target, id=lambda cart: sharding.cart_id_for_user(cart.user_id)
+    )
+    cart_ids = {cart.id: copy.id for cart, copy in zip(new_carts, copies)}
+    for cart in carts:
+        cart_ids.setdefault(cart.id, target_carts.get(cart.user_id))
+
+    target_items = set(
+        CartItem.objects.using(target)
+        .filter(cart_id__in=cart_ids.values())
+        .values_list("cart_id", "item_id")
+    )
+    _copy(
+        [
+            cart_item
+            for cart_item in CartItem.objects.using(source).filter(cart_id__in=cart_ids)
+            if (cart_ids[cart_item.cart_id], cart_item.item_id) not in target_items
+        ],
+        target,
+        cart_id=lambda cart_item: cart_ids[cart_item.cart_id],
+    )
+    return cart_ids
+
+
+def _move_keys(source: str, target: str, user_ids: list, cart_ids: dict):
+    keys = list(IdempotencyKey.objects.using(source).filter(user_id__in=user_ids))
+    # Keys are unique, a retry may already have stored one on the target
+    target_keys = set(
+        IdempotencyKey.objects.using(target)
+        .filter(key__in=[key.key for key in keys])
+        .values_list("key", flat=True)
+    )
+    keys = [key for key in keys if key.key not in target_keys]
+    key_ids = {
+        key.id: copy.id
+        for key, copy in zip(keys, _copy(keys, target, time_field="created_at"))
+    }
+    _copy(
+        list(CheckoutJob.objects.using(source).filter(idempotency_key_id__in=key_ids)),
+        target,
+        time_field="created_at",
+        idempotency_key_id=lambda job: key_ids[job.idempotency_key_id],
+        cart_id=lambda job: cart_ids.get(job.cart_id, job.cart_id),
+    )
+
+    archived = list(
+        ArchivedIdempotencyKey.objects.using(source).filter(user_id__in=user_ids)
+    )
+    target_archived = set(
+        ArchivedIdempotencyKey.objects.using(target)
+        .filter(key__in=[key.key for key in archived])
+        .values_list("key", flat=True)
+    )
+    _copy([key for key in archived if key.key not in target_archived], target)
+
+
+def _move_purchases(source: str, target: str, user_ids: list):
+    # Copies keep the time of their record, which tells them from new purchases
+    fields = ["user_id", "item_id", "quantity", "timestamp"]
+    target_records = set(
+        UserPurchaseRecord.objects.using(target)
+        .filter(user_id__in=user_ids)
+        .values_list(*fields)
+    )
+    _copy(
+        [
+            record
+            for record in UserPurchaseRecord.objects.using(source).filter(
+                user_id__in=user_ids
+            )
+            if tuple(getattr(record, field) for field in fields) not in target_records
+        ],
+        target,
+        time_field="timestamp",
+    )
+
+    target_summaries = {
+        (summary.user_id, summary.item_id): summary
+        for summary in UserItemPurchaseSummary.objects.using(target).filter(
+            user_id__in=user_ids
+        )
+    }
+    new_summaries, merged = [], []
+    for summary in UserItemPurchaseSummary.objects.using(source).filter(
+        user_id__in=user_ids
+    ):
+        existing = target_summaries.get((summary.user_id, summary.item_id))
+        if existing is None:
+            new_summaries.append(summary)
+        elif (
+            existing.total_quantity,
+            existing.purchase_count,
+            existing.last_purchased_at,
+        ) != (
+            summary.total_quantity,
+            summary.purchase_count,
+            summary.last_purchased_at,
+        ):
+            existing.total_quantity += summary.total_quantity
+            existing.purchase_count += summary.purchase_count
+            existing.last_purchased_at = max(
+                existing.last_purchased_at, summary.last_purchased_at
+            )
+            merged.append(existing)
+    _copy(new_summaries, target)
+    UserItemPurchaseSummary.objects.using(target).bulk_update(
+        merged, ["total_quantity", "purchase_count", "last_purchased_at"]
+    )
+
+
+def _move_users(source: str, target: str, user_ids: list):
+    # The target commits first, so rows are never only in an uncommitted copy
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        cart_ids = _move_carts(source, target, user_ids)
+        _move_keys(source, target, user_ids, cart_ids)
+        _move_purchases(source, target, user_ids)
+        _delete_users(source, user_ids)
+
+
+def rebalance(batch_size: int):
+    """
+    Moves every user stored outside of their shard to it, ``batch_size``
+    users per transaction. Yields ``(source, target, users)`` for every batch.
+    """
+    for source in _source_databases():
+        moves = defaultdict(list)
+        for user_id in sorted(_user_ids(source)):
+            target = sharding.db_for_user(user_id)
+            if target != source:
+                moves[target].append(user_id)
+
+        for target, user_ids in moves.items():
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start : start + batch_size]
+                _move_users(source, target, batch)
+                yield source, target, len(batch)
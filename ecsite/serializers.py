@@ -1,5 +1,15 @@
+from collections import defaultdict
 from rest_framework import serializers
-from .models import CartItem, Item, Cart, IdempotencyKey, User
+from . import inventory, sharding
+from .models import (
+    CartItem,
+    Item,
+    Cart,
+    IdempotencyKey,
+    User,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
 from .constants import ERROR_MESSAGES
 
 
@@ -27,6 +37,64 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["items"]
 
 
+class UserPurchaseRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserPurchaseRecord
+        fields = ["id", "item", "quantity", "timestamp"]
+
+
+class UserItemPurchaseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserItemPurchaseSummary
+        fields = ["item", "total_quantity", "purchase_count", "last_purchased_at"]
+
+
+# Fast paths for hot read endpoints. Building rows straight from values_list()
+# tuples skips model instantiation and per-field serializer introspection, while
+# rendering to the same JSON as the ModelSerializers above.
+
+
+def item_rows(items) -> list:
+    """Same data as ``ItemSerializer(items, many=True).data`` for a queryset."""
+    rows = list(items.values_list(*ItemSerializer.Meta.fields, "is_sharded"))
+    sharded_ids = [row[0] for row in rows if row[-1]]
+    stock = inventory.get_sharded_stock(sharded_ids) if sharded_ids else {}
+    return [
+        {"id": id, "name": name, "price": price, "quantity": stock.get(id, quantity)}
+        for id, name, price, quantity, _ in rows
+    ]
+
+
+def cart_rows(carts) -> list:
+    """Same data as ``CartSerializer(carts, many=True).data`` for a queryset."""
+    cart_ids = list(carts.values_list("id", flat=True))
+    items = defaultdict(list)
+    for cart_id, item_id in (
+        CartItem.objects.using(carts.db)
+        .filter(cart_id__in=cart_ids)
+        .order_by("cart_id", "item_id")
+        .values_list("cart_id", "item_id")
+    ):
+        items[cart_id].append(item_id)
+    return [{"items": items[cart_id]} for cart_id in cart_ids]
+
+
+class CartField(serializers.PrimaryKeyRelatedField):
+    """Primary key of a cart, looked up in the database of the cart's shard."""
+
+    def to_internal_value(self, data):
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            db = sharding.db_for_cart(int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.get_queryset().using(db).get(pk=data)
+        except Cart.DoesNotExist:
+            self.fail("does_not_exist", pk_value=data)
+
+
 class AddCartItemSerializer(serializers.Serializer):
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -42,7 +110,7 @@ class AddCartItemSerializer(serializers.Serializer):
             "does_not_exist": ERROR_MESSAGES["item_does_not_exist"],
         },
     )
-    cart_id = serializers.PrimaryKeyRelatedField(
+    cart_id = CartField(
         queryset=Cart.objects.all(),
         error_messages={
             "required": ERROR_MESSAGES["invalid_cart_id"],
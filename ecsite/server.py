@@ -0,0 +1,191 @@
+"""
+Pre-forking WSGI server built on ``wsgiref``, used by ``manage.py serve``.
+
+The parent process loads the application, warms its caches and opens the
+listening socket, then forks the workers, which inherit all of it. Workers
+accept connections from the shared socket and exit after serving
+``max_requests`` requests; the parent replaces every worker that exits.
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.urls import get_resolver, resolve
+from django.urls.exceptions import Resolver404
+from . import autocomplete, catalog
+from .middlewares import user_cache_key
+from .models import Item
+
+logger = logging.getLogger(__name__)
+
+# Paths resolved once before forking, so the resolver caches are populated
+WARMUP_PATHS = (
+    "/api/v1/items/",
+    "/api/v1/items/facets/",
+    "/api/v1/items/autocomplete/",
+    "/api/v1/cart/",
+    "/api/v1/cart/1/",
+    "/api/v1/cart/1/items/",
+    "/api/v1/cart/1/purchase/",
+    "/api/v1/orders/",
+    "/metrics",
+)
+
+
+def warm_up(max_users: int = 1000, chunk_size: int = 1000) -> dict:
+    """
+    Loads what the first requests of every worker would otherwise load: the
+    lazily imported modules, the URL resolver, the autocomplete index, the per
+    item catalog cache and the users looked up by the mock login middleware.
+    """
+    start = time.perf_counter()
+    from . import checkout, snapshots, views  # noqa: F401
+
+    get_resolver().url_patterns
+    for path in WARMUP_PATHS:
+        try:
+            resolve(path)
+        except Resolver404:
+            pass
+
+    autocomplete.refresh()
+    item_ids = list(Item.objects.order_by("id").values_list("id", flat=True))
+    for index in range(0, len(item_ids), chunk_size):
+        catalog.get_items(item_ids[index : index + chunk_size])
+
+    users = list(User.objects.order_by("id")[:max_users])
+    cache.set_many(
+        {user_cache_key(user.username): user for user in users},
+        timeout=settings.USER_CACHE_TIMEOUT,
+    )
+    return {
+        "items": len(item_ids),
+        "users": len(users),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+class _RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class _WorkerServer(WSGIServer):
+    """WSGIServer accepting connections from an already listening socket."""
+
+    def __init__(self, listener: socket.socket, application):
+        super().__init__(
+            listener.getsockname()[:2], _RequestHandler, bind_and_activate=False
+        )
+        self.socket.close()
+        self.socket = listener
+        self.server_name, self.server_port = listener.getsockname()[:2]
+        self.setup_environ()
+        self.set_app(application)
+        self.handled = 0
+
+    def finish_request(self, request, client_address):
+        super().finish_request(request, client_address)
+        self.handled += 1
+
+
+class _Shutdown(Exception):
+    pass
+
+
+_SHUTDOWN_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+def _shutdown(signum, frame):
+    raise _Shutdown()
+
+
+class PreforkServer:
+    def __init__(self, application, host: str, port: int, workers: int, max_requests):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.listener = None
+        self.workers = set()
+
+    def bind(self) -> tuple:
+        self.listener = socket.create_server((self.host, self.port), backlog=128)
+        # Workers wait in select(), so losing the race for a connection must not block
+        self.listener.setblocking(False)
+        return self.listener.getsockname()[:2]
+
+    def _run_worker(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _SHUTDOWN_SIGNALS)
+        server = _WorkerServer(self.listener, self.application)
+        while not self.max_requests or server.handled < self.max_requests:
+            server.handle_request()
+
+    def spawn(self):
+        # Connections must not be shared between processes
+        connections.close_all()
+        # Held back until the worker has its own handlers and is in self.workers
+        signal.pthread_sigmask(signal.SIG_BLOCK, _SHUTDOWN_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                try:
+                    self._run_worker()
+                except BaseException:
+                    logger.exception("Worker crashed")
+                    status = 1
+                finally:
+                    os._exit(status)
+            self.workers.add(pid)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SHUTDOWN_SIGNALS)
+
+    def serve_forever(self):
+        if self.listener is None:
+            self.bind()
+        previous = {
+            signum: signal.signal(signum, _shutdown) for signum in _SHUTDOWN_SIGNALS
+        }
+        try:
+            for _ in range(self.worker_count):
+                self.spawn()
+            while True:
+                pid, status = os.wait()
+                self.workers.discard(pid)
+                if status:
+                    # Crashed, backing off so a broken worker cannot spin
+                    time.sleep(1)
+                # Otherwise recycled after max_requests
+                self.spawn()
+        except _Shutdown:
+            pass
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.stop()
+
+    def stop(self):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.workers.clear()
+        if self.listener is not None:
+            self.listener.close()
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ecsite.middlewares.MetricsMiddleware",
+    "ecsite.middlewares.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "ecsite.middlewares.MockLoginUserMiddleware",
+    "ecsite.middlewares.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "ecsite.urls"
@@ -71,6 +76,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "ecsite.wsgi.application"
 
+# "default" serves the browsable API root, "simple" only the API routes
+API_ROUTER = "default"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -78,7 +86,7 @@ WSGI_APPLICATION = "ecsite.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("ECSITE_DB_PATH", BASE_DIR / "db.sqlite3"),
     }
 }
 
@@ -123,3 +131,211 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Metrics
+# Every worker process writes its samples into this directory and the
+# /metrics endpoint aggregates them. Clear it whenever the service restarts.
+
+METRICS_DIR = Path(
+    os.environ.get("ECSITE_METRICS_DIR", Path(tempfile.gettempdir()) / "ecsite_metrics")
+)
+
+
+# Request profiling
+# Requests from staff users sending the X-Profile header, plus a random sample
+# of PROFILING_SAMPLE_RATE (0.0 - 1.0) of all requests, are run under cProfile.
+
+PROFILING_DIR = Path(
+    os.environ.get(
+        "ECSITE_PROFILING_DIR", Path(tempfile.gettempdir()) / "ecsite_profiles"
+    )
+)
+PROFILING_SAMPLE_RATE = float(os.environ.get("ECSITE_PROFILING_SAMPLE_RATE", 0.0))
+
+
+# Slow query log
+# Statements of requests taking at least SLOW_QUERY_THRESHOLD_MS are appended
+# with their parameters, view and query plan to a file per process in the
+# private SLOW_QUERY_LOG_DIR, and summarized for staff users by
+# GET /api/v1/slow-queries/. None (ECSITE_SLOW_QUERY_MS empty or "off")
+# disables the log.
+
+_slow_query_ms = os.environ.get("ECSITE_SLOW_QUERY_MS", "100").strip()
+SLOW_QUERY_THRESHOLD_MS = (
+    None if _slow_query_ms.lower() in ("", "off") else float(_slow_query_ms)
+)
+SLOW_QUERY_LOG_DIR = Path(
+    os.environ.get(
+        "ECSITE_SLOW_QUERY_LOG_DIR",
+        Path(tempfile.gettempdir()) / f"ecsite_slow_queries_{os.getuid()}",
+    )
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+# Statements a process remembers having captured the query plan of
+SLOW_QUERY_EXPLAINED_MAX = 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+
+# Inventory
+# Default number of stock counter rows used by `manage.py rebalance_stock`
+
+INVENTORY_SHARDS = 8
+
+
+# Checkout
+# "sync" purchases carts within the request. "group" also does, but combines
+# the concurrent purchases of a process into shared transactions, waiting up to
+# GROUP_COMMIT_WINDOW_MS for a group to fill up. "async" queues the purchase,
+# answers 202 and leaves it to `manage.py process_checkouts`.
+
+CHECKOUT_MODE = os.environ.get("ECSITE_CHECKOUT_MODE", "sync")
+CHECKOUT_BATCH_SIZE = 100
+GROUP_COMMIT_WINDOW_MS = 5
+GROUP_COMMIT_MAX_BATCH_SIZE = 50
+
+
+# Order history
+
+ORDER_HISTORY_PAGE_SIZE = 20
+ORDER_HISTORY_MAX_PAGE_SIZE = 100
+
+
+# Archival
+# `manage.py archive_history` moves purchase records and idempotency keys older
+# than ARCHIVE_AFTER_DAYS into compressed files in ARCHIVE_DIR. Keys that are
+# archived can no longer be replayed.
+
+ARCHIVE_DIR = Path(os.environ.get("ECSITE_ARCHIVE_DIR", BASE_DIR / "archive"))
+ARCHIVE_AFTER_DAYS = 90
+
+
+# Catalog cache
+# Item rows served by `GET /api/v1/items/?ids=...` are cached per item in the
+# default cache and dropped whenever the item is written. The default cache is
+# a memory-mapped file shared by all worker processes of the host, holding
+# SLOTS entries of up to SLOT_SIZE bytes. Set ECSITE_CACHE=locmem for a cache
+# per process. Delete the file after changing its options.
+
+if os.environ.get("ECSITE_CACHE", "shm") == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ecsite",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "ecsite.shm_cache.SharedMemoryCache",
+            "LOCATION": os.environ.get(
+                "ECSITE_CACHE_PATH", Path(tempfile.gettempdir()) / "ecsite_cache"
+            ),
+            "OPTIONS": {"SLOTS": 16384, "SLOT_SIZE": 4096},
+        }
+    }
+# Tests run against a cache file of their own, see ecsite/tests/runner.py
+TEST_RUNNER = "ecsite.tests.runner.TestRunner"
+ITEM_CACHE_TIMEOUT = 300
+# Carts are cached as read models that their views write through to
+CART_CACHE_TIMEOUT = 300
+# Users looked up by the mock login middleware
+USER_CACHE_TIMEOUT = 300
+# Replies of finished purchases, replayed for reused idempotency keys
+IDEMPOTENCY_CACHE_TIMEOUT = 300
+ITEMS_MULTI_GET_MAX = 100
+# Largest page of `GET /api/v1/items/?limit=`
+ITEMS_MAX_LIMIT = 1000
+
+# Default and maximum number of price buckets of `GET /api/v1/items/facets/`
+FACET_BUCKETS = 10
+FACET_MAX_BUCKETS = 50
+# Versions of item changes kept in the cache for indexes catching up with them
+CATALOG_CHANGES_TIMEOUT = 300
+CATALOG_CHANGES_MAX = 1000
+
+# Stock feed
+# `GET /api/v1/stock/events/` streams the stock of purchased items as server-sent
+# events, sending the latest stock per item changed within every window. Streams
+# end after STOCK_FEED_MAX_SECONDS, clients reconnect with their Last-Event-ID.
+# Serve it under ASGI, a WSGI worker is held for the whole stream.
+
+STOCK_FEED_WINDOW_MS = 500
+STOCK_FEED_BATCH_SIZE = 1000
+STOCK_FEED_MAX_SECONDS = 300
+STOCK_FEED_HEARTBEAT_SECONDS = 15
+# Events older than this are deleted by `manage.py prune_stock_events`
+STOCK_EVENTS_RETENTION_HOURS = 24
+
+# Item name autocompletion
+# `GET /api/v1/items/autocomplete/?prefix=` ranks matching items by stock and
+# units sold in the last AUTOCOMPLETE_SALES_DAYS. Every process rebuilds its
+# index after AUTOCOMPLETE_REBUILD_SECONDS so that old sales age out.
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_SALES_DAYS = 7
+AUTOCOMPLETE_REBUILD_SECONDS = 300
+
+
+# Catalog snapshots
+# With ECSITE_SNAPSHOTS=1 the unfiltered item listing and the filter sets of
+# SNAPSHOT_FILTERS (e.g. {"name": "wine", "max_price": 1000}) are served from
+# files pre-rendered by `manage.py build_snapshots` into SNAPSHOT_DIR. They are
+# rebuilt in the background, SNAPSHOT_REBUILD_DELAY_MS after the catalog changed.
+
+SNAPSHOTS_ENABLED = os.environ.get("ECSITE_SNAPSHOTS", "") == "1"
+SNAPSHOT_DIR = Path(
+    os.environ.get(
+        "ECSITE_SNAPSHOT_DIR", Path(tempfile.gettempdir()) / "ecsite_snapshots"
+    )
+)
+SNAPSHOT_FILTERS = []
+SNAPSHOT_REBUILD_DELAY_MS = 200
+
+
+# Request coalescing
+# Identical concurrent item listings of a process always share one query. With
+# SINGLEFLIGHT_SHARED the processes also coordinate through a lock in the
+# default cache (which must then be shared between them): waiters poll every
+# SINGLEFLIGHT_POLL_MS for the result, which is kept for SINGLEFLIGHT_RESULT_TTL_MS.
+# Results are written to files in SINGLEFLIGHT_DIR, the cache only names them.
+
+SINGLEFLIGHT_SHARED = os.environ.get("ECSITE_SINGLEFLIGHT_SHARED", "") == "1"
+SINGLEFLIGHT_DIR = Path(
+    os.environ.get(
+        "ECSITE_SINGLEFLIGHT_DIR", Path(tempfile.gettempdir()) / "ecsite_singleflight"
+    )
+)
+SINGLEFLIGHT_LOCK_TIMEOUT_MS = 2000
+SINGLEFLIGHT_POLL_MS = 5
+SINGLEFLIGHT_RESULT_TTL_MS = 1000
+
+
+# Abandoned carts
+# `manage.py sweep_carts` deletes carts without activity for CART_MAX_IDLE_DAYS.
+# Activity is recorded at most every CART_ACTIVITY_RESOLUTION_SECONDS per cart.
+
+CART_MAX_IDLE_DAYS = 30
+CART_ACTIVITY_RESOLUTION_SECONDS = 60
+
+
+# User sharding
+# With ECSITE_SHARDS set, carts, cart items, idempotency keys, queued checkouts
+# and purchase history are stored in that many SQLite databases under SHARD_DIR,
+# chosen by user id, while items, users and sessions stay in the default
+# database. Shards can only be added. Run `manage.py rebalance_shards` after
+# changing their number, before serving requests.
+
+SHARDS = [f"shard_{index}" for index in range(int(os.environ.get("ECSITE_SHARDS", 0)))]
+SHARD_DIR = Path(os.environ.get("ECSITE_SHARD_DIR", BASE_DIR))
+DATABASES.update(
+    {
+        alias: {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": SHARD_DIR / f"db_{alias}.sqlite3",
+        }
+        for alias in SHARDS
+    }
+)
+DATABASE_ROUTERS = ["ecsite.sharding.UserShardRouter"]
@@ -0,0 +1,36 @@
+"""
+API-only settings for headless workers and cron commands.
+
+Use with ``DJANGO_SETTINGS_MODULE=ecsite.settings_api``. Leaves out the admin,
+messages, static files, templates and the browsable API, which workers serving
+JSON never use, so processes start faster and use less memory.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE
+
+INSTALLED_APPS = [
+    app
+    for app in INSTALLED_APPS
+    if app
+    not in (
+        "django.contrib.admin",
+        "django.contrib.messages",
+        "django.contrib.staticfiles",
+        "rest_framework",
+    )
+]
+
+MIDDLEWARE = [
+    middleware
+    for middleware in MIDDLEWARE
+    if middleware != "django.contrib.messages.middleware.MessageMiddleware"
+]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+}
+
+API_ROUTER = "simple"
@@ -0,0 +1,169 @@
+"""
+User sharding of carts, checkouts and purchase history.
+
+With ``settings.SHARDS`` set, the rows of the models in ``SHARDED_MODELS`` are
+stored in one of the shard databases, chosen from the id of their user with a
+jump consistent hash, while items, users, sessions and everything else stay in
+the default database. A user's checkout therefore only ever writes to the
+default database (stock) and to a single shard, and shards do not contend for
+one SQLite write lock.
+
+Querysets of sharded models get their database with ``.using(db_for_user())``
+or ``.using(instance._state.db)``; instances keep the database they were read
+from, which ``UserShardRouter`` uses for saves and related lookups. Carts on
+shards take the id of their user, so ``db_for_cart()`` knows where a cart id
+lives. Foreign keys between shards and the default database have no database
+constraints, and deletes cascade to the shards through ``cascade_to_shards``.
+
+Without shards everything stays in the default database as before, with the
+database constraints of those foreign keys.
+"""
+
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import CASCADE
+
+SHARDED_MODELS = {
+    "archivedidempotencykey",
+    "cart",
+    "cartitem",
+    "checkoutjob",
+    "idempotencykey",
+    "useritempurchasesummary",
+    "userpurchaserecord",
+}
+
+
+def is_sharded(model) -> bool:
+    return (
+        model._meta.app_label == "ecsite" and model._meta.model_name in SHARDED_MODELS
+    )
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping and Veach) of ``key`` into ``buckets``.
+    Adding a bucket only moves the keys that land in the new bucket.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def db_for_user(user_id) -> str:
+    """Database holding the carts, checkouts and purchases of a user."""
+    if not settings.SHARDS:
+        return DEFAULT_DB_ALIAS
+    # Purchase records of deleted users have no user
+    return settings.SHARDS[jump_hash(user_id or 0, len(settings.SHARDS))]
+
+
+def db_for_cart(cart_id: int) -> str:
+    return db_for_user(cart_id)
+
+
+def cart_id_for_user(user_id: int):
+    """Id of a new cart of the user, None to let the database choose it."""
+    return user_id if settings.SHARDS else None
+
+
+def user_databases() -> list:
+    """Databases that may hold rows of the sharded models."""
+    return settings.SHARDS or [DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def atomic(db: str):
+    """
+    Transaction on the shard ``db`` that also covers writes to the default
+    database. The default database commits first: a failed shard commit can
+    leave stock taken by a purchase that was not recorded, but stock can never
+    be sold twice.
+    """
+    if db == DEFAULT_DB_ALIAS:
+        with transaction.atomic():
+            yield
+    else:
+        with transaction.atomic(using=db), transaction.atomic():
+            yield
+
+
+def select_items(queryset):
+    """
+    Loads the items of cart items or purchase records along with them: joined
+    in the default database, or read from it in a second query on shards.
+    """
+    if queryset.db == DEFAULT_DB_ALIAS:
+        return queryset.select_related("item")
+    return queryset.prefetch_related("item")
+
+
+def cascade_to_shards(collector, field, sub_objs, using):
+    """
+    ``on_delete`` of foreign keys from sharded models to the default database.
+    Cascades like ``CASCADE`` within a database and deletes the related rows
+    of the other databases holding user data.
+    """
+    for db in user_databases():
+        if db == using:
+            CASCADE(collector, field, sub_objs, using)
+        else:
+            sub_objs.using(db).delete()
+
+
+# Called for every batch of deleted objects, without querying sub_objs first
+cascade_to_shards.lazy_sub_objs = True
+
+
+def cross_database_fk() -> dict:
+    """
+    Options of the foreign keys from sharded models to items and users, which
+    only lose their constraints and cascade across databases with shards.
+    """
+    if settings.SHARDS:
+        return {"on_delete": cascade_to_shards, "db_constraint": False}
+    return {"on_delete": CASCADE}
+
+
+class UserShardRouter:
+    """
+    Sends sharded models to the shard of their user and all other models to
+    the default database. Only migrates sharded models on the shards.
+    """
+
+    def _db(self, model, instance=None):
+        if not settings.SHARDS:
+            return None
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        if isinstance(instance, User):
+            return db_for_user(instance.pk)
+        if instance is not None and is_sharded(type(instance)):
+            if instance._state.db:
+                return instance._state.db
+            if hasattr(instance, "user_id"):
+                return db_for_user(instance.user_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Relations across databases have no constraints to break
+        return True if settings.SHARDS else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not settings.SHARDS:
+            return None
+        sharded = app_label == "ecsite" and model_name in SHARDED_MODELS
+        if db in settings.SHARDS:
+            return sharded
+        return not sharded
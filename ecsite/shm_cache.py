@@ -0,0 +1,246 @@
+"""
+Django cache backend shared by all processes of a host through a memory-mapped
+file, so workers share one copy of the catalog, idempotency replies and user
+lookups without running a cache server.
+
+The file holds a fixed-size, 8-way set associative hash table: a key can only
+live in the 8 slots of the set its hash points to, and when all of them are
+taken the set evicts with the CLOCK algorithm (entries read since the hand
+last passed them get a second chance). Every slot has a fixed size, values
+that do not fit into ``SLOT_SIZE`` are not cached.
+
+Sets are locked with ``fcntl`` byte-range locks between processes and with a
+lock per process between threads.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b"ECSHMC01"
+WAYS = 8
+# Magic, number of slots, slot size
+_HEADER = struct.Struct("<8sII")
+# Used, CLOCK reference bit, key length, value length, expiry (0 = never), key hash
+_SLOT = struct.Struct("<BBHIdQ")
+
+
+class SharedMemoryCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = Path(location)
+        self._sets = max(1, options.get("SLOTS", 8192) // WAYS)
+        self._slot_size = options.get("SLOT_SIZE", 4096)
+        self._data_offset = _HEADER.size + self._sets
+        self._size = self._data_offset + self._sets * WAYS * self._slot_size
+        self._pid = None
+        self._open_lock = threading.Lock()
+
+    def _open(self):
+        # Reopened after a fork, so no lock or file state is shared by accident
+        if self._pid == os.getpid():
+            return
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return
+
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+            header = _HEADER.pack(MAGIC, self._sets * WAYS, self._slot_size)
+            # Only one process initializes a new file
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, self._size)
+                    os.pwrite(fd, header, 0)
+                existing = os.pread(fd, _HEADER.size, 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            if existing != header:
+                os.close(fd)
+                raise ImproperlyConfigured(
+                    f"{self._path} was created with other cache options, "
+                    "delete it once no process uses it"
+                )
+
+            self._fd = fd
+            self._map = mmap.mmap(fd, self._size)
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _hash(self, key: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        )
+
+    @contextmanager
+    def _locked_set(self, key_hash: int):
+        self._open()
+        set_index = key_hash % self._sets
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, set_index)
+            try:
+                yield set_index
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, set_index)
+
+    def _slot_offset(self, set_index: int, way: int) -> int:
+        return self._data_offset + (set_index * WAYS + way) * self._slot_size
+
+    def _find(self, set_index: int, key_hash: int, key: bytes):
+        """Returns the offset and header of the live slot holding ``key``."""
+        now = time.time()
+        for way in range(WAYS):
+            offset = self._slot_offset(set_index, way)
+            slot = _SLOT.unpack_from(self._map, offset)
+            used, _, key_length, _, expires, slot_hash = slot
+            if not used or slot_hash != key_hash:
+                continue
+            start = offset + _SLOT.size
+            if self._map[start : start + key_length] != key:
+                continue
+            if expires and expires <= now:
+                # Expired entries are dropped when they are found
+                self._map[offset] = 0
+                return None, None
+            return offset, slot
+        return None, None
+
+    def _victim(self, set_index: int) -> int:
+        now = time.time()
+        for way in range(WAYS):
+            offset = self._slot_offset(set_index, way)
+            used, _, _, _, expires, _ = _SLOT.unpack_from(self._map, offset)
+            if not used or (expires and expires <= now):
+                return offset
+
+        hand_offset = _HEADER.size + set_index
+        hand = self._map[hand_offset]
+        while True:
+            offset = self._slot_offset(set_index, hand)
+            hand = (hand + 1) % WAYS
+            if self._map[offset + 1]:
+                # Referenced since the last pass, second chance
+                self._map[offset + 1] = 0
+                continue
+            self._map[hand_offset] = hand
+            return offset
+
+    def _read_value(self, offset: int, slot):
+        _, _, key_length, value_length, _, _ = slot
+        start = offset + _SLOT.size + key_length
+        return pickle.loads(self._map[start : start + value_length])
+
+    def _write(self, set_index, key_hash, key: bytes, value, expires, offset=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if _SLOT.size + len(key) + len(data) > self._slot_size:
+            if offset is not None:
+                self._map[offset] = 0
+            return False
+
+        if offset is None:
+            offset = self._victim(set_index)
+        # Marking the slot unused first, readers never see a half written entry
+        self._map[offset] = 0
+        start = offset + _SLOT.size
+        self._map[start : start + len(key)] = key
+        self._map[start + len(key) : start + len(key) + len(data)] = data
+        _SLOT.pack_into(
+            self._map, offset, 1, 0, len(key), len(data), expires or 0.0, key_hash
+        )
+        return True
+
+    def _key(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        return key.encode(), self._hash(key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, _ = self._find(set_index, key_hash, key)
+            if offset is not None:
+                return False
+            return self._write(
+                set_index, key_hash, key, value, self.get_backend_timeout(timeout)
+            )
+
+    def get(self, key, default=None, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, slot = self._find(set_index, key_hash, key)
+            if offset is None:
+                return default
+            self._map[offset + 1] = 1
+            return self._read_value(offset, slot)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, _ = self._find(set_index, key_hash, key)
+            self._write(
+                set_index,
+                key_hash,
+                key,
+                value,
+                self.get_backend_timeout(timeout),
+                offset,
+            )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, _ = self._find(set_index, key_hash, key)
+            if offset is None:
+                return False
+            expires = self.get_backend_timeout(timeout)
+            struct.pack_into("<d", self._map, offset + 8, expires or 0.0)
+            return True
+
+    def delete(self, key, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, _ = self._find(set_index, key_hash, key)
+            if offset is None:
+                return False
+            self._map[offset] = 0
+            return True
+
+    def has_key(self, key, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            return self._find(set_index, key_hash, key)[0] is not None
+
+    def incr(self, key, delta=1, version=None):
+        key_bytes, key_hash = self._key(key, version)
+        with self._locked_set(key_hash) as set_index:
+            offset, slot = self._find(set_index, key_hash, key_bytes)
+            if offset is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._read_value(offset, slot) + delta
+            self._write(set_index, key_hash, key_bytes, value, slot[4], offset)
+            return value
+
+    def clear(self):
+        self._open()
+        with self._lock:
+            # Locking every set at once
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._sets, 0)
+            try:
+                for slot in range(self._sets * WAYS):
+                    self._map[self._data_offset + slot * self._slot_size] = 0
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._sets, 0)
+
+    def close(self, **kwargs):
+        # The mapping is kept open for the lifetime of the process
+        pass
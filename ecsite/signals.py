@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .middlewares import user_cache_key
+
+# Sent once a write to the stock, price or name of items has been committed.
+# ``item_ids`` lists the changed items, or is None when any item may have changed.
+items_changed = Signal()
+
+
+@receiver(items_changed)
+def rebuild_snapshots(sender, **kwargs):
+    if settings.SNAPSHOTS_ENABLED:
+        # Imported on demand, snapshots pull in the DRF renderers
+        from .snapshots import schedule_rebuild
+
+        schedule_rebuild()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_written(sender, instance, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which the cached users may lag behind
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+
+    key = user_cache_key(instance.username)
+    transaction.on_commit(lambda: cache.delete(key))
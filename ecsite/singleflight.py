@@ -0,0 +1,136 @@
+"""
+Request coalescing for identical concurrent reads.
+
+``Group.do(key, fn)`` runs ``fn`` once for all callers that ask for the same key
+while it is in flight; the others wait and share its result. With
+``shared=True`` the leaders of different processes additionally coordinate
+through a lock in the default cache: one process computes the result and
+publishes it for a short time, while the others poll for it instead of
+repeating the work. Shared results are rendered bodies far larger than a slot
+of the shared memory cache, so they are written to a file in
+``settings.SINGLEFLIGHT_DIR`` and the cache only holds its name.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn, shared: bool = False):
+        """
+        Returns ``fn()`` computed once for concurrent callers of ``key``. Results
+        shared across processes must be bytes.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            metrics.SINGLEFLIGHT_SHARED.inc(scope="process")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if shared:
+                call.result = self._do_shared(key, fn)
+            else:
+                call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _do_shared(self, key: str, fn):
+        lock_key = f"singleflight:{self.prefix}:lock:{key}"
+        result_key = f"singleflight:{self.prefix}:result:{key}"
+        lock_timeout = settings.SINGLEFLIGHT_LOCK_TIMEOUT_MS / 1000
+        token = uuid.uuid4().hex
+
+        deadline = time.monotonic() + lock_timeout
+        while not cache.add(lock_key, token, timeout=lock_timeout):
+            result = self._read_result(cache.get(result_key))
+            if result is not None:
+                metrics.SINGLEFLIGHT_SHARED.inc(scope="cache")
+                return result
+            if time.monotonic() >= deadline:
+                # The lock holder is stuck or gone, computing it ourselves
+                return fn()
+            time.sleep(settings.SINGLEFLIGHT_POLL_MS / 1000)
+
+        try:
+            # Published by the holder released just before we took the lock
+            result = self._read_result(cache.get(result_key))
+            if result is not None:
+                metrics.SINGLEFLIGHT_SHARED.inc(scope="cache")
+                return result
+            result = fn()
+            cache.set(
+                result_key,
+                self._write_result(key, token, result),
+                timeout=settings.SINGLEFLIGHT_RESULT_TTL_MS / 1000,
+            )
+            return result
+        finally:
+            # Only releasing the lock if it did not expire and get taken over
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def _write_result(self, key: str, token: str, result: bytes) -> str:
+        directory = Path(settings.SINGLEFLIGHT_DIR)
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._prune(directory)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        name = f"{self.prefix}_{digest}_{token}"
+        temp_path = directory / f".{name}.tmp"
+        temp_path.write_bytes(result)
+        # Readers never see a partly written result
+        os.replace(temp_path, directory / name)
+        return name
+
+    def _read_result(self, name: str) -> bytes:
+        if name is None:
+            return None
+        try:
+            return (Path(settings.SINGLEFLIGHT_DIR) / name).read_bytes()
+        except FileNotFoundError:
+            # Pruned after its cache entry expired
+            return None
+
+    def _prune(self, directory: Path):
+        """Removes the results of this group that outlived their cache entry."""
+        expired = time.time() - 2 * settings.SINGLEFLIGHT_RESULT_TTL_MS / 1000
+        for path in directory.glob(f"{self.prefix}_*"):
+            try:
+                if path.stat().st_mtime < expired:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
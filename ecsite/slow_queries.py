@@ -0,0 +1,289 @@
+"""
+Slow query log.
+
+``SlowQueryMiddleware`` wraps the database connections of every request with a
+``QueryLogger``, which appends each statement taking at least
+``settings.SLOW_QUERY_THRESHOLD_MS`` to a log file as a JSON line: the SQL and
+its parameters, the view and action of the request, and the ``EXPLAIN QUERY
+PLAN`` of the statement. The plan is only captured the first time a process
+sees a statement, so repeated slow statements cost a single write; processes
+remember the ``settings.SLOW_QUERY_EXPLAINED_MAX`` statements seen last. Parameters
+of statements on the auth and session tables are redacted.
+
+Like the metrics files, every process writes a file of its own,
+``slow_queries_<pid>.log`` in ``settings.SLOW_QUERY_LOG_DIR``, which it rotates
+after ``settings.SLOW_QUERY_LOG_MAX_BYTES`` without racing the other workers.
+The directory is only accessible to the user running the server and the files
+are created with mode 0600.
+
+Statements are grouped by a fingerprint of their SQL with literals, parameters
+and ``IN`` lists normalized. ``GET /api/v1/slow-queries/`` summarizes the kept
+files of all processes per fingerprint for staff users.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from .constants import ERROR_MESSAGES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+# Kept out of the server logs
+logger.propagate = False
+
+# Statements with a query plan, DDL and transaction statements have none
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUE_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+# Tables holding session keys and credentials
+_SENSITIVE_TABLES = re.compile(r"\b(?:auth_\w+|django_session)\b", re.IGNORECASE)
+REDACTED = "[redacted]"
+
+# Parameters of bulk statements are cut off in the log
+_MAX_LOGGED_PARAMS = 100
+
+_handler = None
+_handler_lock = threading.Lock()
+# Fingerprints whose plan was logged by this process, least recently seen first
+_explained = OrderedDict()
+_explained_lock = threading.Lock()
+
+
+def normalize(sql: str) -> str:
+    """
+    The statement of ``sql`` with every literal and parameter replaced by
+    ``?`` and every list of them by ``(...)``.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _VALUE_LIST.sub("(...)", sql)
+    sql = _VALUE_LISTS.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(statement.encode()).hexdigest()[:16]
+
+
+class PrivateFileHandler(RotatingFileHandler):
+    """``RotatingFileHandler`` creating its files with mode 0600."""
+
+    def _open(self):
+        fd = os.open(
+            self.baseFilename,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_NOFOLLOW,
+            0o600,
+        )
+        return open(fd, "a", encoding=self.encoding, errors=self.errors)
+
+
+def _private_directory(directory: Path):
+    """Creates ``directory`` with mode 0700, refusing one of another user."""
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    status = directory.lstat()
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid():
+        raise PermissionError(f"{directory} is not a directory of this user")
+    if stat.S_IMODE(status.st_mode) != 0o700:
+        directory.chmod(0o700)
+
+
+def _first_seen(key: str) -> bool:
+    """Whether the statement ``key`` is new to this process, or was forgotten."""
+    with _explained_lock:
+        if key in _explained:
+            _explained.move_to_end(key)
+            return False
+        _explained[key] = None
+        if len(_explained) > settings.SLOW_QUERY_EXPLAINED_MAX:
+            _explained.popitem(last=False)
+        return True
+
+
+def _log_handler() -> RotatingFileHandler:
+    # A new file is opened whenever the process forks or the directory changes
+    global _handler
+    directory = Path(settings.SLOW_QUERY_LOG_DIR).absolute()
+    path = directory / f"slow_queries_{os.getpid()}.log"
+    with _handler_lock:
+        if _handler is None or _handler.baseFilename != str(path):
+            if _handler is not None:
+                logger.removeHandler(_handler)
+                _handler.close()
+            _private_directory(directory)
+            _handler = PrivateFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+                encoding="utf-8",
+                delay=True,
+            )
+            _handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(_handler)
+    return _handler
+
+
+def explain(connection, sql: str, params) -> list:
+    """Lines of the query plan of ``sql``, None when it has none."""
+    if not _EXPLAINABLE.match(sql):
+        return None
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        # A cursor of the backend keeps the plan out of the execute wrappers
+        # and the debug query log
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(f"{prefix} {sql}", params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except DatabaseError:
+        return None
+
+
+class QueryLogger:
+    """
+    ``connection.execute_wrapper()`` logging statements that take at least
+    ``threshold_ms``. ``describe`` returns the view and action of the request,
+    which are only known once its URL is resolved.
+    """
+
+    def __init__(self, threshold_ms: float, describe):
+        self.threshold = threshold_ms / 1000
+        self.describe = describe
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.threshold:
+            try:
+                self.log(context["connection"], sql, params, many, elapsed)
+            except OSError:
+                logger.exception("Unable to write the slow query log")
+        return result
+
+    def log(self, connection, sql: str, params, many: bool, elapsed: float):
+        statement = normalize(sql)
+        key = fingerprint(statement)
+        plan = None
+        # The parameters of executemany() may be an exhausted iterator
+        if not many and _first_seen(key):
+            plan = explain(connection, sql, params)
+
+        if isinstance(params, (list, tuple)) and not many:
+            params = list(params[:_MAX_LOGGED_PARAMS])
+            if _SENSITIVE_TABLES.search(sql):
+                params = [REDACTED] * len(params)
+        else:
+            params = None
+        view, action = self.describe()
+
+        _log_handler()
+        logger.info(
+            json.dumps(
+                {
+                    "time": timezone.now().isoformat(),
+                    "fingerprint": key,
+                    "statement": statement,
+                    "sql": sql,
+                    "params": params,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "database": connection.alias,
+                    "view": view,
+                    "action": action,
+                    "plan": plan,
+                },
+                default=str,
+            )
+        )
+
+
+def _log_files() -> list:
+    """The slow query logs of all processes and their backups, oldest first."""
+    files = []
+    for path in sorted(Path(settings.SLOW_QUERY_LOG_DIR).glob("slow_queries_*.log")):
+        backups = [
+            Path(f"{path}.{number}")
+            for number in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)
+        ]
+        files += [file for file in [*backups, path] if file.exists()]
+    return files
+
+
+def summarize() -> list:
+    """
+    Slow statements of the kept log files grouped by fingerprint, with their
+    count and total time, most total time first. Every group has the latest
+    SQL, parameters and query plan logged for it.
+    """
+    summaries = {}
+    for path in _log_files():
+        try:
+            with open(path, encoding="utf-8") as lines:
+                for line in lines:
+                    # Skipping the line its process is still appending
+                    if line.endswith("\n"):
+                        _add(summaries, json.loads(line))
+        except FileNotFoundError:
+            # Rotated away by its process since it was listed
+            continue
+
+    rows = sorted(summaries.values(), key=lambda row: row["total_ms"], reverse=True)
+    for row in rows:
+        row["total_ms"] = round(row["total_ms"], 3)
+        row["views"] = sorted(row["views"])
+    return rows
+
+
+def _add(summaries: dict, entry: dict):
+    summary = summaries.get(entry["fingerprint"])
+    if summary is None:
+        summary = summaries[entry["fingerprint"]] = {
+            "fingerprint": entry["fingerprint"],
+            "statement": entry["statement"],
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "views": set(),
+            "plan": None,
+        }
+    summary["count"] += 1
+    summary["total_ms"] += entry["duration_ms"]
+    summary["max_ms"] = max(summary["max_ms"], entry["duration_ms"])
+    summary["views"].add(f"{entry['view']}.{entry['action']}")
+    summary["last_seen"] = entry["time"]
+    summary["sql"] = entry["sql"]
+    summary["params"] = entry["params"]
+    summary["database"] = entry["database"]
+    if entry["plan"] is not None:
+        summary["plan"] = entry["plan"]
+
+
+@require_GET
+def slow_queries(request):
+    if not getattr(request.user, "is_staff", False):
+        return JsonResponse({"error": ERROR_MESSAGES["staff_only"]}, status=403)
+    return JsonResponse(
+        {
+            "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+            "queries": summarize(),
+        }
+    )
@@ -0,0 +1,178 @@
+"""
+Pre-rendered snapshots of popular item listings.
+
+``build_snapshots()`` renders the unfiltered listing and the filter sets of
+``settings.SNAPSHOT_FILTERS`` into JSON files (plus gzip'd copies) inside a
+directory per catalog version. Requests for a snapshotted filter set are
+answered with those bytes as long as the catalog version did not change, which
+costs no database query. Once it changes, snapshots are rebuilt in a background
+thread (see ``signals.rebuild_snapshots``) while requests fall back to querying
+the database.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+from . import catalog
+from .serializers import item_rows
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "CURRENT"
+FILTER_FIELDS = ("name", "min_price", "max_price")
+# How often a process looks for snapshots built by other processes
+RELOAD_INTERVAL = 1.0
+
+
+def _directory(directory=None) -> Path:
+    return Path(directory or settings.SNAPSHOT_DIR)
+
+
+def snapshot_key(filters: dict) -> str:
+    # Filters that are ignored by the listing do not change the key either
+    normalized = [
+        (field, filters[field]) for field in FILTER_FIELDS if filters.get(field)
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()[:32]
+
+
+def _write_atomically(path: Path, data: bytes):
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def build_snapshots(directory=None) -> int:
+    """
+    Renders the snapshots of the current catalog version and makes them the
+    current ones. Returns the number of snapshots written.
+    """
+    directory = _directory(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Read before rendering, so a concurrent change leaves the snapshot stale
+    version = str(catalog.get_catalog_version())
+
+    temp_dir = directory / f".{version}.{os.getpid()}.{threading.get_ident()}"
+    temp_dir.mkdir()
+    filter_sets = [{}] + [
+        filters for filters in settings.SNAPSHOT_FILTERS if snapshot_key(filters)
+    ]
+    for filters in filter_sets:
+        items = catalog.filter_items(**filters)
+        content = JSONRenderer().render({"items": item_rows(items)})
+        key = snapshot_key(filters)
+        (temp_dir / f"{key}.json").write_bytes(content)
+        (temp_dir / f"{key}.json.gz").write_bytes(gzip.compress(content, mtime=0))
+
+    try:
+        os.rename(temp_dir, directory / version)
+    except OSError:
+        # Another process already built this version
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    _write_atomically(directory / CURRENT, version.encode())
+
+    for path in directory.iterdir():
+        if path.is_dir() and path.name != version and not path.name.startswith("."):
+            shutil.rmtree(path, ignore_errors=True)
+    # Picking up the new snapshots with the next request of this process
+    _state.checked_at = 0.0
+    return len(filter_sets)
+
+
+class _Snapshots:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        self.snapshots = {}
+        self.rebuilding = False
+
+
+_state = _Snapshots()
+
+
+def _load(version: int) -> dict:
+    path = _directory() / str(version)
+    snapshots = {}
+    try:
+        for file_path in path.glob("*.json"):
+            gzipped_path = file_path.with_name(f"{file_path.name}.gz")
+            snapshots[file_path.stem] = (
+                file_path.read_bytes(),
+                gzipped_path.read_bytes(),
+            )
+    except OSError:
+        # Pruned by a newer build while reading
+        return {}
+    return snapshots
+
+
+def get_snapshot(filters: dict):
+    """
+    Returns ``(content, gzipped content)`` of the listing for ``filters`` if it
+    was snapshotted for the current catalog version, otherwise None.
+    """
+    version = catalog.get_catalog_version()
+    state = _state
+    now = time.monotonic()
+    if state.version != version or (
+        not state.snapshots and now - state.checked_at > RELOAD_INTERVAL
+    ):
+        snapshots = _load(version)
+        with state.lock:
+            state.snapshots = snapshots
+            state.version = version
+            state.checked_at = now
+        if not snapshots:
+            schedule_rebuild()
+    return state.snapshots.get(snapshot_key(filters))
+
+
+def snapshot_response(snapshot, request) -> HttpResponse:
+    content, gzipped = snapshot
+    if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        response = HttpResponse(gzipped, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(content, content_type="application/json")
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def _rebuild():
+    try:
+        time.sleep(settings.SNAPSHOT_REBUILD_DELAY_MS / 1000)
+        while True:
+            version = catalog.get_catalog_version()
+            # Only one process builds each version
+            if cache.add(f"snapshots:build:{version}", os.getpid(), timeout=60):
+                build_snapshots()
+            if catalog.get_catalog_version() == version:
+                return
+    except Exception:
+        logger.exception("Rebuilding catalog snapshots failed")
+    finally:
+        connection.close()
+        with _state.lock:
+            _state.rebuilding = False
+
+
+def schedule_rebuild():
+    """Rebuilds the snapshots in a background thread, unless one is running."""
+    with _state.lock:
+        if _state.rebuilding:
+            return
+        _state.rebuilding = True
+    threading.Thread(target=_rebuild, name="snapshot-rebuild", daemon=True).start()
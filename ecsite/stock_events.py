@@ -0,0 +1,119 @@
+"""
+Server-sent events feed of item stock.
+
+Purchases and ``init_data`` record the new stock of the items they changed as
+``StockEvent`` rows in the same transaction. ``GET /api/v1/stock/events/`` is an
+async view streaming these rows: it reads new events once per
+``settings.STOCK_FEED_WINDOW_MS`` and sends only the latest stock of every item
+changed within that window. Every message carries its event id, so clients
+reconnecting with a ``Last-Event-ID`` header continue where they left off.
+Clients that fall behind the retained events get a ``reset`` event and should
+reload the catalog.
+
+Event ids must be committed in increasing order, which holds on SQLite where
+writers are serialized.
+"""
+
+import asyncio
+import json
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max, Min
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from . import inventory
+from .constants import ERROR_MESSAGES, LAST_EVENT_ID, LAST_EVENT_ID_HEADER
+from .models import Item, StockEvent
+
+
+def record(item_ids=None):
+    """Records the current stock of the given items, or of all items."""
+    items = Item.objects.all()
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+    StockEvent.objects.bulk_create(
+        StockEvent(item_id=item_id, quantity=stock)
+        for item_id, stock in items.annotate(
+            stock=inventory.stock_expression()
+        ).values_list("id", "stock")
+    )
+
+
+def prune(max_age: timedelta) -> int:
+    """Deletes events older than ``max_age``, returns the number deleted."""
+    deleted, _ = StockEvent.objects.filter(
+        created_at__lt=timezone.now() - max_age
+    ).delete()
+    return deleted
+
+
+def coalesce(events) -> list:
+    """
+    Keeps the latest of the ``(id, item id, quantity)`` events of every item,
+    in the order of their ids.
+    """
+    latest = {}
+    for event in events:
+        latest[event[1]] = event
+    return sorted(latest.values())
+
+
+def format_event(event_id: int, item_id: int, quantity: int) -> bytes:
+    data = json.dumps({"item_id": item_id, "quantity": quantity})
+    return f"id: {event_id}\nevent: stock\ndata: {data}\n\n".encode()
+
+
+async def _stream(last_id):
+    # Clients reconnect after this many milliseconds once the stream ends
+    yield f"retry: {settings.STOCK_FEED_WINDOW_MS}\n\n".encode()
+
+    bounds = await StockEvent.objects.aaggregate(first=Min("id"), last=Max("id"))
+    if last_id is None:
+        last_id = bounds["last"] or 0
+    elif bounds["first"] is not None and last_id + 1 < bounds["first"]:
+        # Events after last_id were pruned
+        yield b"event: reset\ndata: {}\n\n"
+        last_id = bounds["last"]
+
+    deadline = time.monotonic() + settings.STOCK_FEED_MAX_SECONDS
+    heartbeat_at = time.monotonic() + settings.STOCK_FEED_HEARTBEAT_SECONDS
+    while time.monotonic() < deadline:
+        events = [
+            event
+            async for event in StockEvent.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "item_id", "quantity")[: settings.STOCK_FEED_BATCH_SIZE]
+        ]
+        if events:
+            for event in coalesce(events):
+                yield format_event(*event)
+            last_id = events[-1][0]
+            heartbeat_at = time.monotonic() + settings.STOCK_FEED_HEARTBEAT_SECONDS
+        elif time.monotonic() >= heartbeat_at:
+            # Comment line keeping proxies from closing the idle connection
+            yield b": keepalive\n\n"
+            heartbeat_at = time.monotonic() + settings.STOCK_FEED_HEARTBEAT_SECONDS
+
+        await asyncio.sleep(settings.STOCK_FEED_WINDOW_MS / 1000)
+
+
+@require_GET
+async def stock_events(request):
+    last_id_raw = request.headers.get(LAST_EVENT_ID_HEADER) or request.GET.get(
+        LAST_EVENT_ID
+    )
+    last_id = None
+    if last_id_raw:
+        if not (last_id_raw.isascii() and last_id_raw.isdigit()):
+            return JsonResponse(
+                {"error": ERROR_MESSAGES["invalid_last_event_id"]}, status=400
+            )
+        last_id = int(last_id_raw)
+
+    response = StreamingHttpResponse(_stream(last_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Disables response buffering of nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,45 @@
+"""
+Deletion of abandoned carts.
+
+Carts are walked in primary key ranges of ``batch_size`` ids, each range in
+its own short transaction, so the sweeper only ever holds a few locks and can
+run next to live traffic. Carts with a queued checkout are kept. Every user
+shard is swept in turn.
+"""
+
+from django.db import transaction
+from django.db.models import Max, Min
+from . import sharding
+from .models import Cart, CartItem, CheckoutJob
+
+
+def sweep_carts(cutoff, batch_size: int):
+    """
+    Deletes carts whose last activity is older than ``cutoff``, together with
+    their items. Yields ``(carts, cart_items)`` deleted per id range.
+    """
+    for db in sharding.user_databases():
+        yield from _sweep_database(db, cutoff, batch_size)
+
+
+def _sweep_database(db: str, cutoff, batch_size: int):
+    bounds = Cart.objects.using(db).aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return
+
+    for low in range(bounds["low"], bounds["high"] + 1, batch_size):
+        with transaction.atomic(using=db):
+            carts = (
+                Cart.objects.using(db)
+                .filter(id__gte=low, id__lt=low + batch_size, last_activity__lt=cutoff)
+                .exclude(
+                    id__in=CheckoutJob.objects.using(db)
+                    .filter(cart_id__gte=low, cart_id__lt=low + batch_size)
+                    .values("cart_id")
+                )
+            )
+            _, deleted = carts.delete()
+        yield (
+            deleted.get(Cart._meta.label, 0),
+            deleted.get(CartItem._meta.label, 0),
+        )
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.test import APITestCase
+from ecsite import carts
 from ecsite.models import User, Item, Cart
 from .helpers import generate_str, random_int
 from .constants import CART_URL
@@ -32,9 +34,11 @@ class AuthenticatedTestCase(APITestCase):
         return Cart.objects.get(user_id=self.user.id)
 
     def setUp(self):
+        # Cached catalog rows must not leak between tests reusing item ids
+        cache.clear()
         self.user = User.objects.create_user(username="testuser", password="password")
         self.client.login(username="testuser", password="password")
 
         self.cheaper_items = self.create_item(2, ITEM_MIN_PRICE - 1)
         self.expensive_items = self.create_item(ITEM_MIN_PRICE + 1, ITEM_MAX_PRICE)
-        self.cart = Cart.objects.create(user=self.user)
+        self.cart = carts.create(self.user)
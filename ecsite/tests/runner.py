@@ -0,0 +1,40 @@
+import os
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+SHARED_MEMORY_CACHE = "ecsite.shm_cache.SharedMemoryCache"
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against a shared memory cache file of their own, so tests
+    clearing the cache leave the host-wide file of running servers alone.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self._cache_dir.name, "ecsite_cache")
+
+        # Inherited by the servers and probes started by the tests
+        self._cache_env = mock.patch.dict(os.environ, {"ECSITE_CACHE_PATH": path})
+        self._cache_env.start()
+        self._cache_settings = None
+        if settings.CACHES["default"]["BACKEND"] == SHARED_MEMORY_CACHE:
+            self._cache_settings = override_settings(
+                CACHES={
+                    **settings.CACHES,
+                    "default": {**settings.CACHES["default"], "LOCATION": path},
+                }
+            )
+            self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        if self._cache_settings is not None:
+            self._cache_settings.disable()
+        self._cache_env.stop()
+        self._cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
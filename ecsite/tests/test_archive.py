@@ -0,0 +1,156 @@
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from ecsite import archive
+from ecsite.constants import (
+    ERROR_MESSAGES,
+    IDEMPOTENCY_KEY,
+    STATUS_PENDING,
+    STATUS_SUCCESS,
+    USER_ID,
+)
+from ecsite.models import ArchivedIdempotencyKey, IdempotencyKey, UserPurchaseRecord
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+RECORD_COUNT = 5
+
+
+class TestArchiveHistory(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+        self.item = list(self.cheaper_items.values())[0]
+        self.old = timezone.now() - timedelta(days=100)
+        for i in range(RECORD_COUNT):
+            UserPurchaseRecord.objects.create(
+                user=self.user, item=self.item, quantity=i + 1
+            )
+        UserPurchaseRecord.objects.update(timestamp=self.old)
+        self.recent = UserPurchaseRecord.objects.create(
+            user=self.user, item=self.item, quantity=1
+        )
+
+        for key, key_status in (("done", STATUS_SUCCESS), ("queued", STATUS_PENDING)):
+            IdempotencyKey.objects.create(user=self.user, key=key, status=key_status)
+        IdempotencyKey.objects.update(created_at=self.old)
+
+    def archive(self):
+        call_command(
+            "archive_history",
+            "--days",
+            30,
+            "--batch-size",
+            2,
+            "--dir",
+            self.archive_dir.name,
+            stdout=StringIO(),
+        )
+
+    def test_moves_old_rows_into_segments(self):
+        self.archive()
+
+        self.assertEqual(list(UserPurchaseRecord.objects.all()), [self.recent])
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)), ["queued"]
+        )
+
+        manifest = archive.read_manifest(self.archive_dir.name)
+        segments = [
+            segment
+            for segment in manifest["segments"]
+            if segment["table"] == "purchase_records"
+        ]
+        self.assertEqual([segment["rows"] for segment in segments], [2, 2, 1])
+        self.assertTrue(all(segment["committed"] for segment in segments))
+
+    def test_reader_scans_archives(self):
+        self.archive()
+
+        rows = list(
+            archive.iter_archive(
+                "purchase_records",
+                directory=self.archive_dir.name,
+                user_id=self.user.id,
+            )
+        )
+        self.assertEqual([row["quantity"] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows[0]["timestamp"], self.old)
+
+        keys = list(
+            archive.iter_archive("idempotency_keys", directory=self.archive_dir.name)
+        )
+        self.assertEqual([key["key"] for key in keys], ["done"])
+
+        newer = archive.iter_archive(
+            "purchase_records",
+            since=self.old + timedelta(seconds=1),
+            directory=self.archive_dir.name,
+        )
+        self.assertEqual(list(newer), [])
+
+    def test_interrupted_segment_is_recovered(self):
+        batches = archive.archive_table(
+            "purchase_records",
+            timezone.now() - timedelta(days=30),
+            RECORD_COUNT,
+            directory=self.archive_dir.name,
+        )
+
+        # Simulating a crash after the segment was listed but before the delete
+        def crash(table, ids, db):
+            raise RuntimeError("interrupted")
+
+        original = archive._delete_segment_rows
+        archive._delete_segment_rows = crash
+        try:
+            with self.assertRaises(RuntimeError):
+                next(batches)
+        finally:
+            archive._delete_segment_rows = original
+        self.assertEqual(UserPurchaseRecord.objects.count(), RECORD_COUNT + 1)
+
+        self.archive()
+        self.assertEqual(list(UserPurchaseRecord.objects.all()), [self.recent])
+        rows = list(
+            archive.iter_archive("purchase_records", directory=self.archive_dir.name)
+        )
+        self.assertEqual(len(rows), RECORD_COUNT)
+
+    def test_archived_keys_cannot_be_replayed(self):
+        self.archive()
+        self.assertEqual(
+            list(ArchivedIdempotencyKey.objects.values_list("key", flat=True)),
+            ["done"],
+        )
+
+        response = self.client.post(
+            URL_MAP["purchase"](self.cart.id),
+            data={IDEMPOTENCY_KEY: "done", USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["error"], ERROR_MESSAGES["idempotency_key_archived"]
+        )
+        self.assertFalse(IdempotencyKey.objects.filter(key="done").exists())
+
+    def test_runs_wait_for_each_other(self):
+        directory = archive._directory(self.archive_dir.name)
+        acquired = threading.Event()
+
+        def other_run():
+            with archive._locked(directory):
+                acquired.set()
+
+        with archive._locked(directory):
+            thread = threading.Thread(target=other_run)
+            thread.start()
+            self.assertFalse(acquired.wait(0.1))
+        thread.join()
+        self.assertTrue(acquired.is_set())
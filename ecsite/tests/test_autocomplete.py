@@ -0,0 +1,118 @@
+from uuid import uuid4
+from django.test import SimpleTestCase
+from rest_framework import status
+from ecsite.autocomplete import AutocompleteIndex
+from ecsite.constants import ERROR_MESSAGES, IDEMPOTENCY_KEY, USER_ID
+from ecsite.models import CartItem, Item, UserPurchaseRecord
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL, URL_MAP
+
+AUTOCOMPLETE_URL = f"{ITEMS_URL}autocomplete/"
+
+
+class TestAutocompleteIndex(SimpleTestCase):
+    def setUp(self):
+        self.index = AutocompleteIndex(3)
+        for item_id, name, stock, sales in (
+            (1, "Apple", 5, 0),
+            (2, "Apricot", 5, 2),
+            (3, "Green apple", 1, 0),
+            (4, "Banana", 0, 9),
+            (5, "Apple pie", 9, 0),
+        ):
+            self.index.update(item_id, name, stock, sales)
+
+    def ids(self, prefix: str, limit: int = 3) -> list:
+        return [item_id for item_id, _ in self.index.lookup(prefix, limit)]
+
+    def test_matches_name_and_word_prefixes(self):
+        self.assertEqual(self.ids("APP"), [5, 1, 3])
+        self.assertEqual(self.ids("ap", limit=5), [2, 5, 1])
+        self.assertEqual(self.ids("apple p"), [5])
+        self.assertEqual(self.ids("pie"), [5])
+        self.assertEqual(self.ids("cherry"), [])
+        self.assertEqual(self.ids("applex"), [])
+
+    def test_ranks_items_in_stock_first(self):
+        # Banana sold the most, but is out of stock
+        self.assertEqual(self.ids("a", limit=3), [2, 5, 1])
+        self.assertEqual(self.ids("b"), [4])
+
+    def test_updates_and_removals(self):
+        self.index.update(1, "Apple", 5, 10)
+        self.assertEqual(self.ids("app"), [1, 5, 3])
+
+        self.index.update(5, "Cherry pie", 9, 0)
+        self.assertEqual(self.ids("app"), [1, 3])
+        self.assertEqual(self.ids("pie"), [5])
+
+        for item_id in (1, 2, 3, 5):
+            self.index.remove(item_id)
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.ids("a"), [])
+        self.assertEqual(self.ids("ban"), [4])
+
+
+class TestAutocompleteAPI(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.apples = [
+            Item.objects.create(name=name, price=100, quantity=10)
+            for name in ("Apple", "Apple juice", "Green apple")
+        ]
+
+    def complete(self, prefix: str, **params):
+        return self.client.get(AUTOCOMPLETE_URL, {"prefix": prefix, **params})
+
+    def test_returns_ranked_names_and_ids(self):
+        UserPurchaseRecord.objects.create(
+            user=self.user, item=self.apples[2], quantity=3
+        )
+        response = self.complete("app")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["items"],
+            [
+                {"id": self.apples[2].id, "name": "Green apple"},
+                {"id": self.apples[0].id, "name": "Apple"},
+                {"id": self.apples[1].id, "name": "Apple juice"},
+            ],
+        )
+        self.assertEqual(len(self.complete("app", limit=1).data["items"]), 1)
+
+    def test_follows_item_changes(self):
+        self.assertEqual(len(self.complete("app").data["items"]), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apples[0].name = "Pear"
+            self.apples[0].save()
+            self.apples[1].delete()
+        names = [row["name"] for row in self.complete("app").data["items"]]
+        self.assertEqual(names, ["Green apple"])
+        self.assertEqual(self.complete("pe").data["items"][0]["name"], "Pear")
+
+        # Purchases add to the recent sales and take the stock
+        CartItem.objects.create(cart=self.cart, item=self.apples[0], quantity=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(name="Pea", price=100, quantity=1)
+            response = self.client.post(
+                URL_MAP["purchase"](self.cart.id),
+                data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [row["name"] for row in self.complete("pe").data["items"]]
+        self.assertEqual(names, ["Pea", "Pear"])
+
+    def test_invalid_parameters(self):
+        for params in ({"prefix": ""}, {"prefix": "a" * 101}):
+            response = self.client.get(AUTOCOMPLETE_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["error"], ERROR_MESSAGES["invalid_prefix"])
+
+        for limit in ("x", 0, 21):
+            response = self.complete("app", limit=limit)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                response.data["error"], ERROR_MESSAGES["invalid_autocomplete_limit"]
+            )
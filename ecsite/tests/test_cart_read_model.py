@@ -0,0 +1,97 @@
+from uuid import uuid4
+from rest_framework import status
+from ecsite import carts
+from ecsite.constants import IDEMPOTENCY_KEY, ITEM_ID, QUANTITY, USER_ID
+from ecsite.models import CartItem
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+
+class TestCartReadModel(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = list(self.cheaper_items.values())
+
+    def add(self, item, quantity=1):
+        response = self.client.post(
+            URL_MAP["add_item"](self.cart.id),
+            data={USER_ID: self.user.id, ITEM_ID: item.id, QUANTITY: quantity},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_repeated_views_cost_no_queries(self):
+        CartItem.objects.create(cart=self.cart, item=self.items[0], quantity=1)
+        carts.get_cart(self.cart.id)
+
+        with self.assertNumQueries(0):
+            model = carts.get_cart(self.cart.id)
+        self.assertEqual(
+            carts.cart_item_rows(model),
+            [
+                {
+                    "cart_item_id": CartItem.objects.get().id,
+                    "name": self.items[0].name,
+                    "quantity": self.items[0].quantity,
+                    "requested_quantity": 1,
+                    "price": self.items[0].price,
+                    "is_out_of_stock": False,
+                }
+            ],
+        )
+
+        response = self.client.get(URL_MAP["get"](self.cart.id))
+        self.assertEqual(response.data["cart"], {"items": [self.items[0].id]})
+
+    def test_add_and_delete_write_through(self):
+        carts.get_cart(self.cart.id)
+        # Cheaper items have at least 2 in stock
+        response = self.add(self.items[1], 1)
+        self.add(self.items[1], 1)
+        self.assertEqual(response.data["cart"], {"items": [self.items[1].id]})
+
+        with self.assertNumQueries(0):
+            lines = carts.get_cart(self.cart.id)["lines"]
+        self.assertEqual(
+            [(line["item_id"], line["requested_quantity"]) for line in lines],
+            [(self.items[1].id, 2)],
+        )
+
+        cart_item = CartItem.objects.get()
+        response = self.client.delete(
+            URL_MAP["delete_item"](self.cart.id, cart_item.id),
+            data={USER_ID: self.user.id},
+        )
+        self.assertEqual(response.data["cart"], {"items": []})
+        with self.assertNumQueries(0):
+            self.assertEqual(carts.get_cart(self.cart.id)["lines"], [])
+
+    def test_stock_flags_refresh_after_catalog_changes(self):
+        item = self.items[0]
+        CartItem.objects.create(cart=self.cart, item=item, quantity=1)
+        self.assertFalse(
+            carts.cart_item_rows(carts.get_cart(self.cart.id))[0]["is_out_of_stock"]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = 0
+            item.save()
+
+        row = carts.cart_item_rows(carts.get_cart(self.cart.id))[0]
+        self.assertEqual(row["quantity"], 0)
+        self.assertTrue(row["is_out_of_stock"])
+
+    def test_purchase_drops_cart(self):
+        self.add(self.items[0])
+        self.assertIsNotNone(carts.get_cart(self.cart.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                URL_MAP["purchase"](self.cart.id),
+                data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(carts.get_cart(self.cart.id))
+
+        response = self.client.get(URL_MAP["get"](self.cart.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from .base import AuthenticatedTestCase
 from ecsite.models import Cart, Item, IdempotencyKey
@@ -167,6 +169,16 @@ class TestCartsAPI(AuthenticatedTestCase):
         )
 
         self.assertEqual(response.data, second_response.data)
+        # Replayed from the cache without reading the key
+        with CaptureQueriesContext(connection) as queries:
+            third_response = self.client.post(
+                URL_MAP["purchase"](cart.id),
+                data={IDEMPOTENCY_KEY: key_val, USER_ID: self.user.id},
+            )
+        self.assertEqual(response.data, third_response.data)
+        self.assertFalse(
+            any("ecsite_idempotencykey" in query["sql"] for query in queries)
+        )
         # Checking that the item quantity only decremented by 1
         updated_item = Item.objects.get(id=item.id)
         self.assertEqual(updated_item.quantity, item.quantity - 1)
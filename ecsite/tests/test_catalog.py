@@ -0,0 +1,180 @@
+from uuid import uuid4
+from rest_framework import status
+from ecsite import catalog, inventory, metrics
+from ecsite.constants import ERROR_MESSAGES, IDEMPOTENCY_KEY, USER_ID
+from ecsite.models import CartItem, Item
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL, URL_MAP
+
+
+class TestItemMultiGet(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = list(self.cheaper_items.values()) + list(
+            self.expensive_items.values()
+        )
+
+    def get_items(self, ids: str):
+        return self.client.get(ITEMS_URL, {"ids": ids})
+
+    def cache_stats(self) -> dict:
+        values = metrics.collect()
+        return {
+            result: values.get(
+                ("ecsite_item_cache_requests_total", (("result", result),)), 0
+            )
+            for result in ("hit", "miss")
+        }
+
+    def test_returns_items_in_requested_order(self):
+        ids = [self.items[3].id, self.items[0].id, self.items[7].id]
+        response = self.get_items(f"{ids[0]},{ids[1]},{ids[2]},{ids[0]},999999")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["items"]], ids)
+        self.assertEqual(
+            response.data["items"][0],
+            {
+                "id": self.items[3].id,
+                "name": self.items[3].name,
+                "price": self.items[3].price,
+                "quantity": self.items[3].quantity,
+            },
+        )
+
+    def test_serves_repeated_lookups_from_cache(self):
+        ids = [item.id for item in self.items[:3]]
+        before = self.cache_stats()
+        catalog.get_items(ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [item["id"] for item in catalog.get_items(ids)],
+                ids,
+            )
+
+        after = self.cache_stats()
+        self.assertEqual(after["miss"] - before["miss"], 3)
+        self.assertEqual(after["hit"] - before["hit"], 3)
+
+    def test_fetches_only_misses(self):
+        catalog.get_items([self.items[0].id])
+        with self.assertNumQueries(1):
+            rows = catalog.get_items([self.items[0].id, self.items[1].id])
+        self.assertEqual(len(rows), 2)
+
+    def test_item_writes_invalidate_cache(self):
+        item = self.items[0]
+        catalog.get_items([item.id])
+        version = catalog.get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.price = 1
+            item.save()
+
+        self.assertEqual(catalog.get_items([item.id])[0]["price"], 1)
+        self.assertGreater(catalog.get_catalog_version(), version)
+
+    def test_purchase_invalidates_cache(self):
+        item = self.items[0]
+        catalog.get_items([item.id])
+        CartItem.objects.create(cart=self.cart, item=item, quantity=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                URL_MAP["purchase"](self.cart.id),
+                data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(catalog.get_items([item.id])[0]["quantity"], item.quantity - 2)
+
+    def test_invalid_ids(self):
+        for ids in ["", "1,a", "1,,2"]:
+            response = self.get_items(ids)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["error"], ERROR_MESSAGES["invalid_ids"])
+
+    def test_too_many_ids(self):
+        with self.settings(ITEMS_MULTI_GET_MAX=2):
+            response = self.get_items(",".join(str(item.id) for item in self.items[:3]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], ERROR_MESSAGES["too_many_ids"])
+
+
+FACETS_URL = f"{ITEMS_URL}facets/"
+
+
+class TestPriceFacets(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        Item.objects.all().delete()
+        for price, quantity in [(10, 1), (10, 0), (19, 3), (20, 0), (55, 2), (100, 5)]:
+            Item.objects.create(name=f"item {price}", price=price, quantity=quantity)
+
+    def get_facets(self, **params):
+        response = self.client.get(FACETS_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_fixed_width_buckets(self):
+        facets = self.get_facets(buckets=3)
+
+        self.assertEqual(facets["count"], 6)
+        self.assertEqual(facets["in_stock"], 4)
+        self.assertEqual((facets["min_price"], facets["max_price"]), (10, 100))
+        self.assertEqual(
+            facets["buckets"],
+            [
+                {"min": 10, "max": 40, "count": 4},
+                {"min": 41, "max": 71, "count": 1},
+                {"min": 72, "max": 100, "count": 1},
+            ],
+        )
+
+    def test_quantile_buckets(self):
+        facets = self.get_facets(buckets=3, mode="quantile")
+        self.assertEqual(
+            facets["buckets"],
+            [
+                {"min": 10, "max": 10, "count": 2},
+                {"min": 19, "max": 20, "count": 2},
+                {"min": 55, "max": 100, "count": 2},
+            ],
+        )
+
+    def test_uses_item_filters_and_sharded_stock(self):
+        item = Item.objects.get(price=20)
+        item.quantity = 4
+        item.save()
+        inventory.rebalance(item.id, 2)
+
+        facets = self.get_facets(name="item", min_price=15, max_price=60)
+        self.assertEqual(facets["count"], 3)
+        self.assertEqual(facets["in_stock"], 3)
+        self.assertEqual((facets["min_price"], facets["max_price"]), (19, 55))
+
+        facets = self.get_facets(name="missing")
+        self.assertEqual(facets["count"], 0)
+        self.assertEqual(facets["buckets"], [])
+
+    def test_cached_until_catalog_changes(self):
+        with self.assertNumQueries(1):
+            catalog.get_price_facets(Item.objects.all(), 5, "fixed")
+        with self.assertNumQueries(0):
+            catalog.get_price_facets(Item.objects.all(), 5, "fixed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(name="new", price=30, quantity=1)
+        facets = catalog.get_price_facets(Item.objects.all(), 5, "fixed")
+        self.assertEqual(facets["count"], 7)
+
+    def test_invalid_parameters(self):
+        for params, message in [
+            ({"buckets": 0}, "invalid_buckets"),
+            ({"buckets": 1000}, "invalid_buckets"),
+            ({"mode": "linear"}, "invalid_facet_mode"),
+            ({"min_price": "a"}, "invalid_min_price"),
+        ]:
+            response = self.client.get(FACETS_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["error"], ERROR_MESSAGES[message])
@@ -0,0 +1,205 @@
+import threading
+from io import StringIO
+from unittest import mock
+from uuid import uuid4
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from ecsite import checkout
+from ecsite.models import Cart, CartItem, CheckoutJob, IdempotencyKey, Item, User
+from ecsite.constants import (
+    CHECKOUT_MODE_ASYNC,
+    CHECKOUT_MODE_GROUP,
+    ERROR_MESSAGES,
+    IDEMPOTENCY_KEY,
+    ITEM_ID,
+    QUANTITY,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_SUCCESS,
+    USER_ID,
+)
+from .base import AuthenticatedTestCase
+from .constants import CART_URL, URL_MAP
+
+CHECKOUT_STATUS_URL = lambda key: f"{CART_URL}checkouts/{key}/"
+
+
+@override_settings(CHECKOUT_MODE=CHECKOUT_MODE_ASYNC)
+class TestAsyncCheckout(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = list(self.cheaper_items.values())[0]
+        self.cart_obj = self.create_and_return_cart()
+        self.client.post(
+            URL_MAP["add_item"](self.cart_obj.id),
+            data={USER_ID: self.user.id, QUANTITY: 1, ITEM_ID: self.item.id},
+        )
+
+    def purchase(self, key):
+        return self.client.post(
+            URL_MAP["purchase"](self.cart_obj.id),
+            data={IDEMPOTENCY_KEY: key, USER_ID: self.user.id},
+        )
+
+    def get_status(self, key, user_id=None):
+        return self.client.get(
+            CHECKOUT_STATUS_URL(key), data={USER_ID: user_id or self.user.id}
+        )
+
+    def test_purchase_is_queued(self):
+        key = str(uuid4())
+        response = self.purchase(key)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["checkout"]["key"], key)
+        self.assertEqual(response.data["checkout"]["status"], STATUS_PENDING)
+        self.assertTrue(CheckoutJob.objects.filter(idempotency_key__key=key).exists())
+
+        # Nothing is purchased until the worker runs
+        self.assertEqual(Item.objects.get(id=self.item.id).quantity, self.item.quantity)
+        self.assertEqual(self.purchase(key).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(
+            self.get_status(key).data["checkout"]["status"], STATUS_PENDING
+        )
+
+    def test_worker_processes_queue(self):
+        key = str(uuid4())
+        self.purchase(key)
+        call_command("process_checkouts", stdout=StringIO())
+
+        response = self.get_status(key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["checkout"]["status"], STATUS_SUCCESS)
+        self.assertEqual(
+            response.data["checkout"]["response_data"],
+            [{"item": self.item.id, "quantity": 1}],
+        )
+        self.assertFalse(CheckoutJob.objects.exists())
+        self.assertFalse(Cart.objects.filter(id=self.cart_obj.id).exists())
+        self.assertEqual(
+            Item.objects.get(id=self.item.id).quantity, self.item.quantity - 1
+        )
+
+        # Replaying a processed key returns the stored response
+        replay = self.purchase(key)
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            replay.data["response"], [{"item": self.item.id, "quantity": 1}]
+        )
+
+    def test_status_requires_owner(self):
+        key = str(uuid4())
+        self.purchase(key)
+        response = self.get_status(key, user_id=123123123)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.data["error"], ERROR_MESSAGES["checkout_does_not_exist"]
+        )
+
+
+class TestCheckoutBatch(AuthenticatedTestCase):
+    def create_checkout(self, user, item, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.create(cart=cart, item=item, quantity=quantity)
+        key = IdempotencyKey.objects.create(user=user, key=str(uuid4()))
+        return key, cart.id
+
+    def test_oversold_cart_is_rejected_alone(self):
+        item = list(self.cheaper_items.values())[0]
+        other_user = User.objects.create_user(username="otheruser", password="pw")
+        third_user = User.objects.create_user(username="thirduser", password="pw")
+
+        first = self.create_checkout(self.user, item, item.quantity - 1)
+        second = self.create_checkout(other_user, item, 2)
+        third = self.create_checkout(third_user, item, 1)
+        checkout.checkout_batch([first, second, third])
+
+        self.assertEqual(first[0].status, STATUS_SUCCESS)
+        self.assertEqual(second[0].status, STATUS_FAILED)
+        self.assertEqual(
+            second[0].response_data, {"error": ERROR_MESSAGES["not_enough_stock"]}
+        )
+        self.assertEqual(third[0].status, STATUS_SUCCESS)
+
+        self.assertEqual(Item.objects.get(id=item.id).quantity, 0)
+        self.assertTrue(Cart.objects.filter(id=second[1]).exists())
+        self.assertEqual(
+            IdempotencyKey.objects.get(id=second[0].id).status, STATUS_FAILED
+        )
+
+    def test_error_in_retry_only_fails_its_cart(self):
+        items = list(self.cheaper_items.values())
+        other_user = User.objects.create_user(username="otheruser", password="pw")
+        third_user = User.objects.create_user(username="thirduser", password="pw")
+        first = self.create_checkout(self.user, items[0], 1)
+        second = self.create_checkout(other_user, items[1], 1)
+        third = self.create_checkout(third_user, items[2], 1)
+
+        checkout_batch = checkout._checkout_batch
+        calls = []
+
+        def flaky_batch(db, checkouts):
+            calls.append(checkouts)
+            if len(calls) == 1:
+                raise checkout.StaleStockError()
+            if checkouts == [second]:
+                raise RuntimeError("disk I/O error")
+            checkout_batch(db, checkouts)
+
+        with mock.patch.object(checkout, "_checkout_batch", flaky_batch):
+            checkout.checkout_batch([first, second, third])
+
+        self.assertEqual(len(calls), 4)
+        for key, cart_id in (first, third):
+            self.assertEqual(
+                IdempotencyKey.objects.get(id=key.id).status, STATUS_SUCCESS
+            )
+            self.assertFalse(Cart.objects.filter(id=cart_id).exists())
+        failed = IdempotencyKey.objects.get(id=second[0].id)
+        self.assertEqual(failed.status, STATUS_FAILED)
+        self.assertEqual(failed.response_data, {"error": "disk I/O error"})
+        self.assertTrue(Cart.objects.filter(id=second[1]).exists())
+        self.assertEqual(
+            Item.objects.get(id=items[0].id).quantity, items[0].quantity - 1
+        )
+        self.assertEqual(Item.objects.get(id=items[1].id).quantity, items[1].quantity)
+
+    @override_settings(CHECKOUT_MODE=CHECKOUT_MODE_GROUP)
+    def test_group_mode_purchase(self):
+        item = list(self.cheaper_items.values())[0]
+        CartItem.objects.create(cart=self.cart, item=item, quantity=1)
+
+        response = self.client.post(
+            URL_MAP["purchase"](self.cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["response"], [{"item": item.id, "quantity": 1}])
+        self.assertEqual(Item.objects.get(id=item.id).quantity, item.quantity - 1)
+
+
+class TestGroupCommitter(TestCase):
+    def test_concurrent_checkouts_share_batches(self):
+        batches = []
+        committer = checkout.GroupCommitter(0.05, 10, apply=batches.append)
+        threads = [
+            threading.Thread(target=committer.submit, args=(f"key-{i}", i))
+            for i in range(25)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        submitted = sorted(cart_id for batch in batches for _, cart_id in batch)
+        self.assertEqual(submitted, list(range(25)))
+        self.assertLess(len(batches), 25)
+        self.assertTrue(all(len(batch) <= 10 for batch in batches))
+
+    def test_errors_are_raised_to_every_caller(self):
+        def apply(batch):
+            raise RuntimeError("database is locked")
+
+        committer = checkout.GroupCommitter(0, 10, apply=apply)
+        with self.assertRaises(RuntimeError):
+            committer.submit("key", 1)
@@ -0,0 +1,106 @@
+from io import StringIO
+from uuid import uuid4
+from django.core.management import call_command
+from rest_framework import status
+from ecsite import inventory, versions
+from ecsite.constants import ERROR_MESSAGES, IDEMPOTENCY_KEY, SINCE, USER_ID
+from ecsite.models import CartItem, Item, ItemTombstone
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL, URL_MAP
+
+
+class TestDeltaSync(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = list(self.cheaper_items.values()) + list(
+            self.expensive_items.values()
+        )
+
+    def sync(self, since: int) -> dict:
+        response = self.client.get(ITEMS_URL, {SINCE: since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync_then_only_changes(self):
+        initial = self.sync(0)
+        self.assertEqual(len(initial["items"]), len(self.items))
+        self.assertEqual(initial["deleted"], [])
+        self.assertFalse(initial["reset"])
+
+        unchanged = self.sync(initial["version"])
+        self.assertEqual(unchanged["items"], [])
+        self.assertEqual(unchanged["version"], initial["version"])
+
+        renamed, repriced, deleted = self.items[:3]
+        renamed.name = "renamed"
+        renamed.save()
+        repriced.price += 1
+        repriced.save()
+        deleted_id = deleted.id
+        deleted.delete()
+
+        changes = self.sync(initial["version"])
+        self.assertEqual(
+            [(row["id"], row["name"], row["price"]) for row in changes["items"]],
+            [
+                (renamed.id, "renamed", renamed.price),
+                (repriced.id, repriced.name, repriced.price),
+            ],
+        )
+        self.assertEqual(changes["deleted"], [deleted_id])
+        self.assertGreater(changes["version"], initial["version"])
+
+        self.assertEqual(self.sync(changes["version"])["items"], [])
+
+    def test_purchases_bump_versions(self):
+        item = self.items[5]
+        inventory.rebalance(item.id, 2)
+        version = self.sync(0)["version"]
+
+        for purchased in (self.items[0], item):
+            CartItem.objects.create(cart=self.cart, item=purchased, quantity=1)
+        response = self.client.post(
+            URL_MAP["purchase"](self.cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        changes = self.sync(version)
+        self.assertEqual(
+            sorted((row["id"], row["quantity"]) for row in changes["items"]),
+            [
+                (self.items[0].id, self.items[0].quantity - 1),
+                (item.id, item.quantity - 1),
+            ],
+        )
+
+    def test_init_data_resets_earlier_clients(self):
+        version = self.sync(0)["version"]
+        self.items[0].delete()
+        self.assertEqual(ItemTombstone.objects.count(), 1)
+        # Dropping the cached users, init_data replaces them too
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("init_data", stdout=StringIO())
+
+        # The replaced items leave no tombstones and the old one is pruned
+        self.assertFalse(ItemTombstone.objects.exists())
+        changes = self.sync(version)
+        self.assertTrue(changes["reset"])
+        self.assertEqual(changes["deleted"], [])
+        self.assertEqual(len(changes["items"]), Item.objects.count())
+
+        # Clients synced after the reset get deltas again
+        self.assertFalse(self.sync(changes["version"])["reset"])
+
+    def test_clients_ahead_of_the_server_get_everything(self):
+        version = versions.current_version()
+        changes = self.sync(version + 100)
+        self.assertTrue(changes["reset"])
+        self.assertEqual(len(changes["items"]), len(self.items))
+        self.assertEqual(changes["version"], version)
+
+    def test_invalid_since(self):
+        for since in ("x", -1):
+            response = self.client.get(ITEMS_URL, {SINCE: since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["error"], ERROR_MESSAGES["invalid_since"])
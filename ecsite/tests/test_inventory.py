@@ -0,0 +1,120 @@
+from io import StringIO
+from unittest import mock
+from uuid import uuid4
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from ecsite import inventory
+from ecsite.models import Item, ItemStockShard
+from ecsite.constants import USER_ID, QUANTITY, ITEM_ID, IDEMPOTENCY_KEY
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL, URL_MAP
+
+SHARDS = 4
+
+
+class TestShardedInventory(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = list(self.expensive_items.values())[0]
+        self.stock = self.item.quantity
+        self.item = inventory.rebalance(self.item.id, SHARDS)
+
+    def shard_quantities(self) -> list:
+        return list(
+            ItemStockShard.objects.filter(item=self.item)
+            .order_by("shard")
+            .values_list("quantity", flat=True)
+        )
+
+    def purchase(self, quantity):
+        cart = self.create_and_return_cart()
+        response = self.client.post(
+            URL_MAP["add_item"](cart.id),
+            data={USER_ID: self.user.id, QUANTITY: quantity, ITEM_ID: self.item.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return self.client.post(
+            URL_MAP["purchase"](cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+
+    def test_rebalance_splits_stock(self):
+        quantities = self.shard_quantities()
+        self.assertEqual(len(quantities), SHARDS)
+        self.assertEqual(sum(quantities), self.stock)
+        self.assertLessEqual(max(quantities) - min(quantities), 1)
+
+        item = Item.objects.get(id=self.item.id)
+        self.assertTrue(item.is_sharded)
+        self.assertEqual(item.quantity, 0)
+
+    def test_list_reports_aggregate_stock(self):
+        response = self.client.get(ITEMS_URL, data={"name": self.item.name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["items"][0]["quantity"], self.stock)
+
+        annotated = Item.objects.annotate(stock=inventory.stock_expression()).get(
+            id=self.item.id
+        )
+        self.assertEqual(annotated.stock, self.stock)
+
+    def test_purchase_falls_back_across_shards(self):
+        # More than a single shard holds, so at least two shards are used
+        quantity = self.stock // SHARDS + 2
+        response = self.purchase(quantity)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(self.shard_quantities()), self.stock - quantity)
+        self.assertEqual(inventory.get_stock(self.item), self.stock - quantity)
+
+    def test_purchase_takes_what_a_raced_shard_still_holds(self):
+        before = self.shard_quantities()
+
+        def race(shards):
+            # Another purchase takes from every shard after they were read
+            ItemStockShard.objects.filter(item=self.item).update(
+                quantity=F("quantity") - 1
+            )
+
+        with mock.patch("ecsite.inventory.random.shuffle", side_effect=race):
+            with transaction.atomic():
+                self.assertTrue(
+                    inventory.decrement_stock(self.item, sum(before) - SHARDS)
+                )
+        self.assertEqual(self.shard_quantities(), [0] * SHARDS)
+
+    def test_purchase_rolls_back_when_shards_run_out(self):
+        ItemStockShard.objects.filter(item=self.item, shard=0).update(quantity=0)
+        before = self.shard_quantities()
+        cart = self.create_and_return_cart()
+        self.client.post(
+            URL_MAP["add_item"](cart.id),
+            data={USER_ID: self.user.id, QUANTITY: sum(before), ITEM_ID: self.item.id},
+        )
+        ItemStockShard.objects.filter(item=self.item, shard=1).update(quantity=0)
+
+        response = self.client.post(
+            URL_MAP["purchase"](cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "Item does not have enough stock")
+        self.assertEqual(self.shard_quantities(), [0, 0] + before[2:])
+
+    def test_rebalance_command(self):
+        ItemStockShard.objects.filter(item=self.item, shard=0).update(quantity=0)
+        remaining = sum(self.shard_quantities())
+
+        out = StringIO()
+        call_command("rebalance_stock", "--shards", 2, stdout=out)
+        self.assertEqual(len(self.shard_quantities()), 2)
+        self.assertEqual(sum(self.shard_quantities()), remaining)
+
+        call_command(
+            "rebalance_stock", "--item", self.item.id, "--shards", 0, stdout=out
+        )
+        item = Item.objects.get(id=self.item.id)
+        self.assertFalse(item.is_sharded)
+        self.assertEqual(item.quantity, remaining)
+        self.assertEqual(self.shard_quantities(), [])
@@ -1,5 +1,16 @@
 from rest_framework import status
-from ecsite.constants import NAME, MAX_PRICE, MIN_PRICE
+from ecsite import catalog, inventory
+from ecsite.constants import (
+    NAME,
+    MAX_PRICE,
+    MIN_PRICE,
+    ORDERING,
+    LIMIT,
+    CURSOR,
+    ITEM_ORDERINGS,
+    ERROR_MESSAGES,
+)
+from ecsite.models import Item
 from .base import AuthenticatedTestCase, ITEM_COUNT
 from .base import ITEM_MIN_PRICE
 from .constants import ITEMS_URL
@@ -58,3 +69,91 @@ class TestItemAPI(AuthenticatedTestCase):
     def test_search_item_filter_max_invalid(self):
         response = self.client.get(ITEMS_URL, data={MIN_PRICE: "invalid"})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering(self):
+        items = list(self.cheaper_items.values()) + list(self.expensive_items.values())
+        for ordering in ITEM_ORDERINGS:
+            field = ordering.lstrip("-")
+            descending = ordering.startswith("-")
+            expected = sorted(
+                items,
+                key=lambda item: (getattr(item, field), item.id),
+                reverse=descending,
+            )
+            response = self.client.get(ITEMS_URL, data={ORDERING: ordering})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [item["id"] for item in response.data["items"]],
+                [item.id for item in expected],
+                ordering,
+            )
+            self.assertIsNone(response.data["next_cursor"])
+
+    def test_limit_pages_through_equal_values(self):
+        Item.objects.bulk_create(
+            Item(name=f"tied {i}", price=ITEM_MIN_PRICE, quantity=1) for i in range(5)
+        )
+        expected = list(
+            Item.objects.filter(price__lte=ITEM_MIN_PRICE)
+            .order_by("-price", "-id")
+            .values_list("id", flat=True)
+        )
+
+        seen = []
+        params = {MAX_PRICE: ITEM_MIN_PRICE, ORDERING: "-price", LIMIT: 3}
+        while True:
+            response = self.client.get(ITEMS_URL, data=params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["items"]), 3)
+            seen.extend(item["id"] for item in response.data["items"])
+            if response.data["next_cursor"] is None:
+                break
+            params[CURSOR] = response.data["next_cursor"]
+        self.assertEqual(seen, expected)
+
+    def test_quantity_ordering_uses_sharded_stock(self):
+        hot = list(self.cheaper_items.values())[0]
+        Item.objects.filter(id=hot.id).update(quantity=1000)
+        inventory.rebalance(hot.id, 4)
+        stock = {item.id: item.quantity for item in Item.objects.all()}
+        stock[hot.id] = 1000
+        expected = sorted(stock, key=lambda item_id: (stock[item_id], item_id))[::-1]
+
+        seen = []
+        params = {ORDERING: "-quantity", LIMIT: 3}
+        while True:
+            response = self.client.get(ITEMS_URL, data=params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(
+                (item["id"], item["quantity"]) for item in response.data["items"]
+            )
+            if response.data["next_cursor"] is None:
+                break
+            params[CURSOR] = response.data["next_cursor"]
+        self.assertEqual(seen, [(item_id, stock[item_id]) for item_id in expected])
+
+    def test_ordered_page_is_an_index_range_scan(self):
+        items = catalog.order_items(catalog.filter_items(max_price=1000), "price")[:20]
+        plan = items.explain()
+        self.assertIn("item_price_id_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invalid_ordering_limit_and_cursor(self):
+        for params, error in (
+            ({ORDERING: "price; drop"}, "invalid_ordering"),
+            ({ORDERING: "id"}, "invalid_ordering"),
+            ({LIMIT: 0}, "invalid_limit"),
+            ({LIMIT: "x"}, "invalid_limit"),
+            ({CURSOR: "invalid"}, "invalid_cursor"),
+        ):
+            response = self.client.get(ITEMS_URL, data=params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["error"], ERROR_MESSAGES[error])
+
+        # Cursors only continue the ordering they were returned for
+        response = self.client.get(ITEMS_URL, data={ORDERING: "name", LIMIT: 1})
+        cursor = response.data["next_cursor"]
+        response = self.client.get(
+            ITEMS_URL, data={ORDERING: "price", LIMIT: 1, CURSOR: cursor}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
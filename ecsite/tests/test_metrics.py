@@ -0,0 +1,78 @@
+import tempfile
+from pathlib import Path
+from uuid import uuid4
+from django.test import override_settings
+from rest_framework import status
+from ecsite import metrics
+from ecsite.constants import USER_ID, QUANTITY, ITEM_ID, IDEMPOTENCY_KEY
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL, URL_MAP
+
+METRICS_URL = "/metrics"
+
+
+class TestMetrics(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        settings_override = override_settings(METRICS_DIR=Path(self.metrics_dir.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_metrics(self) -> str:
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_request_counters_and_latency(self):
+        self.client.get(ITEMS_URL)
+        self.client.get(ITEMS_URL)
+
+        body = self.get_metrics()
+        self.assertIn(
+            'ecsite_requests_total{action="list",method="GET",status="200"} 2.0', body
+        )
+        self.assertIn(
+            'ecsite_request_duration_seconds_bucket{action="list",le="+Inf"} 2.0',
+            body,
+        )
+        self.assertIn('ecsite_request_duration_seconds_count{action="list"} 2.0', body)
+
+    def test_purchase_counters(self):
+        cart = self.create_and_return_cart()
+        item = list(self.cheaper_items.values())[0]
+        self.client.post(
+            URL_MAP["add_item"](cart.id),
+            data={USER_ID: self.user.id, QUANTITY: item.quantity + 1, ITEM_ID: item.id},
+        )
+        self.client.post(
+            URL_MAP["add_item"](cart.id),
+            data={USER_ID: self.user.id, QUANTITY: 1, ITEM_ID: item.id},
+        )
+        key = str(uuid4())
+        for _ in range(2):
+            self.client.post(
+                URL_MAP["purchase"](cart.id),
+                data={IDEMPOTENCY_KEY: key, USER_ID: self.user.id},
+            )
+
+        body = self.get_metrics()
+        self.assertIn('ecsite_out_of_stock_total{action="add"} 1.0', body)
+        self.assertIn('ecsite_purchases_total{result="success"} 1.0', body)
+        self.assertIn("ecsite_idempotency_replays_total 1.0", body)
+        self.assertIn(
+            'ecsite_requests_total{action="purchase",method="POST",status="200"} 2.0',
+            body,
+        )
+
+    def test_aggregates_across_processes(self):
+        metrics.IDEMPOTENCY_REPLAYS.inc()
+        # Simulating a second worker writing into its own file
+        other = metrics.MmapedValues(
+            Path(self.metrics_dir.name) / "metrics_999999999.db"
+        )
+        other.inc(metrics._sample_key("ecsite_idempotency_replays_total", {}), 2)
+
+        self.assertIn("ecsite_idempotency_replays_total 3.0", self.get_metrics())
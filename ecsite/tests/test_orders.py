@@ -0,0 +1,98 @@
+from datetime import timedelta
+from uuid import uuid4
+from django.utils import timezone
+from rest_framework import status
+from ecsite.models import Item, UserItemPurchaseSummary, UserPurchaseRecord
+from ecsite.constants import (
+    CURSOR,
+    ERROR_MESSAGES,
+    IDEMPOTENCY_KEY,
+    ITEM_ID,
+    LIMIT,
+    QUANTITY,
+    USER_ID,
+)
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+ORDERS_URL = "/api/v1/orders/"
+ORDER_SUMMARY_URL = "/api/v1/orders/summary/"
+RECORD_COUNT = 7
+
+
+class TestOrderHistoryAPI(AuthenticatedTestCase):
+    def create_records(self):
+        item = list(self.cheaper_items.values())[0]
+        now = timezone.now()
+        for i in range(RECORD_COUNT):
+            record = UserPurchaseRecord.objects.create(
+                user=self.user, item=item, quantity=i + 1
+            )
+            # Two records share every timestamp to exercise the id tie-breaker
+            UserPurchaseRecord.objects.filter(id=record.id).update(
+                timestamp=now - timedelta(minutes=i // 2)
+            )
+        return list(
+            UserPurchaseRecord.objects.order_by("-timestamp", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+    def purchase(self, item, quantity):
+        cart = self.create_and_return_cart()
+        response = self.client.post(
+            URL_MAP["add_item"](cart.id),
+            data={USER_ID: self.user.id, QUANTITY: quantity, ITEM_ID: item.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(
+            URL_MAP["purchase"](cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_keyset_pagination(self):
+        expected = self.create_records()
+
+        seen = []
+        params = {USER_ID: self.user.id, LIMIT: 3}
+        while True:
+            response = self.client.get(ORDERS_URL, data=params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [order["id"] for order in response.data["orders"]]
+            if response.data["next_cursor"] is None:
+                break
+            params[CURSOR] = response.data["next_cursor"]
+
+        self.assertEqual(seen, expected)
+
+    def test_other_users_orders_are_excluded(self):
+        self.create_records()
+        response = self.client.get(ORDERS_URL, data={USER_ID: 123123123})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["orders"], [])
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            ORDERS_URL, data={USER_ID: self.user.id, CURSOR: "invalid"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], ERROR_MESSAGES["invalid_cursor"])
+
+    def test_summary_is_updated_by_purchases(self):
+        item = Item.objects.create(name="summarized", price=10, quantity=3)
+        self.purchase(item, 1)
+        self.purchase(item, 2)
+
+        summary = UserItemPurchaseSummary.objects.get(user=self.user, item=item)
+        self.assertEqual(summary.total_quantity, 3)
+        self.assertEqual(summary.purchase_count, 2)
+
+        response = self.client.get(
+            ORDER_SUMMARY_URL, data={USER_ID: self.user.id, ITEM_ID: item.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["summary"]), 1)
+        self.assertEqual(response.data["summary"][0]["total_quantity"], 3)
+        self.assertEqual(response.data["summary"][0]["purchase_count"], 2)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+from django.test import override_settings
+from rest_framework import status
+from ecsite.constants import PROFILE_HEADER
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL
+
+
+class TestProfiling(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+
+    def profiles(self) -> list:
+        return os.listdir(self.profile_dir.name)
+
+    def test_profile_header_requires_staff(self):
+        with override_settings(PROFILING_DIR=self.profile_dir.name):
+            response = self.client.get(ITEMS_URL, headers={PROFILE_HEADER: "1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(PROFILE_HEADER, response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_profile_header_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        with override_settings(PROFILING_DIR=self.profile_dir.name):
+            response = self.client.get(ITEMS_URL, headers={PROFILE_HEADER: "1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        file_name = response[PROFILE_HEADER]
+        self.assertEqual(self.profiles(), [file_name])
+        self.assertTrue(file_name.startswith("item-list.list."))
+        self.assertTrue(file_name.endswith(".prof"))
+
+    def test_profile_sampling(self):
+        with override_settings(
+            PROFILING_DIR=self.profile_dir.name, PROFILING_SAMPLE_RATE=1.0
+        ):
+            response = self.client.get(ITEMS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(PROFILE_HEADER, response)
+        self.assertEqual(len(self.profiles()), 1)
@@ -0,0 +1,165 @@
+from uuid import uuid4
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from ecsite import inventory
+from ecsite.constants import IDEMPOTENCY_KEY, ITEM_ID, QUANTITY, USER_ID
+from ecsite.models import (
+    Cart,
+    CartItem,
+    IdempotencyKey,
+    Item,
+    User,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
+from ecsite.query_budgets import CONSTANT_QUERY_ACTIONS, QUERY_BUDGETS
+from ecsite.urls import router
+from .base import AuthenticatedTestCase
+from .constants import CART_URL, ITEMS_URL, URL_MAP
+
+SMALL_SIZE = 10
+LARGE_SIZE = 1000
+ORDERS_URL = "/api/v1/orders/"
+STANDARD_ACTIONS = ("list", "create", "retrieve", "update", "partial_update", "destroy")
+
+
+def format_queries(queries) -> str:
+    return "\n".join(
+        f"  {number}. {query['sql']}" for number, query in enumerate(queries, 1)
+    )
+
+
+class TestQueryBudgets(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.size = 0
+        self.cart_items = list(self.cheaper_items.values())
+        for item in self.cart_items[:2]:
+            CartItem.objects.create(cart=self.cart, item=item, quantity=1)
+        self.checkout_key = IdempotencyKey.objects.create(
+            user=self.user, key=str(uuid4()), response_data=[]
+        )
+        inventory.rebalance(list(self.expensive_items.values())[0].id, 4)
+
+    def grow(self, size: int):
+        """Adds items, carts of other users and purchases up to ``size`` each."""
+        count = size - self.size
+        items = Item.objects.bulk_create(
+            Item(name=f"item {self.size + i}", price=100 + i, quantity=10)
+            for i in range(count)
+        )
+        users = User.objects.bulk_create(
+            User(username=f"user {self.size + i}") for i in range(count)
+        )
+        carts = Cart.objects.bulk_create(Cart(user=user) for user in users)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, item=item, quantity=1)
+            for cart, item in zip(carts, items)
+        )
+        UserPurchaseRecord.objects.bulk_create(
+            UserPurchaseRecord(user=self.user, item=item, quantity=1) for item in items
+        )
+        UserItemPurchaseSummary.objects.bulk_create(
+            UserItemPurchaseSummary(
+                user=self.user,
+                item=item,
+                total_quantity=1,
+                purchase_count=1,
+                last_purchased_at=timezone.now(),
+            )
+            for item in items
+        )
+        self.size = size
+
+    def endpoint_requests(self) -> dict:
+        cart_id = self.cart.id
+        line = CartItem.objects.filter(cart=self.cart).first()
+        new_item = list(self.expensive_items.values())[1]
+        return {
+            ("item", "list"): lambda: self.client.get(ITEMS_URL, {"name": "item"}),
+            ("item", "facets"): lambda: self.client.get(f"{ITEMS_URL}facets/"),
+            ("item", "autocomplete"): lambda: self.client.get(
+                f"{ITEMS_URL}autocomplete/", {"prefix": "it"}
+            ),
+            ("cart", "list"): lambda: self.client.get(CART_URL),
+            ("cart", "retrieve"): lambda: self.client.get(URL_MAP["get"](cart_id)),
+            ("cart", "create"): lambda: self.client.post(
+                CART_URL, data={USER_ID: self.user.id}
+            ),
+            ("cart", "add"): lambda: self.client.post(
+                URL_MAP["add_item"](cart_id),
+                data={USER_ID: self.user.id, ITEM_ID: new_item.id, QUANTITY: 1},
+            ),
+            ("cart", "delete_cart_item"): lambda: self.client.delete(
+                URL_MAP["delete_item"](cart_id, line.id),
+                data={USER_ID: self.user.id},
+            ),
+            ("cart", "purchase"): lambda: self.client.post(
+                URL_MAP["purchase"](cart_id),
+                data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+            ),
+            ("cart", "checkout_status"): lambda: self.client.get(
+                f"{CART_URL}checkouts/{self.checkout_key.key}/",
+                {USER_ID: self.user.id},
+            ),
+            ("order", "list"): lambda: self.client.get(
+                ORDERS_URL, {USER_ID: self.user.id}
+            ),
+            ("order", "summary"): lambda: self.client.get(
+                f"{ORDERS_URL}summary/", {USER_ID: self.user.id}
+            ),
+        }
+
+    def measure(self) -> dict:
+        """Requests every endpoint once with cold caches, rolling back its writes."""
+        # Starting the session, so every request sees the same session state
+        self.client.get(ITEMS_URL)
+
+        measured = {}
+        for key, request in self.endpoint_requests().items():
+            cache.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    response = request()
+                transaction.set_rollback(True)
+            self.assertLess(response.status_code, 300, f"{key}: {response.content}")
+            measured[key] = queries.captured_queries
+        return measured
+
+    def test_every_action_has_a_budget(self):
+        routed = set()
+        for _, viewset, basename in router.registry:
+            routed.update(
+                (basename, action)
+                for action in STANDARD_ACTIONS
+                if hasattr(viewset, action)
+            )
+            routed.update(
+                (basename, action.__name__) for action in viewset.get_extra_actions()
+            )
+        self.assertEqual(routed, set(QUERY_BUDGETS))
+        self.assertLessEqual(CONSTANT_QUERY_ACTIONS, routed)
+
+    def test_endpoints_stay_within_budget(self):
+        self.grow(SMALL_SIZE)
+        small = self.measure()
+        self.grow(LARGE_SIZE)
+        large = self.measure()
+
+        failures = []
+        for key, budget in QUERY_BUDGETS.items():
+            for size, queries in ((SMALL_SIZE, small[key]), (LARGE_SIZE, large[key])):
+                if len(queries) > budget:
+                    failures.append(
+                        f"{key} ran {len(queries)} queries with {size} rows, "
+                        f"budget is {budget}:\n{format_queries(queries)}"
+                    )
+            if key in CONSTANT_QUERY_ACTIONS and len(large[key]) != len(small[key]):
+                failures.append(
+                    f"{key} ran {len(small[key])} queries with {SMALL_SIZE} rows "
+                    f"but {len(large[key])} with {LARGE_SIZE} rows:\n"
+                    f"{format_queries(large[key])}"
+                )
+        self.assertFalse(failures, "\n\n".join(failures))
@@ -0,0 +1,129 @@
+import datetime
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from ecsite import analytics
+from ecsite.models import SalesRollup, User, UserPurchaseRecord
+from .base import AuthenticatedTestCase
+
+DAY_ONE = datetime.datetime(2025, 6, 1, 12, tzinfo=datetime.timezone.utc)
+DAY_TWO = DAY_ONE + datetime.timedelta(days=1)
+
+
+class TestSalesRollups(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = list(self.cheaper_items.values())[0]
+        self.other_user = User.objects.create_user(username="otheruser", password="pw")
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        archive_settings = override_settings(ARCHIVE_DIR=archive_dir.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+    def create_record(self, user, quantity, timestamp):
+        record = UserPurchaseRecord.objects.create(
+            user=user, item=self.item, quantity=quantity
+        )
+        UserPurchaseRecord.objects.filter(id=record.id).update(timestamp=timestamp)
+
+    def build(self):
+        call_command("build_sales_rollups", "--chunk-size", 2, stdout=StringIO())
+        return {
+            rollup.day: rollup for rollup in SalesRollup.objects.filter(item=self.item)
+        }
+
+    def test_daily_rollups(self):
+        self.create_record(self.user, 1, DAY_ONE)
+        self.create_record(self.user, 2, DAY_ONE)
+        self.create_record(self.other_user, 3, DAY_ONE)
+        self.create_record(None, 1, DAY_TWO)
+
+        rollups = self.build()
+        first = rollups[DAY_ONE.date()]
+        self.assertEqual(first.units, 6)
+        self.assertEqual(first.revenue, 6 * self.item.price)
+        self.assertEqual(first.buyers, 2)
+
+        second = rollups[DAY_TWO.date()]
+        self.assertEqual(second.units, 1)
+        self.assertEqual(second.buyers, 0)
+
+    def test_incremental_rerun(self):
+        self.create_record(self.user, 1, DAY_ONE)
+        self.create_record(self.user, 1, DAY_TWO)
+        self.build()
+        day_one = SalesRollup.objects.get(item=self.item, day=DAY_ONE.date())
+
+        self.create_record(self.user, 4, DAY_TWO)
+        self.create_record(self.other_user, 1, DAY_TWO)
+        rollups = self.build()
+
+        # Days without new purchases are left untouched
+        self.assertEqual(rollups[DAY_ONE.date()].id, day_one.id)
+        self.assertEqual(rollups[DAY_TWO.date()].units, 6)
+        self.assertEqual(rollups[DAY_TWO.date()].buyers, 2)
+
+        out = StringIO()
+        call_command("build_sales_rollups", stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+    def test_late_record_only_rereads_its_day(self):
+        self.create_record(self.user, 1, DAY_ONE)
+        for offset in range(1, 4):
+            self.create_record(self.user, 1, DAY_ONE + datetime.timedelta(days=offset))
+        last_day = DAY_ONE + datetime.timedelta(days=4)
+        self.create_record(self.user, 1, last_day)
+        self.build()
+
+        self.create_record(self.other_user, 2, DAY_ONE)
+        self.create_record(self.other_user, 3, last_day)
+        read = []
+        iter_record_chunks = analytics.iter_record_chunks
+
+        def counting_chunks(*args, **kwargs):
+            for chunk in iter_record_chunks(*args, **kwargs):
+                read.extend(chunk[0])
+                yield chunk
+
+        with mock.patch.object(analytics, "iter_record_chunks", counting_chunks):
+            rollups = self.build()
+
+        # Only the records of the two changed days are read again
+        self.assertEqual(len(read), 4)
+        self.assertEqual(rollups[DAY_ONE.date()].units, 3)
+        self.assertEqual(rollups[last_day.date()].units, 4)
+        self.assertEqual(rollups[DAY_TWO.date()].units, 1)
+
+    def test_rebuild_keeps_archived_days(self):
+        self.create_record(self.user, 2, DAY_ONE)
+        self.create_record(self.user, 3, DAY_TWO)
+        self.build()
+
+        call_command(
+            "archive_history",
+            "--days",
+            0,
+            "--table",
+            "purchase_records",
+            stdout=StringIO(),
+        )
+        self.assertFalse(UserPurchaseRecord.objects.exists())
+        self.create_record(self.other_user, 1, DAY_TWO + datetime.timedelta(days=1))
+
+        call_command("build_sales_rollups", "--rebuild", stdout=StringIO())
+        rollups = {
+            rollup.day: rollup.units
+            for rollup in SalesRollup.objects.filter(item=self.item)
+        }
+        self.assertEqual(
+            rollups,
+            {
+                DAY_ONE.date(): 2,
+                DAY_TWO.date(): 3,
+                (DAY_TWO + datetime.timedelta(days=1)).date(): 1,
+            },
+        )
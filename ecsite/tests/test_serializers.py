@@ -0,0 +1,39 @@
+from io import StringIO
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+from ecsite import inventory
+from ecsite.models import Cart, CartItem, Item, User
+from ecsite.serializers import CartSerializer, ItemSerializer, cart_rows, item_rows
+from .base import AuthenticatedTestCase
+
+
+def render(data) -> bytes:
+    return JSONRenderer().render(data)
+
+
+class TestFastPathSerializers(AuthenticatedTestCase):
+    def test_item_rows_match_item_serializer(self):
+        item = list(self.expensive_items.values())[0]
+        inventory.rebalance(item.id, 3)
+
+        items = Item.objects.order_by("id")
+        expected = ItemSerializer(inventory.attach_stock(items), many=True).data
+        self.assertEqual(render(item_rows(items)), render(expected))
+
+    def test_cart_rows_match_cart_serializer(self):
+        items = list(self.cheaper_items.values())
+        other_user = User.objects.create_user(username="otheruser", password="pw")
+        other_cart = Cart.objects.create(user=other_user)
+        for item in reversed(items):
+            CartItem.objects.create(cart=self.cart, item=item, quantity=1)
+        CartItem.objects.create(cart=other_cart, item=items[0], quantity=2)
+
+        carts = Cart.objects.order_by("id")
+        expected = CartSerializer(carts, many=True).data
+        self.assertEqual(render(cart_rows(carts)), render(expected))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_serializers", "--sizes", 20, "--repeat", 1, stdout=out)
+        self.assertIn("speedup", out.getvalue())
+        self.assertEqual(Item.objects.count(), 10)
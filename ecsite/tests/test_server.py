@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import tempfile
+import urllib.request
+from django.conf import settings
+from django.test import SimpleTestCase
+from ecsite import catalog
+from ecsite.middlewares import get_user
+from ecsite.models import Item
+from ecsite.server import warm_up
+from .base import AuthenticatedTestCase
+
+
+class TestWarmUp(AuthenticatedTestCase):
+    def test_warms_catalog_and_user_caches(self):
+        stats = warm_up()
+        self.assertEqual(stats["items"], Item.objects.count())
+
+        item_ids = list(Item.objects.values_list("id", flat=True))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user("testuser"), self.user)
+            self.assertEqual(len(catalog.get_items(item_ids)), len(item_ids))
+
+
+class TestPreforkServer(SimpleTestCase):
+    def test_serves_and_recycles_workers(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        stale_sample = os.path.join(metrics_dir.name, "metrics_1.db")
+        open(stale_sample, "wb").close()
+
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "manage.py",
+                "serve",
+                "--port",
+                "0",
+                "--workers",
+                "2",
+                "--max-requests",
+                "1",
+                "--no-warmup",
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "ECSITE_METRICS_DIR": metrics_dir.name},
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+
+        line = server.stdout.readline()
+        self.assertIn("with 2 workers", line)
+        url = line.split()[2] + "metrics"
+
+        # Every worker exits after one request, so most of these hit new workers
+        for _ in range(5):
+            with urllib.request.urlopen(url, timeout=10) as response:
+                self.assertEqual(response.status, 200)
+        self.assertFalse(os.path.exists(stale_sample))
+        self.assertIsNone(server.poll())
@@ -0,0 +1,298 @@
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from uuid import uuid4
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from ecsite import carts, checkout, sharding
+from ecsite.constants import (
+    CHECKOUT_MODE_ASYNC,
+    ERROR_MESSAGES,
+    IDEMPOTENCY_KEY,
+    ITEM_ID,
+    QUANTITY,
+    STATUS_SUCCESS,
+    USER_ID,
+)
+from ecsite.models import (
+    Cart,
+    CartItem,
+    IdempotencyKey,
+    Item,
+    User,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
+from ecsite.sweeper import sweep_carts
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+SHARDS = ["shard_0", "shard_1", "shard_2"]
+USER_MODELS = [Cart, IdempotencyKey, UserPurchaseRecord, UserItemPurchaseSummary]
+
+
+class TestShardRouting(SimpleTestCase):
+    def test_adding_a_shard_only_moves_users_to_it(self):
+        keys = range(10000)
+        before = [sharding.jump_hash(key, 3) for key in keys]
+        after = [sharding.jump_hash(key, 4) for key in keys]
+
+        moved = [new for old, new in zip(before, after) if old != new]
+        self.assertEqual(set(moved), {3})
+        for count in Counter(after).values():
+            self.assertAlmostEqual(count / len(keys), 0.25, delta=0.02)
+
+    @override_settings(SHARDS=SHARDS)
+    def test_routes_user_data_to_shards(self):
+        router = sharding.UserShardRouter()
+        user = User(id=7)
+        shard = sharding.db_for_user(user.id)
+        self.assertIn(shard, SHARDS)
+        self.assertEqual(sharding.db_for_cart(7), shard)
+
+        self.assertEqual(router.db_for_write(Cart, instance=user), shard)
+        self.assertEqual(router.db_for_write(UserPurchaseRecord, instance=user), shard)
+        self.assertEqual(router.db_for_read(Item, instance=Cart(user_id=7)), "default")
+        self.assertEqual(router.db_for_read(User), "default")
+
+        self.assertTrue(router.allow_migrate(shard, "ecsite", "cartitem"))
+        self.assertFalse(router.allow_migrate(shard, "ecsite", "item"))
+        self.assertFalse(router.allow_migrate(shard, "auth", "user"))
+        self.assertFalse(router.allow_migrate("default", "ecsite", "cart"))
+        self.assertTrue(router.allow_migrate("default", "ecsite", "item"))
+
+    @override_settings(SHARDS=[])
+    def test_everything_stays_in_default_without_shards(self):
+        router = sharding.UserShardRouter()
+        self.assertEqual(sharding.db_for_user(7), "default")
+        self.assertEqual(sharding.user_databases(), ["default"])
+        self.assertIsNone(sharding.cart_id_for_user(7))
+        self.assertIsNone(router.db_for_write(Cart, instance=User(id=7)))
+        self.assertIsNone(router.allow_migrate("default", "ecsite", "cart"))
+
+
+# Shard databases are configured when the settings are loaded
+@skipUnless(
+    len(settings.SHARDS) >= 3,
+    "Run with ECSITE_SHARDS=3 python manage.py test ecsite.tests.test_sharding",
+)
+class TestShardedCheckout(AuthenticatedTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.item = list(self.cheaper_items.values())[0]
+        # Enough stock for every user of a test, whatever the random quantity
+        self.item.quantity = 100
+        self.item.save()
+
+    def create_user(self, shard: str = None) -> User:
+        # Users are spread over the shards by id
+        while True:
+            user = User.objects.create(username=str(uuid4()))
+            if shard is None or sharding.db_for_user(user.id) == shard:
+                return user
+
+    def add_item(self, user: User, item: Item, quantity: int = 1):
+        response = self.client.post(
+            URL_MAP["add_item"](user.id),
+            data={USER_ID: user.id, ITEM_ID: item.id, QUANTITY: quantity},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def purchase(self, user: User):
+        return self.client.post(
+            URL_MAP["purchase"](user.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: user.id},
+        )
+
+    def databases_with(self, model, user_id: int) -> list:
+        return [
+            db
+            for db in settings.SHARDS
+            if model.objects.using(db).filter(user_id=user_id).exists()
+        ]
+
+    def test_user_data_is_stored_in_the_users_shard(self):
+        quantity = self.item.quantity
+        for shard in settings.SHARDS:
+            user = self.create_user(shard)
+            cart = carts.create(user)
+            self.assertEqual(cart.id, user.id)
+            self.add_item(user, self.item, 2)
+
+            response = self.client.get(URL_MAP["get"](cart.id))
+            self.assertEqual(response.data["cart"]["items"], [self.item.id])
+            self.assertEqual(self.purchase(user).status_code, status.HTTP_200_OK)
+
+            for model in USER_MODELS[1:]:
+                self.assertEqual(self.databases_with(model, user.id), [shard])
+            response = self.client.get("/api/v1/orders/", {USER_ID: user.id})
+            self.assertEqual(
+                [(row["item"], row["quantity"]) for row in response.data["orders"]],
+                [(self.item.id, 2)],
+            )
+
+        self.item.refresh_from_db()
+        self.assertEqual(
+            self.item.quantity,
+            quantity - 2 * len(settings.SHARDS),
+        )
+
+    def test_stock_is_not_oversold_across_shards(self):
+        Item.objects.filter(id=self.item.id).update(quantity=1)
+        users = [self.create_user(shard) for shard in settings.SHARDS[:2]]
+        for user in users:
+            carts.create(user)
+            self.add_item(user, self.item)
+
+        responses = [self.purchase(user) for user in users]
+        self.assertEqual(responses[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[1].status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(responses[1].data["error"], ERROR_MESSAGES["not_enough_stock"])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 0)
+
+    def test_users_on_other_shards_can_reuse_a_key(self):
+        key = str(uuid4())
+        items = list(self.cheaper_items.values())[:2]
+        users = [self.create_user(shard) for shard in settings.SHARDS[:2]]
+        responses = []
+        for user, item in zip(users, items):
+            carts.create(user)
+            self.add_item(user, item)
+            responses.append(
+                self.client.post(
+                    URL_MAP["purchase"](user.id),
+                    data={IDEMPOTENCY_KEY: key, USER_ID: user.id},
+                )
+            )
+
+        for response, item in zip(responses, items):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.data["response"], [{"item": item.id, "quantity": 1}]
+            )
+
+    @override_settings(CHECKOUT_MODE=CHECKOUT_MODE_ASYNC)
+    def test_queued_checkouts_of_every_shard_are_processed(self):
+        users = [self.create_user(shard) for shard in settings.SHARDS]
+        for user in users:
+            carts.create(user)
+            self.add_item(user, self.item)
+            self.assertEqual(self.purchase(user).status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(checkout.process_queue(10), len(users))
+        for user in users:
+            key = IdempotencyKey.objects.using(sharding.db_for_user(user.id)).get(
+                user=user
+            )
+            self.assertEqual(key.status, STATUS_SUCCESS)
+
+    def test_sweeps_and_deletes_cascade_to_shards(self):
+        users = [self.create_user(shard) for shard in settings.SHARDS]
+        for user in users:
+            carts.create(user)
+            self.add_item(user, self.item)
+
+        idle = users[0]
+        Cart.objects.using(sharding.db_for_user(idle.id)).filter(user=idle).update(
+            last_activity=timezone.now() - timedelta(days=40)
+        )
+        deleted = list(sweep_carts(timezone.now() - timedelta(days=30), 100))
+        self.assertEqual(sum(count for count, _ in deleted), 1)
+        self.assertEqual(self.databases_with(Cart, idle.id), [])
+
+        deleted_id = users[1].id
+        users[1].delete()
+        self.assertEqual(self.databases_with(Cart, deleted_id), [])
+        self.item.delete()
+        self.assertFalse(
+            any(CartItem.objects.using(db).exists() for db in settings.SHARDS)
+        )
+
+    def test_rebalance_moves_users_to_their_shard(self):
+        with override_settings(SHARDS=settings.SHARDS[:2]):
+            users = [self.create_user() for _ in range(12)]
+            for user in users:
+                carts.create(user)
+                self.add_item(user, self.item)
+                self.assertEqual(self.purchase(user).status_code, status.HTTP_200_OK)
+                carts.create(user)
+                self.add_item(user, self.item)
+        old_shards = {
+            user.id: self.databases_with(UserPurchaseRecord, user.id)[0]
+            for user in users
+        }
+        timestamps = {
+            user.id: UserPurchaseRecord.objects.using(old_shards[user.id])
+            .get(user=user)
+            .timestamp
+            for user in users
+        }
+        out = StringIO()
+        call_command("rebalance_shards", "--no-migrate", "--batch-size", 2, stdout=out)
+
+        moved = [
+            user
+            for user in users
+            if sharding.db_for_user(user.id) != old_shards[user.id]
+        ]
+        self.assertTrue(moved)
+        self.assertIn(f"Moved {len(moved)} users", out.getvalue())
+        for user in users:
+            shard = sharding.db_for_user(user.id)
+            for model in USER_MODELS:
+                self.assertEqual(self.databases_with(model, user.id), [shard])
+            record = UserPurchaseRecord.objects.using(shard).get(user=user)
+            self.assertEqual(record.timestamp, timestamps[user.id])
+            cart = Cart.objects.using(shard).get(user=user)
+            self.assertEqual(cart.id, user.id)
+            self.assertEqual(
+                list(cart.cartitem_set.values_list("item_id", flat=True)),
+                [self.item.id],
+            )
+
+        out = StringIO()
+        call_command("rebalance_shards", "--no-migrate", stdout=out)
+        self.assertIn("Moved 0 users", out.getvalue())
+
+    def test_rebalance_merges_rows_written_to_the_new_shard(self):
+        other_item = list(self.cheaper_items.values())[1]
+        # Only users of the added shard move
+        user = self.create_user(settings.SHARDS[2])
+        with override_settings(SHARDS=settings.SHARDS[:2]):
+            old_shard = sharding.db_for_user(user.id)
+            carts.create(user)
+            self.add_item(user, self.item)
+            self.assertEqual(self.purchase(user).status_code, status.HTTP_200_OK)
+            carts.create(user)
+            self.add_item(user, self.item)
+
+        # Written to the new shard before the rebalance
+        new_shard = sharding.db_for_user(user.id)
+        carts.create(user)
+        self.add_item(user, self.item)
+        self.assertEqual(self.purchase(user).status_code, status.HTTP_200_OK)
+        carts.create(user)
+        self.add_item(user, other_item)
+
+        call_command("rebalance_shards", "--no-migrate", stdout=StringIO())
+
+        for model in USER_MODELS:
+            self.assertEqual(self.databases_with(model, user.id), [new_shard])
+        self.assertNotEqual(old_shard, new_shard)
+        self.assertEqual(
+            UserPurchaseRecord.objects.using(new_shard).filter(user=user).count(), 2
+        )
+        summary = UserItemPurchaseSummary.objects.using(new_shard).get(user=user)
+        self.assertEqual((summary.total_quantity, summary.purchase_count), (2, 2))
+        cart = Cart.objects.using(new_shard).get(user=user)
+        self.assertEqual(
+            sorted(cart.cartitem_set.values_list("item_id", flat=True)),
+            sorted([self.item.id, other_item.id]),
+        )
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from ecsite.shm_cache import WAYS, SharedMemoryCache
+
+
+class TestSharedMemoryCache(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / "cache"
+        self.cache = self.make_cache()
+
+    def make_cache(self, slots=64, slot_size=512):
+        return SharedMemoryCache(
+            self.path, {"OPTIONS": {"SLOTS": slots, "SLOT_SIZE": slot_size}}
+        )
+
+    def test_basic_operations(self):
+        self.assertIsNone(self.cache.get("missing"))
+        self.cache.set("key", {"name": "item", "price": 10})
+        self.assertEqual(self.cache.get("key"), {"name": "item", "price": 10})
+
+        self.assertFalse(self.cache.add("key", "other"))
+        self.assertTrue(self.cache.add("new", "value"))
+
+        self.cache.set("counter", 1)
+        self.assertEqual(self.cache.incr("counter", 2), 3)
+        self.assertEqual(self.cache.get("counter"), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+        self.assertTrue(self.cache.delete("key"))
+        self.assertFalse(self.cache.has_key("key"))
+        self.assertEqual(
+            self.cache.get_many(["new", "counter", "key"]),
+            {"new": "value", "counter": 3},
+        )
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("new"))
+
+    def test_timeouts(self):
+        self.cache.set("short", 1, timeout=0.05)
+        self.cache.set("forever", 2, timeout=None)
+        self.assertEqual(self.cache.get("short"), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("short"))
+        self.assertTrue(self.cache.add("short", 3))
+        self.assertEqual(self.cache.get("forever"), 2)
+
+        self.assertTrue(self.cache.touch("forever", 0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("forever"))
+
+    def test_values_larger_than_a_slot_are_not_cached(self):
+        self.cache.set("key", "small")
+        self.cache.set("key", "x" * 1024)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertFalse(self.cache.add("key", "x" * 1024))
+
+    def test_clock_eviction_keeps_referenced_entries(self):
+        # A single set, so every key competes for the same slots
+        cache = self.make_cache(slots=WAYS)
+        for index in range(WAYS):
+            cache.set(f"key{index}", index)
+        cache.get("key0")
+
+        cache.set("new", "value")
+        self.assertEqual(cache.get("new"), "value")
+        self.assertEqual(cache.get("key0"), 0)
+        present = [cache.has_key(f"key{index}") for index in range(WAYS)]
+        self.assertEqual(present.count(False), 1)
+
+    def test_shared_between_processes(self):
+        self.cache.set("parent", "value")
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                child = self.make_cache()
+                if child.get("parent") == "value":
+                    child.set("child", "written")
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(self.cache.get("child"), "written")
+
+    def test_file_with_other_options_is_rejected(self):
+        self.cache.set("key", "value")
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_cache(slot_size=1024).get("key")
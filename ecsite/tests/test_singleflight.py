@@ -0,0 +1,106 @@
+import tempfile
+import threading
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from ecsite.singleflight import Group
+from ecsite.serializers import item_rows
+from ecsite.models import Item
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL
+
+
+class TestSingleflightGroup(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        result_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(result_dir.cleanup)
+        results = override_settings(SINGLEFLIGHT_DIR=result_dir.name)
+        results.enable()
+        self.addCleanup(results.disable)
+
+    def test_concurrent_callers_share_one_call(self):
+        group = Group("test")
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return b"result"
+
+        results = []
+        started = threading.Barrier(6)
+
+        def request():
+            started.wait()
+            results.append(group.do("key", compute))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Giving every thread time to join the flight before it lands
+        started.wait()
+        threading.Event().wait(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b"result"] * 5)
+        self.assertEqual(group._calls, {})
+
+    def test_errors_are_shared_and_not_cached(self):
+        group = Group("test")
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            group.do("key", fail)
+        self.assertEqual(group.do("key", lambda: b"ok"), b"ok")
+
+    def test_waits_for_result_of_other_process(self):
+        # Larger than a slot of the shared memory cache, like listing bodies
+        for body in (b"shared", b"x" * 75000):
+            with self.subTest(size=len(body)):
+                cache.clear()
+                # Groups of their own stand in for the leaders of two processes
+                leader, follower = Group("test"), Group("test")
+                computing = threading.Event()
+
+                def compute():
+                    computing.set()
+                    threading.Event().wait(0.05)
+                    return body
+
+                thread = threading.Thread(
+                    target=leader.do, args=["key", compute], kwargs={"shared": True}
+                )
+                thread.start()
+                computing.wait(5)
+                result = follower.do(
+                    "key", lambda: self.fail("computed twice"), shared=True
+                )
+                thread.join()
+                self.assertEqual(result, body)
+
+    @override_settings(SINGLEFLIGHT_LOCK_TIMEOUT_MS=50)
+    def test_computes_when_lock_holder_is_stuck(self):
+        group = Group("test")
+        cache.add("singleflight:test:lock:key", "other", timeout=5)
+        self.assertEqual(group.do("key", lambda: b"own", shared=True), b"own")
+
+
+class TestCoalescedItemList(AuthenticatedTestCase):
+    @override_settings(SINGLEFLIGHT_SHARED=True)
+    def test_list_renders_shared_body(self):
+        response = self.client.get(ITEMS_URL, {"name": "a"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            response.json(),
+            {"items": item_rows(Item.objects.filter(name__icontains="a"))},
+        )
+        self.assertEqual(response.data, response.json())
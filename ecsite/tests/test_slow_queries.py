@@ -0,0 +1,214 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from ecsite import slow_queries
+from ecsite.constants import ERROR_MESSAGES, NAME
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL
+
+SLOW_QUERIES_URL = "/api/v1/slow-queries/"
+
+
+class TestFingerprint(SimpleTestCase):
+    def test_normalizes_literals_and_lists(self):
+        self.assertEqual(
+            slow_queries.normalize(
+                "SELECT * FROM item  WHERE name = 'a''b' AND id IN (%s, %s)\nLIMIT 21"
+            ),
+            "SELECT * FROM item WHERE name = ? AND id IN (...) LIMIT ?",
+        )
+        self.assertEqual(
+            slow_queries.normalize("INSERT INTO t_1 (a, b) VALUES (%s, %s), (%s, %s)"),
+            "INSERT INTO t_1 (a, b) VALUES (...)",
+        )
+        self.assertEqual(
+            slow_queries.fingerprint(slow_queries.normalize("SELECT 1 IN (%s)")),
+            slow_queries.fingerprint(slow_queries.normalize("SELECT 2 IN (%s, %s)")),
+        )
+
+
+class TestExplainedStatements(SimpleTestCase):
+    def setUp(self):
+        slow_queries._explained.clear()
+        self.addCleanup(slow_queries._explained.clear)
+
+    @override_settings(SLOW_QUERY_EXPLAINED_MAX=2)
+    def test_forgets_the_least_recently_seen(self):
+        self.assertTrue(slow_queries._first_seen("a"))
+        self.assertTrue(slow_queries._first_seen("b"))
+        self.assertFalse(slow_queries._first_seen("a"))
+        self.assertTrue(slow_queries._first_seen("c"))
+
+        self.assertEqual(list(slow_queries._explained), ["a", "c"])
+        self.assertTrue(slow_queries._first_seen("b"))
+
+
+class TestThresholdSetting(SimpleTestCase):
+    def test_environment_can_disable_the_log(self):
+        for value, expected in (("off", "None"), ("", "None"), ("250", "250.0")):
+            with self.subTest(value=value):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        "from django.conf import settings; "
+                        "print(settings.SLOW_QUERY_THRESHOLD_MS)",
+                    ],
+                    cwd=settings.BASE_DIR,
+                    env={
+                        **os.environ,
+                        "DJANGO_SETTINGS_MODULE": "ecsite.settings",
+                        "ECSITE_SLOW_QUERY_MS": value,
+                    },
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                self.assertEqual(output.strip(), expected)
+
+
+class TestSlowQueryLog(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log_dir = os.path.join(log_dir.name, "slow")
+        self.log = os.path.join(self.log_dir, f"slow_queries_{os.getpid()}.log")
+        slow_queries._explained.clear()
+
+    def entries(self) -> list:
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log, encoding="utf-8") as lines:
+            return [json.loads(line) for line in lines]
+
+    def test_logs_queries_over_the_threshold(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            for name in ("item", "other"):
+                response = self.client.get(ITEMS_URL, {NAME: name})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            summaries = slow_queries.summarize()
+
+        listing = [
+            summary
+            for summary in summaries
+            if summary["statement"].startswith('SELECT "ecsite_item"."id"')
+            and "LIKE" in summary["statement"]
+        ]
+        self.assertEqual(len(listing), 1)
+        listing = listing[0]
+        self.assertEqual(listing["count"], 2)
+        self.assertEqual(listing["views"], ["item-list.list"])
+        self.assertIn("%other%", listing["params"])
+        self.assertGreaterEqual(listing["total_ms"], listing["max_ms"])
+        self.assertTrue(any("ecsite_item" in line for line in listing["plan"]))
+
+        # The plan is captured once per statement
+        entries = [
+            entry
+            for entry in self.entries()
+            if entry["fingerprint"] == listing["fingerprint"]
+        ]
+        self.assertEqual(len(entries), 2)
+        self.assertIsNone(entries[1]["plan"])
+
+    def test_redacts_auth_and_session_parameters(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            self.client.get(ITEMS_URL)
+
+        sensitive = [
+            entry
+            for entry in self.entries()
+            if '"auth_user"' in entry["sql"] or '"django_session"' in entry["sql"]
+        ]
+        self.assertTrue(sensitive)
+        for entry in sensitive:
+            self.assertEqual(
+                entry["params"], [slow_queries.REDACTED] * len(entry["params"])
+            )
+        self.assertNotIn(self.user.username, json.dumps(sensitive))
+
+    def test_log_is_private(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            self.client.get(ITEMS_URL)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.log_dir).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(self.log).st_mode), 0o600)
+
+    def test_merges_the_logs_of_all_processes(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            self.client.get(ITEMS_URL)
+            with mock.patch("os.getpid", return_value=os.getpid() + 1):
+                self.client.get(ITEMS_URL)
+            summaries = slow_queries.summarize()
+
+        self.assertEqual(
+            len(os.listdir(self.log_dir)), 2, "expected one log per process"
+        )
+        listing = [
+            summary
+            for summary in summaries
+            if summary["statement"].startswith('SELECT "ecsite_item"."id"')
+        ]
+        self.assertEqual([summary["count"] for summary in listing], [2])
+
+    def test_skips_fast_queries(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=60000, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            self.client.get(ITEMS_URL)
+        self.assertEqual(self.entries(), [])
+
+    def test_rotates_the_log(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0,
+            SLOW_QUERY_LOG_DIR=self.log_dir,
+            SLOW_QUERY_LOG_MAX_BYTES=2048,
+            SLOW_QUERY_LOG_BACKUPS=2,
+        ):
+            for _ in range(10):
+                self.client.get(ITEMS_URL)
+            summaries = slow_queries.summarize()
+
+        self.assertTrue(os.path.exists(f"{self.log}.2"))
+        self.assertFalse(os.path.exists(f"{self.log}.3"))
+        self.assertTrue(summaries)
+
+    def test_endpoint_requires_staff(self):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_DIR=self.log_dir
+        ):
+            response = self.client.get(SLOW_QUERIES_URL)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(response.json()["error"], ERROR_MESSAGES["staff_only"])
+
+            self.user.is_staff = True
+            self.user.save()
+            # The mock login serves users from the cache
+            cache.clear()
+            self.client.get(ITEMS_URL)
+            response = self.client.get(SLOW_QUERIES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        queries = response.json()["queries"]
+        self.assertIn(
+            "item-list.list", {view for row in queries for view in row["views"]}
+        )
+        totals = [row["total_ms"] for row in queries]
+        self.assertEqual(totals, sorted(totals, reverse=True))
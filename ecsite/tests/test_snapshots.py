@@ -0,0 +1,110 @@
+import gzip
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from ecsite import catalog, snapshots
+from ecsite.models import Item
+from ecsite.serializers import item_rows
+from .base import AuthenticatedTestCase
+from .constants import ITEMS_URL
+
+SNAPSHOT_FILTERS = [{"name": "a", "max_price": 60}]
+
+
+class TestCatalogSnapshots(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.snapshot_dir.cleanup)
+        settings_override = override_settings(
+            SNAPSHOTS_ENABLED=True,
+            SNAPSHOT_DIR=Path(self.snapshot_dir.name),
+            SNAPSHOT_FILTERS=SNAPSHOT_FILTERS,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Rebuilding in the background would not see the test transaction
+        patcher = mock.patch.object(snapshots, "schedule_rebuild")
+        self.schedule_rebuild = patcher.start()
+        self.addCleanup(patcher.stop)
+        snapshots._state.version = None
+
+    def build(self):
+        out = StringIO()
+        call_command("build_snapshots", stdout=out)
+        self.assertIn("Built 2 snapshots", out.getvalue())
+
+    def test_serves_snapshot_without_queries(self):
+        self.build()
+        expected = {"items": item_rows(Item.objects.all())}
+
+        response = self.client.get(ITEMS_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), expected)
+        self.assertNotIsInstance(response, Response)
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(snapshots.get_snapshot({"name": None}))
+
+    def test_serves_gzip_variant_of_configured_filters(self):
+        self.build()
+        expected = {"items": item_rows(catalog.filter_items(name="a", max_price=60))}
+
+        response = self.client.get(
+            ITEMS_URL,
+            {"max_price": 60, "name": "a"},
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            gzip.decompress(response.content), JSONRenderer().render(expected)
+        )
+
+    def test_unknown_filters_fall_back_to_database(self):
+        self.build()
+        self.assertIsNone(snapshots.get_snapshot({"name": "b"}))
+
+        response = self.client.get(ITEMS_URL, {"name": "b"})
+        self.assertIsInstance(response, Response)
+        self.assertEqual(
+            response.data, {"items": item_rows(catalog.filter_items(name="b"))}
+        )
+
+    def test_stale_snapshot_triggers_rebuild(self):
+        self.build()
+        item = Item.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity += 1
+            item.save()
+        self.schedule_rebuild.assert_called()
+
+        response = self.client.get(ITEMS_URL)
+        self.assertIsInstance(response, Response)
+        self.assertIn(
+            {
+                "id": item.id,
+                "name": item.name,
+                "price": item.price,
+                "quantity": item.quantity,
+            },
+            response.data["items"],
+        )
+
+        self.build()
+        self.assertEqual(
+            [
+                path.name
+                for path in Path(self.snapshot_dir.name).iterdir()
+                if path.is_dir()
+            ],
+            [str(catalog.get_catalog_version())],
+        )
+        self.assertIsNotNone(snapshots.get_snapshot({}))
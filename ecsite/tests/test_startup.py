@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from .constants import ITEMS_URL
+
+
+class TestStartupBenchmark(SimpleTestCase):
+    def setUp(self):
+        # The probes are fresh processes, so they need a database of their own
+        db_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(db_dir.cleanup)
+        env = {**os.environ, "ECSITE_DB_PATH": os.path.join(db_dir.name, "db.sqlite3")}
+        for command in (
+            ["migrate", "--verbosity", "0"],
+            [
+                "shell",
+                "-c",
+                "from django.contrib.auth.models import User; "
+                "User.objects.create_user('testuser')",
+            ],
+        ):
+            subprocess.run(
+                [sys.executable, "manage.py", *command],
+                cwd=settings.BASE_DIR,
+                env=env,
+                check=True,
+                capture_output=True,
+            )
+        patched_env = mock.patch.dict(os.environ, env)
+        patched_env.start()
+        self.addCleanup(patched_env.stop)
+
+    def test_reports_both_settings_profiles(self):
+        out = StringIO()
+        call_command("benchmark_startup", "--runs", 1, "--path", ITEMS_URL, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn("first_request ms", lines[0])
+        for profile, line in zip(["ecsite.settings", "ecsite.settings_api"], lines[1:]):
+            self.assertTrue(line.startswith(profile))
+            self.assertTrue(line.endswith("200 OK"))
+
+    def test_failing_first_request_is_an_error(self):
+        with self.assertRaisesMessage(CommandError, "404 Not Found"):
+            call_command(
+                "benchmark_startup",
+                "--runs",
+                1,
+                "--path",
+                "/missing",
+                stdout=StringIO(),
+            )
@@ -0,0 +1,104 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from ecsite import stock_events
+from ecsite.constants import ERROR_MESSAGES, IDEMPOTENCY_KEY, USER_ID
+from ecsite.models import CartItem, Item, StockEvent
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+STOCK_EVENTS_URL = "/api/v1/stock/events/"
+
+
+async def read_stream(response) -> bytes:
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+def parse_events(body: bytes) -> list:
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in block.splitlines()
+            if line and not line.startswith(":")
+        )
+        if "event" in fields:
+            events.append(fields)
+    return events
+
+
+@override_settings(STOCK_FEED_WINDOW_MS=10, STOCK_FEED_MAX_SECONDS=0.05)
+class TestStockEvents(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = list(self.cheaper_items.values())
+
+    def stream(self, last_event_id=None) -> list:
+        headers = {} if last_event_id is None else {"Last-Event-ID": last_event_id}
+        response = self.client.get(STOCK_EVENTS_URL, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return parse_events(async_to_sync(read_stream)(response))
+
+    def test_purchases_record_stock(self):
+        item = self.items[0]
+        CartItem.objects.create(cart=self.cart, item=item, quantity=2)
+        response = self.client.post(
+            URL_MAP["purchase"](self.cart.id),
+            data={IDEMPOTENCY_KEY: str(uuid4()), USER_ID: self.user.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(StockEvent.objects.values_list("item_id", "quantity")),
+            [(item.id, item.quantity - 2)],
+        )
+
+    def test_init_data_records_all_items(self):
+        call_command("init_data", stdout=StringIO())
+        self.assertEqual(StockEvent.objects.count(), Item.objects.count())
+
+    def test_resumes_after_last_event_id_with_coalesced_events(self):
+        first, second = self.items[:2]
+        for item, quantity in ((first, 5), (second, 7), (first, 3)):
+            StockEvent.objects.create(item_id=item.id, quantity=quantity)
+        ids = list(StockEvent.objects.order_by("id").values_list("id", flat=True))
+
+        events = self.stream(last_event_id=str(ids[0] - 1))
+        self.assertEqual(
+            [(int(event["id"]), json.loads(event["data"])) for event in events],
+            [
+                (ids[1], {"item_id": second.id, "quantity": 7}),
+                (ids[2], {"item_id": first.id, "quantity": 3}),
+            ],
+        )
+        self.assertEqual(self.stream(last_event_id=str(ids[2])), [])
+
+        # New clients only get events recorded after they connected
+        self.assertEqual(self.stream(), [])
+
+    def test_sends_reset_when_events_were_pruned(self):
+        for quantity in (1, 2, 3):
+            StockEvent.objects.create(item_id=self.items[0].id, quantity=quantity)
+        StockEvent.objects.update(created_at=timezone.now() - timedelta(days=2))
+        StockEvent.objects.create(item_id=self.items[0].id, quantity=4)
+        first_id = StockEvent.objects.order_by("id").first().id
+
+        self.assertEqual(stock_events.prune(timedelta(hours=24)), 3)
+        events = self.stream(last_event_id=str(first_id))
+        self.assertEqual([event["event"] for event in events], ["reset"])
+
+    def test_invalid_last_event_id(self):
+        for last_event_id in ("x", "-1", "1.5"):
+            response = self.client.get(
+                STOCK_EVENTS_URL, headers={"Last-Event-ID": last_event_id}
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                response.json()["error"], ERROR_MESSAGES["invalid_last_event_id"]
+            )
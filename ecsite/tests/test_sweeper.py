@@ -0,0 +1,62 @@
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from ecsite.constants import ITEM_ID, QUANTITY, USER_ID
+from ecsite.models import Cart, CartItem, CheckoutJob, IdempotencyKey, User
+from .base import AuthenticatedTestCase
+from .constants import URL_MAP
+
+
+class TestAbandonedCartSweeper(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = list(self.cheaper_items.values())[0]
+        self.idle_since = timezone.now() - timedelta(days=40)
+
+    def create_cart(self, username: str, idle: bool) -> Cart:
+        cart = Cart.objects.create(user=User.objects.create(username=username))
+        CartItem.objects.create(cart=cart, item=self.item, quantity=1)
+        if idle:
+            Cart.objects.filter(id=cart.id).update(last_activity=self.idle_since)
+        return cart
+
+    def sweep(self, *args) -> str:
+        out = StringIO()
+        call_command("sweep_carts", "--days", 30, *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_idle_carts_in_batches(self):
+        idle = [self.create_cart(f"idle{i}", idle=True) for i in range(5)]
+        active = self.create_cart("active", idle=False)
+
+        output = self.sweep("--batch-size", 2)
+
+        self.assertIn("Deleted 5 carts and 5 cart items", output)
+        self.assertIn("rows/s", output)
+        self.assertFalse(Cart.objects.filter(id__in=[c.id for c in idle]).exists())
+        self.assertTrue(Cart.objects.filter(id=active.id).exists())
+        self.assertTrue(Cart.objects.filter(id=self.cart.id).exists())
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_keeps_carts_with_queued_checkout(self):
+        cart = self.create_cart("queued", idle=True)
+        key = IdempotencyKey.objects.create(user=cart.user, key=str(uuid4()))
+        CheckoutJob.objects.create(idempotency_key=key, cart_id=cart.id)
+
+        self.assertIn("Deleted 0 carts", self.sweep())
+        self.assertTrue(Cart.objects.filter(id=cart.id).exists())
+
+    def test_cart_activity_is_recorded(self):
+        Cart.objects.filter(id=self.cart.id).update(last_activity=self.idle_since)
+        response = self.client.post(
+            URL_MAP["add_item"](self.cart.id),
+            data={USER_ID: self.user.id, ITEM_ID: self.item.id, QUANTITY: 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.cart.refresh_from_db()
+        self.assertGreater(self.cart.last_activity, self.idle_since)
+        self.assertIn("Deleted 0 carts", self.sweep())
@@ -15,18 +15,48 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from .views import ItemViewSet, CartViewSet, initialize_data
+from rest_framework.routers import DefaultRouter, SimpleRouter
+from .views import (
+    ItemViewSet,
+    CartViewSet,
+    OrderViewSet,
+    initialize_data,
+    export_metrics,
+)
 
-router = DefaultRouter()
+
+# Imported on the first request, few processes serve these
+def slow_queries(request):
+    from .slow_queries import slow_queries
+
+    return slow_queries(request)
+
+
+async def stock_events(request):
+    from .stock_events import stock_events
+
+    return await stock_events(request)
+
+
+# The simple router skips the browsable API root and format suffix patterns
+router = SimpleRouter() if settings.API_ROUTER == "simple" else DefaultRouter()
 router.register(r"items", ItemViewSet, basename="item")
 router.register(r"cart", CartViewSet, basename="cart")
+router.register(r"orders", OrderViewSet, basename="order")
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("api/v1/", include(router.urls)),
+    path("api/v1/stock/events/", stock_events, name="stock_events"),
+    path("api/v1/slow-queries/", slow_queries, name="slow_queries"),
+    path("metrics", export_metrics, name="metrics"),
     # DO NOT EDIT
     path("initialize/", initialize_data, name="initialize_data"),
 ]
+
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
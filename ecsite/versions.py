@@ -0,0 +1,130 @@
+"""
+Change versions of items for delta sync.
+
+Every write to the name, price or stock of an item stamps it with a new value
+of the ``item_version`` counter, and deleted items leave a tombstone with the
+version of their deletion. ``changes_since(version)`` returns what changed
+after a version a client already has, so syncing costs in proportion to the
+changes and not to the size of the catalog.
+
+Saved items are stamped by a receiver. Queryset updates and bulk creates have
+to call ``touch()`` or set ``Item.version`` themselves. The counter and the
+stamped rows are written in one transaction, which keeps versions in commit
+order on SQLite where writers are serialized.
+
+Replacing the whole catalog (``init_data``) runs in ``resetting()``: items
+deleted there leave no tombstones and older tombstones are pruned, as clients
+syncing from before the reset get every item with ``reset`` instead.
+"""
+
+import threading
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Counter, Item, ItemTombstone
+
+ITEM_VERSION_COUNTER = "item_version"
+# Version of the last catalog reset, clients from before it resync everything
+ITEM_RESET_COUNTER = "item_reset_version"
+# Fields whose changes are synced
+VERSIONED_FIELDS = {"name", "price", "quantity", "is_sharded"}
+
+_state = threading.local()
+
+
+def next_version() -> int:
+    counter = Counter.objects.filter(name=ITEM_VERSION_COUNTER)
+    if not counter.update(value=F("value") + 1):
+        Counter.objects.get_or_create(name=ITEM_VERSION_COUNTER)
+        counter.update(value=F("value") + 1)
+    return counter.values_list("value", flat=True).get()
+
+
+def current_version() -> int:
+    return (
+        Counter.objects.filter(name=ITEM_VERSION_COUNTER)
+        .values_list("value", flat=True)
+        .first()
+        or 0
+    )
+
+
+def touch(item_ids) -> int:
+    """Stamps the given items with a new version, for writes bypassing save()."""
+    # Joining the transaction of the caller, a savepoint is of no use here
+    with transaction.atomic(savepoint=False):
+        version = next_version()
+        Item.objects.filter(id__in=item_ids).update(version=version)
+    return version
+
+
+@contextmanager
+def resetting():
+    """
+    Replaces the whole catalog: deletions within leave no tombstones, and the
+    reset version stamped on exit sends every older client a full resync.
+    """
+    with transaction.atomic():
+        _state.resetting = True
+        try:
+            yield
+        finally:
+            _state.resetting = False
+        version = next_version()
+        Counter.objects.update_or_create(
+            name=ITEM_RESET_COUNTER, defaults={"value": version}
+        )
+        ItemTombstone.objects.filter(version__lte=version).delete()
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not VERSIONED_FIELDS & set(update_fields):
+        return
+    with transaction.atomic(savepoint=False):
+        instance.version = touch([instance.id])
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    if getattr(_state, "resetting", False):
+        return
+    with transaction.atomic(savepoint=False):
+        ItemTombstone.objects.create(item_id=instance.id, version=next_version())
+
+
+def changes_since(version: int) -> dict:
+    """
+    Rows of the items changed after ``version``, ids of the items deleted
+    after it and the current version. Clients ahead of the current version
+    (e.g. after the database was recreated) or behind the last catalog reset
+    get all items and ``reset``.
+    """
+    # Imported on demand to keep DRF out of the app registry setup
+    from .serializers import item_rows
+
+    # Reading everything from one snapshot of the database
+    with transaction.atomic():
+        counters = dict(
+            Counter.objects.filter(
+                name__in=[ITEM_VERSION_COUNTER, ITEM_RESET_COUNTER]
+            ).values_list("name", "value")
+        )
+        current = counters.get(ITEM_VERSION_COUNTER, 0)
+        reset = version > current or 0 < version < counters.get(ITEM_RESET_COUNTER, 0)
+        if reset:
+            version = 0
+        items = Item.objects.order_by("version", "id")
+        deleted = []
+        # Clients starting from scratch get every item and nothing to delete
+        if version > 0:
+            items = items.filter(version__gt=version)
+            deleted = list(
+                ItemTombstone.objects.filter(version__gt=version)
+                .order_by("version", "id")
+                .values_list("item_id", flat=True)
+            )
+        rows = item_rows(items)
+    return {"items": rows, "deleted": deleted, "version": current, "reset": reset}
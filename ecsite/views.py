@@ -1,3 +1,6 @@
+import base64
+import functools
+import json
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, status
 from rest_framework.exceptions import NotFound
@@ -7,17 +10,31 @@ from rest_framework.authentication import (
 )
 from rest_framework.decorators import action, api_view
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from django.core.management import call_command
-from django.db import transaction
-from .models import Item, Cart, CartItem, User, UserPurchaseRecord, IdempotencyKey
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.dateparse import parse_datetime
+from . import carts, metrics
+from .models import (
+    ArchivedIdempotencyKey,
+    Cart,
+    CartItem,
+    User,
+    IdempotencyKey,
+    UserItemPurchaseSummary,
+    UserPurchaseRecord,
+)
 from .serializers import (
-    ItemSerializer,
-    CartSerializer,
     IdempotencyKeySerializer,
-    CartItemSerializer,
     AddCartItemSerializer,
     PurchaseCartSerializer,
+    UserItemPurchaseSummarySerializer,
+    UserPurchaseRecordSerializer,
+    cart_rows,
+    item_rows,
 )
 from .constants import (
     USER_ID,
@@ -29,9 +46,21 @@ from .constants import (
     MIN_PRICE,
     MAX_PRICE,
     STATUS_SUCCESS,
-    STATUS_FAILED,
     STATUS_PENDING,
     CART_ID,
+    CHECKOUT_MODE_ASYNC,
+    CHECKOUT_MODE_GROUP,
+    CURSOR,
+    LIMIT,
+    IDS,
+    BUCKETS,
+    MODE,
+    PREFIX,
+    ORDERING,
+    ITEM_ORDERINGS,
+    SINCE,
+    FACET_MODE_FIXED,
+    FACET_MODE_QUANTILE,
     ERROR_MESSAGES,
 )
 
@@ -48,10 +77,102 @@ def validate_integer(val) -> int:
     return val
 
 
+def parse_ids(raw: str):
+    # Returns the unique ids of a comma separated list in order, or None
+    ids = []
+    for val in raw.split(","):
+        item_id = validate_integer(val)
+        if item_id is None:
+            return None
+        if item_id not in ids:
+            ids.append(item_id)
+    return ids
+
+
+def encode_cursor(record) -> str:
+    value = f"{record.timestamp.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Returns (timestamp, id) of the last row of the previous page, or None
+    try:
+        timestamp, record_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        timestamp = parse_datetime(timestamp)
+        record_id = int(record_id)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+    if timestamp is None:
+        return None
+    return timestamp, record_id
+
+
+def encode_item_cursor(ordering: str, value, item_id: int) -> str:
+    value = json.dumps([ordering, value, item_id])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_item_cursor(cursor: str, ordering: str):
+    # Returns (value, id) of the last row of the previous page, or None
+    try:
+        cursor_ordering, value, item_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode()).decode()
+        )
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+    value_type = str if ordering.lstrip("-") == "name" else int
+    if (
+        cursor_ordering != ordering
+        or type(value) is not value_type
+        or type(item_id) is not int
+    ):
+        return None
+    return value, item_id
+
+
+def idempotency_cache_key(user_id: int, key: str) -> str:
+    # Keys are only unique per shard, so users on other shards may reuse them
+    return f"idempotency:{user_id}:{key}"
+
+
 def format_error(message, status=status.HTTP_400_BAD_REQUEST) -> Response:
     return Response({"error": message}, status=status)
 
 
+class PrerenderedResponse(Response):
+    """
+    JSON response rendered ahead of time, e.g. shared by coalesced requests.
+    ``data`` is only decoded from the body when something reads it.
+    """
+
+    def __init__(self, content: bytes, status=None):
+        self.prerendered_content = content
+        super().__init__(None, status=status)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.prerendered_content)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def rendered_content(self):
+        renderer = getattr(self, "accepted_renderer", None)
+        # Other renderers (e.g. the browsable API) render from data as usual
+        if type(renderer) is not JSONRenderer or "indent" in self.accepted_media_type:
+            return super().rendered_content
+        self["Content-Type"] = renderer.media_type
+        return self.prerendered_content
+
+
 # Disable CSRF check for this assigment
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     def enforce_csrf(self, request):
@@ -63,6 +184,10 @@ def initialize_data(request):
     try:
         file_name = request.data.get("file", "MOCK_DATA.json")
         print(f"Initializing data from {file_name}")
+        # Management commands are only loaded when needed, as is anything that
+        # is not used by most requests, to keep worker start up fast
+        from django.core.management import call_command
+
         call_command("init_data", file=file_name)
 
         return Response(
@@ -73,6 +198,10 @@ def initialize_data(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def export_metrics(request):
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 def parse_serializer_error(serializer):
     errors = serializer.errors
     is_not_found = False
@@ -88,33 +217,193 @@ def parse_serializer_error(serializer):
     )
 
 
+def parse_item_filters(query_params):
+    """
+    Validates the name, min price and max price filters of the item listing.
+    Returns ``(filters, None)``, or ``(None, error response)`` for invalid filters.
+    """
+    # Getting name, min price and max price from query params
+    name = query_params.get(NAME)
+    min_price_raw = query_params.get(MIN_PRICE)
+    min_price = validate_integer(min_price_raw)
+    if min_price is None and min_price_raw:
+        return None, format_error(ERROR_MESSAGES["invalid_min_price"])
+
+    max_price_raw = query_params.get(MAX_PRICE)
+    max_price = validate_integer(max_price_raw)
+    if max_price is None and max_price_raw:
+        return None, format_error(ERROR_MESSAGES["invalid_max_price"])
+
+    return {"name": name, "min_price": min_price, "max_price": max_price}, None
+
+
+def parse_item_page(query_params):
+    """
+    Validates the ordering, limit and cursor of the item listing. Returns
+    ``((ordering, limit, after), None)``, ``(None, None)`` when none of them is
+    given, or ``(None, error response)``.
+    """
+    ordering = query_params.get(ORDERING)
+    limit_raw = query_params.get(LIMIT)
+    cursor_raw = query_params.get(CURSOR)
+    if not (ordering or limit_raw or cursor_raw):
+        return None, None
+
+    if ordering and ordering not in ITEM_ORDERINGS:
+        return None, format_error(ERROR_MESSAGES["invalid_ordering"])
+    # Pages without an ordering are ordered by id
+    ordering = ordering or "id"
+
+    limit = None
+    if limit_raw:
+        limit = validate_integer(limit_raw)
+        if limit is None or limit < 1:
+            return None, format_error(ERROR_MESSAGES["invalid_limit"])
+        limit = min(limit, settings.ITEMS_MAX_LIMIT)
+
+    after = None
+    if cursor_raw:
+        after = decode_item_cursor(cursor_raw, ordering)
+        if after is None:
+            return None, format_error(ERROR_MESSAGES["invalid_cursor"])
+    return (ordering, limit, after), None
+
+
+def item_page(items, ordering: str, limit) -> dict:
+    """Rows of an ordered item queryset, up to ``limit`` and the next page's cursor."""
+    if limit is None:
+        return {"items": item_rows(items), "next_cursor": None}
+
+    # Fetching one extra row to know whether there is a next page
+    rows = item_rows(items[: limit + 1])
+    if len(rows) <= limit:
+        return {"items": rows, "next_cursor": None}
+
+    rows = rows[:limit]
+    # Rendered quantities are the stock that quantity orderings sort by
+    value = rows[-1][ordering.lstrip("-")]
+    return {
+        "items": rows,
+        "next_cursor": encode_item_cursor(ordering, value, rows[-1]["id"]),
+    }
+
+
+@functools.cache
+def item_list_flights():
+    """Group sharing the query and rendered body of identical item listings."""
+    from . import singleflight
+
+    return singleflight.Group("items")
+
+
 class ItemViewSet(viewsets.ViewSet):
     def list(self, request):
-        # Getting name, min price and max price from query params
-        name = request.query_params.get(NAME)
-        min_price_raw = request.query_params.get(MIN_PRICE)
-        min_price = validate_integer(min_price_raw)
-        if min_price is None and min_price_raw:
-            return format_error(ERROR_MESSAGES["invalid_min_price"])
+        from . import catalog
+
+        ids_raw = request.query_params.get(IDS)
+        if ids_raw is not None:
+            return self.multi_get(ids_raw)
+
+        since_raw = request.query_params.get(SINCE)
+        if since_raw is not None:
+            return self.delta(since_raw)
+
+        filters, error = parse_item_filters(request.query_params)
+        if error is not None:
+            return error
+
+        page, error = parse_item_page(request.query_params)
+        if error is not None:
+            return error
+
+        if settings.SNAPSHOTS_ENABLED and page is None:
+            from . import snapshots
+
+            snapshot = snapshots.get_snapshot(filters)
+            if snapshot is not None:
+                return snapshots.snapshot_response(snapshot, request)
+
+        items = catalog.filter_items(**filters)
+        if page is None:
+            key = catalog.query_key(items)
+        else:
+            ordering, limit, after = page
+            items = catalog.order_items(items, ordering, after)
+            key = f"{limit}:{catalog.query_key(items)}"
+
+        def render():
+            if page is None:
+                return JSONRenderer().render({"items": item_rows(items)})
+            return JSONRenderer().render(item_page(items, ordering, limit))
+
+        content = item_list_flights().do(
+            key, render, shared=settings.SINGLEFLIGHT_SHARED
+        )
+        return PrerenderedResponse(content, status=status.HTTP_200_OK)
+
+    def multi_get(self, ids_raw):
+        from . import catalog
+
+        # Looking up known items by id, other filters do not apply
+        ids = parse_ids(ids_raw)
+        if not ids:
+            return format_error(ERROR_MESSAGES["invalid_ids"])
+        if len(ids) > settings.ITEMS_MULTI_GET_MAX:
+            return format_error(ERROR_MESSAGES["too_many_ids"])
+
+        return Response({"items": catalog.get_items(ids)}, status=status.HTTP_200_OK)
+
+    def delta(self, since_raw):
+        from . import versions
+
+        # Changes after a version the client already has, other filters do not apply
+        since = validate_integer(since_raw)
+        if since is None or since < 0:
+            return format_error(ERROR_MESSAGES["invalid_since"])
+
+        return Response(versions.changes_since(since), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        from . import catalog
 
-        max_price_raw = request.query_params.get(MAX_PRICE)
-        max_price = validate_integer(max_price_raw)
-        if max_price is None and max_price_raw:
-            return format_error(ERROR_MESSAGES["invalid_max_price"])
+        filters, error = parse_item_filters(request.query_params)
+        if error is not None:
+            return error
+        items = catalog.filter_items(**filters)
 
-        items = Item.objects.all()
+        bucket_count = validate_integer(
+            request.query_params.get(BUCKETS, settings.FACET_BUCKETS)
+        )
+        if bucket_count is None or not 0 < bucket_count <= settings.FACET_MAX_BUCKETS:
+            return format_error(ERROR_MESSAGES["invalid_buckets"])
 
-        if name:
-            items = items.filter(name__icontains=name)
+        mode = request.query_params.get(MODE, FACET_MODE_FIXED)
+        if mode not in (FACET_MODE_FIXED, FACET_MODE_QUANTILE):
+            return format_error(ERROR_MESSAGES["invalid_facet_mode"])
 
-        if min_price:
-            items = items.filter(price__gte=min_price)
+        return Response(
+            catalog.get_price_facets(items, bucket_count, mode),
+            status=status.HTTP_200_OK,
+        )
 
-        if max_price:
-            items = items.filter(price__lte=max_price)
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        from . import autocomplete
+
+        prefix = request.query_params.get(PREFIX, "").lstrip()
+        if not 0 < len(prefix) <= 100:
+            return format_error(ERROR_MESSAGES["invalid_prefix"])
+
+        limit = validate_integer(
+            request.query_params.get(LIMIT, settings.AUTOCOMPLETE_LIMIT)
+        )
+        if limit is None or not 0 < limit <= settings.AUTOCOMPLETE_MAX_LIMIT:
+            return format_error(ERROR_MESSAGES["invalid_autocomplete_limit"])
 
-        serializer = ItemSerializer(items, many=True)
-        return Response({"items": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"items": autocomplete.complete(prefix, limit)}, status=status.HTTP_200_OK
+        )
 
 
 class CartViewSet(viewsets.ViewSet):
@@ -126,42 +415,38 @@ class CartViewSet(viewsets.ViewSet):
         if cart_id is None:
             return format_error(ERROR_MESSAGES["invalid_cart_id"])
 
-        cart_items = CartItem.objects.filter(cart_id=cart_id).select_related("item")
-
-        response = []
-        for cart_item in cart_items:
-            product = cart_item.item
-            item_data = {
-                "cart_item_id": cart_item.id,
-                "name": product.name,
-                "quantity": product.quantity,
-                "requested_quantity": cart_item.quantity,
-                "price": product.price,
-                # is_out_of_stock is defined by whether or not the requested quantity is available
-                "is_out_of_stock": product.quantity < cart_item.quantity,
-            }
-            response.append(item_data)
-
+        model = carts.get_cart(cart_id)
+        response = carts.cart_item_rows(model) if model is not None else []
         return Response({"response": response}, status=status.HTTP_200_OK)
 
     def list(self, request):
-        carts = Cart.objects.all()
-        serializer = CartSerializer(carts, many=True)
-        return Response({"carts": serializer.data}, status=status.HTTP_200_OK)
+        from . import sharding
+
+        rows = [
+            row
+            for db in sharding.user_databases()
+            for row in cart_rows(Cart.objects.using(db))
+        ]
+        return Response({"carts": rows}, status=status.HTTP_200_OK)
 
     def retrieve(self, request, pk):
         cart_id = validate_integer(pk)
         if cart_id is None:
             return format_error(ERROR_MESSAGES["invalid_cart_id"])
 
-        cart = Cart.objects.get(id=cart_id)
-        serializer = CartSerializer(cart)
+        model = carts.get_cart(cart_id)
+        if model is None:
+            return format_error(
+                ERROR_MESSAGES["cart_does_not_exist"], status.HTTP_404_NOT_FOUND
+            )
 
-        return Response({"cart": serializer.data}, status.HTTP_200_OK)
+        return Response({"cart": carts.cart_data(model)}, status.HTTP_200_OK)
 
     @csrf_exempt
     @action(detail=True, methods=["delete"], url_path="items/(?P<cart_item_id>[^/.]+)")
     def delete_cart_item(self, request, pk: None, cart_item_id: None):
+        from . import sharding
+
         cart_id = validate_integer(pk)
         if cart_id is None:
             return format_error(ERROR_MESSAGES["invalid_cart_id"])
@@ -174,50 +459,62 @@ class CartViewSet(viewsets.ViewSet):
         if user_id is None:
             return format_error(ERROR_MESSAGES["invalid_user_id"])
 
+        db = sharding.db_for_user(user_id)
         try:
             # Get cart belonging to user by id
-            cart = Cart.objects.get(id=cart_id, user_id=user_id)
+            cart = Cart.objects.using(db).get(id=cart_id, user_id=user_id)
         except Cart.DoesNotExist:
             return format_error(
                 ERROR_MESSAGES["cart_does_not_exist"], status.HTTP_404_NOT_FOUND
             )
 
         try:
-            cart_item = CartItem.objects.get(id=item_id, cart_id=cart.id)
+            cart_item = CartItem.objects.using(db).get(id=item_id, cart_id=cart.id)
         except CartItem.DoesNotExist:
             return format_error(
                 ERROR_MESSAGES["item_does_not_exist"], status.HTTP_404_NOT_FOUND
             )
 
         cart_item.delete()
-        cart = Cart.objects.get(user_id=user_id)
-        serializer = CartSerializer(cart, many=False)
+        carts.delete_line(cart.id, item_id)
+        carts.touch(cart)
         return Response(
-            {"cart": serializer.data},
+            {"cart": carts.cart_data(carts.get_cart(cart.id))},
             status=status.HTTP_200_OK,
         )
 
     @csrf_exempt
     def create(self, request):
+        from . import sharding
+
         user_id = validate_integer(request.data.get(USER_ID))
         if user_id is None:
             return format_error(ERROR_MESSAGES["invalid_user_id"])
 
         try:
             user = User.objects.get(id=user_id)
-            cart = Cart.objects.get(user=user)
+            cart = Cart.objects.using(sharding.db_for_user(user.id)).get(user=user)
+            carts.touch(cart)
         except Cart.DoesNotExist:
-            cart = Cart.objects.create(user=user)
-
-        serializer = CartSerializer(cart, many=False)
+            cart = carts.create(user)
+
+        # Same data as CartSerializer, which reads cart items from the default database
+        item_ids = (
+            CartItem.objects.using(cart._state.db)
+            .filter(cart=cart)
+            .order_by("item_id")
+            .values_list("item_id", flat=True)
+        )
         return Response(
-            {"cart": serializer.data},
+            {"cart": {"items": list(item_ids)}},
             status=status.HTTP_200_OK,
         )
 
     @csrf_exempt
     @action(detail=True, methods=["post"], url_path="items")
     def add(self, request, pk: None):
+        from . import inventory
+
         data = request.POST.copy()
         data[CART_ID] = pk
 
@@ -230,41 +527,51 @@ class CartViewSet(viewsets.ViewSet):
         user = validated[USER_ID]
         cart = validated[CART_ID]
         quantity = validated[QUANTITY]
+        stock = inventory.get_stock(item)
 
         if user.id != cart.user.id:
             return format_error(
                 ERROR_MESSAGES["invalid_cart_id"], status.HTTP_404_NOT_FOUND
             )
 
+        cart_items = CartItem.objects.using(cart._state.db)
         try:
             # Get existing cart item
-            cart_item = CartItem.objects.get(cart=cart, item=item)
+            cart_item = cart_items.get(cart=cart, item=item)
             # Derive new quantity
             new_total_quantity = cart_item.quantity + quantity
 
-            if new_total_quantity > item.quantity:
+            if new_total_quantity > stock:
+                metrics.OUT_OF_STOCK.inc(action="add")
                 return format_error(ERROR_MESSAGES["quantity_unavailable"])
 
             cart_item.quantity = new_total_quantity
             cart_item.save()
         except CartItem.DoesNotExist:
             # In the case where the cart item does not exist
-            if quantity > item.quantity:
+            if quantity > stock:
+                metrics.OUT_OF_STOCK.inc(action="add")
                 return format_error(ERROR_MESSAGES["quantity_unavailable"])
 
             # Create new cart item
-            cart_item = CartItem.objects.create(
+            cart_item = cart_items.create(
                 cart=cart,
                 item=item,
                 quantity=quantity,
             )
 
-        serializer = CartSerializer(cart, many=False)
-        return Response({"cart": serializer.data}, status=status.HTTP_200_OK)
+        carts.save_line(cart.id, cart_item, stock)
+        carts.touch(cart)
+        return Response(
+            {"cart": carts.cart_data(carts.get_cart(cart.id))},
+            status=status.HTTP_200_OK,
+        )
 
     @csrf_exempt
     @action(detail=True, methods=["post"])
     def purchase(self, request, pk=None):
+        from . import sharding
+
         data = request.POST.copy()
         # Idempotency key is always required (either through request headers or in request data)
         data[IDEMPOTENCY_KEY] = request.headers.get(
@@ -281,70 +588,84 @@ class CartViewSet(viewsets.ViewSet):
         cart_id = validated[CART_ID]
         idempotency_key = validated[IDEMPOTENCY_KEY]
 
+        # Replies of finished purchases are cached, so replays skip the database
+        reply = cache.get(idempotency_cache_key(user.id, idempotency_key))
+        if reply is not None:
+            metrics.IDEMPOTENCY_REPLAYS.inc()
+            return Response({"response": reply}, status=status.HTTP_200_OK)
+
+        # Keys, carts and purchases are stored in the shard of the user
+        db = sharding.db_for_user(user.id)
         try:
             # If idempotency key exists, the same transaction has already happened
-            idempotency_val = IdempotencyKey.objects.get(key=idempotency_key)
+            idempotency_val = IdempotencyKey.objects.using(db).get(key=idempotency_key)
             serializer = IdempotencyKeySerializer(idempotency_val, many=False)
+            metrics.IDEMPOTENCY_REPLAYS.inc()
+            if idempotency_val.status == STATUS_PENDING:
+                if settings.CHECKOUT_MODE == CHECKOUT_MODE_ASYNC:
+                    # Queued checkout that has not been processed yet
+                    return Response(
+                        {"checkout": serializer.data}, status=status.HTTP_202_ACCEPTED
+                    )
+            else:
+                cache.set(
+                    idempotency_cache_key(user.id, idempotency_key),
+                    idempotency_val.response_data,
+                    timeout=settings.IDEMPOTENCY_CACHE_TIMEOUT,
+                )
             return Response(
                 {"response": serializer.data["response_data"]},
                 status=status.HTTP_200_OK,
             )
         except IdempotencyKey.DoesNotExist:
+            # Replies of archived purchases are gone, but they must not repeat
+            if (
+                ArchivedIdempotencyKey.objects.using(db)
+                .filter(key=idempotency_key)
+                .exists()
+            ):
+                metrics.PURCHASES.inc(result="failure")
+                return format_error(ERROR_MESSAGES["idempotency_key_archived"])
             # Create new idempotency key if one doesn't exist
-            idempotency_val = IdempotencyKey.objects.create(
+            idempotency_val = IdempotencyKey.objects.using(db).create(
                 user=user, key=idempotency_key, status=STATUS_PENDING
             )
 
         try:
             # Fetching cart by id and user
-            cart = Cart.objects.get(user=user, id=cart_id)
+            cart = Cart.objects.using(db).get(user=user, id=cart_id)
         except Cart.DoesNotExist:
+            metrics.PURCHASES.inc(result="failure")
             return format_error(
                 ERROR_MESSAGES["cart_does_not_exist"], status.HTTP_404_NOT_FOUND
             )
 
-        if not cart.items.exists():
+        if not CartItem.objects.using(db).filter(cart=cart).exists():
+            metrics.PURCHASES.inc(result="failure")
             return format_error(
                 ERROR_MESSAGES["no_cart_items"], status.HTTP_400_BAD_REQUEST
             )
 
-        # Wrapping cart_item logic in atomic transaction for data consistency
-        try:
-            with transaction.atomic():
-                # Using select_for_update to lock rows until transaction is completed
-                cart_items = (
-                    CartItem.objects.filter(cart_id=cart.id)
-                    .select_for_update()
-                    .select_related("item")
-                )
-                if not cart_items.exists():
-                    return format_error(
-                        ERROR_MESSAGES["item_does_not_exist"],
-                        status.HTTP_404_NOT_FOUND,
-                    )
+        from . import checkout
 
-                # Looping through all cart items and updating quantity
-                for cart_item in cart_items:
-                    product = cart_item.item
-                    if product.quantity < cart_item.quantity:
-                        # Raising exception to rollback transaction
-                        raise Exception("Item does not have enough stock")
-                    UserPurchaseRecord.objects.create(
-                        user=user, item=cart_item.item, quantity=cart_item.quantity
-                    )
-                    product.quantity -= cart_item.quantity
-                    product.save()
-
-                cart.delete()
-                serializer = CartItemSerializer(cart_items, many=True)
-                idempotency_val.response_data = serializer.data
-                idempotency_val.status = STATUS_SUCCESS
-                idempotency_val.save()
-        except Exception as e:
-            idempotency_val.status = STATUS_FAILED
-            idempotency_val.response_data = {"error": str(e)}
-            idempotency_val.save()
+        if settings.CHECKOUT_MODE == CHECKOUT_MODE_ASYNC:
+            checkout.enqueue(idempotency_val, cart.id)
+            serializer = IdempotencyKeySerializer(idempotency_val, many=False)
+            return Response(
+                {"checkout": serializer.data}, status=status.HTTP_202_ACCEPTED
+            )
 
+        # The cart is purchased in one atomic transaction for data consistency
+        if settings.CHECKOUT_MODE == CHECKOUT_MODE_GROUP:
+            checkout.group_commit(idempotency_val, cart.id)
+        else:
+            checkout.checkout_batch([(idempotency_val, cart.id)])
+        cache.set(
+            idempotency_cache_key(user.id, idempotency_key),
+            idempotency_val.response_data,
+            timeout=settings.IDEMPOTENCY_CACHE_TIMEOUT,
+        )
+        if idempotency_val.status != STATUS_SUCCESS:
             return Response(
                 idempotency_val.response_data, status=status.HTTP_400_BAD_REQUEST
             )
@@ -353,3 +674,101 @@ class CartViewSet(viewsets.ViewSet):
             {"response": idempotency_val.response_data},
             status=status.HTTP_200_OK,
         )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="checkouts/(?P<idempotency_key>[^/]+)",
+    )
+    def checkout_status(self, request, idempotency_key=None):
+        from . import sharding
+
+        user_id = validate_integer(request.query_params.get(USER_ID))
+        if user_id is None:
+            return format_error(ERROR_MESSAGES["invalid_user_id"])
+
+        try:
+            idempotency_val = IdempotencyKey.objects.using(
+                sharding.db_for_user(user_id)
+            ).get(key=idempotency_key, user_id=user_id)
+        except IdempotencyKey.DoesNotExist:
+            return format_error(
+                ERROR_MESSAGES["checkout_does_not_exist"], status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = IdempotencyKeySerializer(idempotency_val, many=False)
+        return Response({"checkout": serializer.data}, status=status.HTTP_200_OK)
+
+
+class OrderViewSet(viewsets.ViewSet):
+    authentication_classes = [CsrfExemptSessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        from . import sharding
+
+        user_id = validate_integer(request.query_params.get(USER_ID))
+        if user_id is None:
+            return format_error(ERROR_MESSAGES["invalid_user_id"])
+
+        limit_raw = request.query_params.get(LIMIT)
+        limit = validate_integer(limit_raw) if limit_raw else None
+        if limit_raw and (limit is None or limit < 1):
+            return format_error(ERROR_MESSAGES["invalid_limit"])
+        limit = min(
+            limit or settings.ORDER_HISTORY_PAGE_SIZE,
+            settings.ORDER_HISTORY_MAX_PAGE_SIZE,
+        )
+
+        # Newest first, paginated by the (timestamp, id) of the last seen row so
+        # every page is an index range scan on (user, timestamp, id)
+        records = (
+            UserPurchaseRecord.objects.using(sharding.db_for_user(user_id))
+            .filter(user_id=user_id)
+            .order_by("-timestamp", "-id")
+        )
+        cursor_raw = request.query_params.get(CURSOR)
+        if cursor_raw:
+            cursor = decode_cursor(cursor_raw)
+            if cursor is None:
+                return format_error(ERROR_MESSAGES["invalid_cursor"])
+
+            timestamp, record_id = cursor
+            records = records.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=record_id)
+            )
+
+        # Fetching one extra row to know whether there is a next page
+        records = list(records[: limit + 1])
+        next_cursor = (
+            encode_cursor(records[limit - 1]) if len(records) > limit else None
+        )
+
+        serializer = UserPurchaseRecordSerializer(records[:limit], many=True)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        from . import sharding
+
+        user_id = validate_integer(request.query_params.get(USER_ID))
+        if user_id is None:
+            return format_error(ERROR_MESSAGES["invalid_user_id"])
+
+        summaries = (
+            UserItemPurchaseSummary.objects.using(sharding.db_for_user(user_id))
+            .filter(user_id=user_id)
+            .order_by("item_id")
+        )
+        item_id_raw = request.query_params.get(ITEM_ID)
+        if item_id_raw:
+            item_id = validate_integer(item_id_raw)
+            if item_id is None:
+                return format_error(ERROR_MESSAGES["invalid_item_id"])
+            summaries = summaries.filter(item_id=item_id)
+
+        serializer = UserItemPurchaseSummarySerializer(summaries, many=True)
+        return Response({"summary": serializer.data}, status=status.HTTP_200_OK)